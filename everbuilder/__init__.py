@@ -0,0 +1,23 @@
+"""EverBuilder: pack a Unity WebGL build into one offline HTML file.
+
+    from everbuilder import build_from_files
+    with open('offline.html', 'wb') as out:
+        report = build_from_files(files_map, out, compress=True)
+
+Importing the package is side-effect free and loads neither Flask nor
+brotli; the web UI lives in everbuilder.server and the command line in
+everbuilder.cli (`python -m everbuilder`).
+"""
+from .builder import (
+    BuildReport, CompressionCache, CompressionPolicy, LazyFileMap, VARIABLES,
+    build, build_from_files, build_output, get_brotli, get_compression_cache,
+    log, precompress_artifact, read_files_list,
+)
+
+__version__ = '0.1.0'
+
+__all__ = [
+    'BuildReport', 'CompressionCache', 'CompressionPolicy', 'LazyFileMap', 'VARIABLES',
+    'build', 'build_from_files', 'build_output', 'get_brotli', 'get_compression_cache',
+    'log', 'precompress_artifact', 'read_files_list',
+]
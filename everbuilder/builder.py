@@ -0,0 +1,3064 @@
+"""Build engine: embeds a Unity WebGL build (files.txt + its assets) into one offline HTML file.
+
+Importing this module has no side effects and pulls in no web-server code;
+brotli and the process pool are only loaded when a build needs them.
+"""
+import os
+import re
+import json
+import base64
+import hashlib
+import html
+# peak RSS for build reports; not available on Windows
+try:
+    import resource
+except ImportError:
+    resource = None
+import bisect
+import gzip
+import mimetypes
+import mmap
+from collections import OrderedDict, deque
+from collections.abc import Mapping
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+import sys
+import threading
+import time
+
+# ---------- Config ----------
+FILES_LIST = "files.txt"
+OUTPUT_FILE = "offline.html"
+VARIABLES = {
+}
+# Runtime flags for CLI builds; web builds set their own through build_output()
+GLOBAL_VERBOSE = False
+GLOBAL_EMIT_PROGRESS = False
+# Checkout the package runs from: the web UI (src/) and the default loader live here
+ASSET_ROOT = Path(__file__).resolve().parent.parent
+# Binary extensions that are needed for WASM
+BINARY_EXTS = {'.wasm', '.data', '.mem', '.symbols', '.bundle'}
+# Brotli quality used for embedded assets (11 = maximum, the brotli default)
+BROTLI_QUALITY = 11
+# Size cap of the on-disk compression cache shared by CLI and web builds
+CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+# Assets at least this large are memory-mapped instead of read into memory
+MMAP_THRESHOLD = 1024 * 1024
+# Incremental builds record their inputs in <output> + MANIFEST_SUFFIX
+MANIFEST_SUFFIX = '.manifest.json'
+MANIFEST_VERSION = 1
+# Assets scanned for references to inlined files before those are left out
+TEXT_EXTS = {'.js', '.mjs', '.json', '.html', '.htm', '.css', '.xml', '.txt'}
+# Formats that are compressed already; brotli only burns CPU on them
+COMPRESSED_EXTS = {'.png', '.jpg', '.jpeg', '.gif', '.webp', '.avif', '.mp3', '.ogg', '.oga', '.opus', '.m4a', '.aac', '.mp4', '.m4v', '.webm', '.woff', '.woff2', '.zip', '.7z'}
+# Transfer-encoded inputs (e.g. Unity's compressed builds) embedded as-is with their encoding
+ENCODED_INPUT_EXTS = {'.br': 'br', '.gz': 'gzip'}
+# Never compressed: already-compressed formats, and html/css (typically text that may be inlined)
+_NO_COMPRESS = {ext: None for ext in COMPRESSED_EXTS | {'.html', '.css'}}
+# Named compression presets (see CompressionPolicy); --compress uses DEFAULT_COMPRESSION_PRESET
+COMPRESSION_PRESETS = {
+    'fast': {'quality': 4, 'min_size': 4096, 'ext_quality': dict(_NO_COMPRESS)},
+    'balanced': {'quality': 9, 'min_size': 1024, 'large_size': 8 * 1024 * 1024, 'large_quality': 7,
+                 'ext_quality': dict({ext: BROTLI_QUALITY for ext in TEXT_EXTS}, **_NO_COMPRESS)},
+    'max': {'quality': BROTLI_QUALITY, 'min_size': 256, 'ext_quality': dict(_NO_COMPRESS)},
+}
+DEFAULT_COMPRESSION_PRESET = 'max'
+# Solid bundle mode: assets up to this size are packed into one compressed blob
+SOLID_MAX_ASSET_SIZE = 64 * 1024
+# EMBEDDED_FILES key of that blob (not a file path, so fetch never matches it)
+SOLID_BUNDLE_KEY = '@everbuilder/solid-bundle'
+# Web server: levels of the gzip/br copies of each artifact served by Accept-Encoding
+# (moderate levels: the artifact can be hundreds of MB and is compressed on every build)
+ARTIFACT_GZIP_LEVEL = 6
+ARTIFACT_BROTLI_QUALITY = 5
+# --------------------------------
+
+# optional brotli support (best-effort), imported on first use
+_BROTLI = []
+
+def get_brotli():
+    """The brotli module, or None when it isn't installed."""
+    if not _BROTLI:
+        try:
+            import brotli
+        except Exception:
+            brotli = None
+        _BROTLI.append(brotli)
+    return _BROTLI[0]
+
+# Build output. build() and its helpers report through log() and read the
+# verbose/progress switches through verbose_enabled()/progress_enabled().
+# On the CLI these go to stdout and the GLOBAL_* flags; the web server runs
+# every job inside build_output() so each build thread writes to its own
+# logger with its own switches, and concurrent builds never mix.
+_BUILD_OUTPUT = threading.local()
+
+def log(*args, sep=' ', **kwargs):
+    """print() for build messages, sent to the current job's logger when there is one."""
+    logger = getattr(_BUILD_OUTPUT, 'logger', None)
+    if logger is None or kwargs.get('file') is not None:
+        print(*args, sep=sep, **kwargs)
+        return
+    logger.info(sep.join(str(a) for a in args))
+
+def verbose_enabled():
+    return getattr(_BUILD_OUTPUT, 'verbose', GLOBAL_VERBOSE)
+
+def emit_event(kind, **data):
+    """Publish a typed build event (phase, asset, stats) to the current job, if any."""
+    publish = getattr(_BUILD_OUTPUT, 'events', None)
+    if publish is not None:
+        try:
+            publish(kind, data)
+        except Exception:
+            pass
+
+def clock():
+    """(wall, CPU) reading for timing a step; CPU is this thread's only."""
+    return time.perf_counter(), time.thread_time()
+
+def add_clock(timings, name, started):
+    """Add the wall and CPU seconds since `started` (a clock()) to timings[name] and timings[name + '_cpu']."""
+    wall, cpu = clock()
+    timings[name] = timings.get(name, 0.0) + wall - started[0]
+    timings[name + '_cpu'] = timings.get(name + '_cpu', 0.0) + cpu - started[1]
+
+def timed(report, phase):
+    """report.timed(phase), or a no-op context without a report."""
+    return report.timed(phase) if report is not None else nullcontext()
+
+def phase_start(name):
+    """Announce a build phase; returns what phase_end() needs."""
+    emit_event('phase', name=name, state='start')
+    return clock()
+
+def phase_end(name, started, report=None):
+    """Close a phase_start(); with a BuildReport its wall and CPU time are recorded too."""
+    wall, cpu = clock()
+    emit_event('phase', name=name, state='end', elapsed=round(wall - started[0], 3))
+    if report is not None:
+        report.add_time(name, wall - started[0], cpu - started[1])
+
+def progress_enabled():
+    return getattr(_BUILD_OUTPUT, 'emit_progress', GLOBAL_EMIT_PROGRESS)
+
+@contextmanager
+def build_output(logger, verbose=False, emit_progress=True, events=None):
+    """Route log() on this thread to `logger`, with its own verbose/progress switches.
+
+    `events`, when given, is called as events(kind, data) for every
+    emit_event() on this thread (e.g. EventBus.publish).
+    """
+    saved = dict(_BUILD_OUTPUT.__dict__)
+    _BUILD_OUTPUT.logger = logger
+    _BUILD_OUTPUT.events = events
+    _BUILD_OUTPUT.verbose = bool(verbose)
+    _BUILD_OUTPUT.emit_progress = bool(emit_progress)
+    try:
+        yield logger
+    finally:
+        _BUILD_OUTPUT.__dict__.clear()
+        _BUILD_OUTPUT.__dict__.update(saved)
+
+def read_files_list(path):
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    with open(path, "r", encoding="utf-8") as fh:
+        return [line.strip() for line in fh if line.strip()]
+
+def read_asset(src):
+    """Return the contents of `src` for encoding.
+
+    Small files are read into bytes; files of MMAP_THRESHOLD bytes or more
+    are memory-mapped and returned as a read-only memoryview, so base64,
+    brotli and hashing work straight from the page cache. The mapping is
+    released once the last view of it is dropped.
+    """
+    with open(src, 'rb') as fh:
+        return read_file_object(fh)
+
+def read_file_object(fh):
+    """Contents of an open binary file from its current position, as read_asset() reads them."""
+    try:
+        fd = fh.fileno()
+        size = os.fstat(fd).st_size
+    except (AttributeError, OSError, ValueError):
+        # not backed by a file (io.UnsupportedOperation is both)
+        return fh.read()
+    pos = fh.tell()
+    if size - pos >= MMAP_THRESHOLD:
+        try:
+            fh.flush()
+            return memoryview(mmap.mmap(fd, 0, access=mmap.ACCESS_READ))[pos:]
+        except (OSError, ValueError):
+            # e.g. special files or platforms without mmap support
+            pass
+    return fh.read()
+
+class LazyFileMap(Mapping):
+    """Map normalized path -> bytes, reading each file from disk on access.
+
+    Only the keys and their source paths are kept; every lookup goes back
+    to disk through read_asset(), so large assets come back as memoryviews
+    over an mmap and are never copied into the process until an encoder
+    touches them. Rewriters that need text decode them with str(bs, ...).
+    Deleting a key drops it from the map (e.g. the loader html) without
+    touching the file on disk.
+    """
+
+    def __init__(self):
+        self._paths = {}
+
+    def add(self, key, src):
+        self._paths[key] = src
+
+    def source_path(self, key):
+        return self._paths[key]
+
+    def __getitem__(self, key):
+        return read_asset(self._paths[key])
+
+    def __delitem__(self, key):
+        del self._paths[key]
+
+    def __contains__(self, key):
+        return key in self._paths
+
+    def __iter__(self):
+        return iter(self._paths)
+
+    def __len__(self):
+        return len(self._paths)
+
+def default_cache_dir():
+    """Directory of the shared compression cache (EVERBUILDER_CACHE_DIR overrides)."""
+    env = os.environ.get('EVERBUILDER_CACHE_DIR')
+    if env:
+        return env
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    if not base:
+        import tempfile
+        base = tempfile.gettempdir()
+    return os.path.join(base, 'everbuilder', 'compress')
+
+class CompressionCache:
+    """On-disk, content-addressed cache of compressed asset payloads.
+
+    Entries are keyed by sha256(content) plus codec and quality and stored
+    under `root` as <key>.bin (compressed bytes) and, when `store_b64` is
+    set, <key>.b64 (their base64 form, which skips the encode on a hit).
+    Recency is kept in file mtimes so the LRU order survives across builds
+    and processes; once the total size exceeds `max_bytes` the least
+    recently used entries are evicted. One instance may be shared by
+    concurrent builds in the web server. An entry with an empty payload is
+    a negative record: brotli did not make that content smaller, so it is
+    embedded raw (see _cache_store).
+    """
+
+    def __init__(self, root, max_bytes=CACHE_MAX_BYTES, store_b64=False):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.store_b64 = store_b64
+        self._lock = threading.Lock()
+        self._index = None  # key -> total bytes on disk, least recently used first
+        self._total = 0
+
+    @staticmethod
+    def make_key(bs, codec, quality):
+        return f"{hashlib.sha256(bs).hexdigest()}-{codec}-q{quality}"
+
+    def _path(self, key, ext):
+        return self.root / key[:2] / (key + ext)
+
+    def _load_index(self):
+        if self._index is not None:
+            return
+        found = {}
+        try:
+            for sub in os.scandir(self.root):
+                if not sub.is_dir():
+                    continue
+                for e in os.scandir(sub.path):
+                    key, ext = os.path.splitext(e.name)
+                    if ext not in ('.bin', '.b64'):
+                        continue
+                    st = e.stat()
+                    size, mtime = found.get(key, (0, 0))
+                    found[key] = (size + st.st_size, max(mtime, st.st_mtime))
+        except FileNotFoundError:
+            pass
+        self._index = OrderedDict()
+        for key, (size, _) in sorted(found.items(), key=lambda kv: kv[1][1]):
+            self._index[key] = size
+        self._total = sum(self._index.values())
+        # the cap may have been lowered since the entries were written
+        self._evict()
+
+    def get_b64(self, key):
+        """Return the base64 payload for `key`, or None on a miss."""
+        with self._lock:
+            self._load_index()
+            if key not in self._index:
+                return None
+            self._index.move_to_end(key)
+        try:
+            bin_path = self._path(key, '.bin')
+            b64_path = self._path(key, '.b64')
+            if b64_path.exists():
+                b64 = b64_path.read_text(encoding='ascii')
+            else:
+                b64 = to_b64(bin_path.read_bytes())
+            # touch so the on-disk LRU order follows use, not creation
+            os.utime(bin_path)
+            return b64
+        except OSError:
+            # evicted by another process since the index was loaded
+            with self._lock:
+                self._total -= self._index.pop(key, 0)
+            return None
+
+    def put(self, key, comp, b64=None):
+        """Store compressed bytes (and their base64 form when enabled) for `key`."""
+        try:
+            bin_path = self._path(key, '.bin')
+            bin_path.parent.mkdir(parents=True, exist_ok=True)
+            # write-then-rename so concurrent readers never see partial entries
+            tmp = bin_path.with_name(f"{bin_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(comp)
+            os.replace(tmp, bin_path)
+            size = len(comp)
+            if self.store_b64:
+                b64 = b64 if b64 is not None else to_b64(comp)
+                b64_path = self._path(key, '.b64')
+                tmp = b64_path.with_name(f"{b64_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+                tmp.write_text(b64, encoding='ascii')
+                os.replace(tmp, b64_path)
+                size += len(b64)
+        except OSError as e:
+            log(f"[WARN] Could not write compression cache entry: {e}")
+            return
+        with self._lock:
+            self._load_index()
+            self._total += size - self._index.pop(key, 0)
+            self._index[key] = size
+            self._evict()
+
+    def _evict(self):
+        while self._total > self.max_bytes and len(self._index) > 1:
+            key, size = self._index.popitem(last=False)
+            self._total -= size
+            for ext in ('.bin', '.b64'):
+                try:
+                    os.remove(self._path(key, ext))
+                except OSError:
+                    pass
+
+_COMPRESSION_CACHES = {}
+_COMPRESSION_CACHES_LOCK = threading.Lock()
+
+def get_compression_cache(cache_dir=None, max_bytes=None, store_b64=False):
+    """Return the process-wide CompressionCache for `cache_dir`, creating it once."""
+    root = os.path.abspath(cache_dir or default_cache_dir())
+    with _COMPRESSION_CACHES_LOCK:
+        cache = _COMPRESSION_CACHES.get(root)
+        if cache is None:
+            cache = CompressionCache(root, max_bytes=CACHE_MAX_BYTES if max_bytes is None else max_bytes, store_b64=store_b64)
+            _COMPRESSION_CACHES[root] = cache
+        else:
+            if max_bytes is not None:
+                cache.max_bytes = max_bytes
+            cache.store_b64 = cache.store_b64 or store_b64
+        return cache
+
+def file_bytes_map(files, lazy=False, root=None):
+    """Read all files into a map path -> bytes.
+
+    `files` is expected to be an iterable of path strings (relative or
+    absolute). This function reads each file in binary mode and returns a
+    dictionary mapping the forward-slash normalized path -> bytes.
+    Relative paths are read from `root` when given (the keys stay as
+    listed), otherwise from the current working directory.
+
+    When `lazy` is True the files are only checked for readability and a
+    LazyFileMap is returned instead, so bytes are read (or memory-mapped)
+    on demand; build() always uses this form.
+    """
+    if lazy:
+        lm = LazyFileMap()
+        for p in files:
+            src = os.path.join(root, p) if root else p
+            if os.path.isfile(src) and os.access(src, os.R_OK):
+                lm.add(str(p).replace('\\', '/'), src)
+            else:
+                log(f"[WARN] Could not read file '{p}': not a readable file")
+        return lm
+    m = {}
+    for p in files:
+        try:
+            # read file relative to `root` or the current working directory
+            with open(os.path.join(root, p) if root else p, 'rb') as fh:
+                bs = fh.read()
+            # normalize key to always use forward slashes
+            key = str(p).replace('\\', '/')
+            m[key] = bs
+        except Exception as e:
+            log(f"[WARN] Could not read file '{p}': {e}")
+    return m
+
+def memory_file_map(files):
+    """Map normalized path -> bytes-like for in-memory inputs.
+
+    `files` maps a path to bytes, a bytearray, a memoryview or a file
+    object. In-memory buffers (io.BytesIO and anything else with
+    getbuffer()) are used through a memoryview without copying; files on
+    disk (anything with a fileno(), including a SpooledTemporaryFile that
+    rolled over) are read from their current position like read_asset()
+    reads them, so large ones are memory-mapped; other file objects are
+    read once from their current position.
+    """
+    m = {}
+    for path, content in files.items():
+        try:
+            if hasattr(content, 'rollover'):
+                # a SpooledTemporaryFile: its BytesIO while in memory, its
+                # temporary file once rolled over
+                content = content._file
+            if hasattr(content, 'getbuffer'):
+                content = content.getbuffer()
+            elif hasattr(content, 'read'):
+                content = read_file_object(content)
+            if isinstance(content, memoryview) and (content.format != 'B' or not content.c_contiguous):
+                content = content.tobytes()
+            elif not isinstance(content, (bytes, bytearray, memoryview)):
+                raise TypeError(f'unsupported content type {type(content).__name__}')
+            m[str(path).replace('\\', '/')] = content
+        except Exception as e:
+            log(f"[WARN] Could not read file '{path}': {e}")
+    return m
+
+class TextSink:
+    """Text stream over a caller's binary stream, written as UTF-8.
+
+    The writers only ever call write(); the first `keep` characters are
+    remembered so build() can check the document head without reading the
+    output back. The underlying stream is never closed here.
+    """
+
+    def __init__(self, raw, keep=2000000):
+        self.raw = raw
+        self.keep = keep
+        self._head = []
+        self._kept = 0
+        self.bytes = 0
+
+    def write(self, text):
+        if self._kept < self.keep:
+            piece = text[:self.keep - self._kept]
+            self._head.append(piece)
+            self._kept += len(piece)
+        data = text.encode('utf-8')
+        self.raw.write(data)
+        self.bytes += len(data)
+        return len(text)
+
+    def head(self):
+        return ''.join(self._head)
+
+def asset_size(files_map, path):
+    """Byte size of an asset without reading it when the map is lazy."""
+    if isinstance(files_map, LazyFileMap):
+        return os.stat(files_map.source_path(path)).st_size
+    return len(files_map[path])
+
+def find_duplicate_assets(files_map):
+    """Find assets whose content is identical to an earlier asset in the map.
+
+    Only assets that share their byte size with another one are hashed, so
+    a project without duplicates costs one stat per file. Returns (refs,
+    hashes): path -> first path in map order with the same content (for
+    every duplicate but that first one), and the sha256 of each asset that
+    was hashed.
+    """
+    by_size = {}
+    for path in files_map.keys():
+        try:
+            size = asset_size(files_map, path)
+        except Exception:
+            continue
+        if size:
+            by_size.setdefault(size, []).append(path)
+    refs = {}
+    hashes = {}
+    for paths in by_size.values():
+        if len(paths) < 2:
+            continue
+        first = {}
+        for path in paths:
+            try:
+                digest = hashlib.sha256(files_map[path]).hexdigest()
+            except Exception:
+                continue
+            hashes[path] = digest
+            canonical = first.setdefault(digest, path)
+            if canonical != path:
+                refs[path] = canonical
+    return refs, hashes
+
+def content_hashes(files_map, known=None):
+    """Return path -> sha256 hex digest for every asset in files_map.
+
+    Digests already in `known` (e.g. from find_duplicate_assets or an
+    incremental manifest) are reused instead of reading the file again.
+    Assets that cannot be read are left out.
+    """
+    known = known or {}
+    hashes = {}
+    for path in files_map.keys():
+        if path in known:
+            hashes[path] = known[path]
+            continue
+        try:
+            hashes[path] = hashlib.sha256(files_map[path]).hexdigest()
+        except Exception as e:
+            log(f"[WARN] Could not read file '{path}': {e}")
+    return hashes
+
+def asset_cache_options(hashes):
+    """RUNTIME_OPTIONS.assetCache for the persistent in-browser asset cache.
+
+    The runtime keys IndexedDB entries by these content hashes; `build` is a
+    digest over all of them, and when it differs from the one the browser
+    saw last, entries no longer used by any asset are evicted.
+    """
+    build_hash = hashlib.sha256(json.dumps(sorted(hashes.items())).encode('utf-8')).hexdigest()[:16]
+    return {'build': build_hash, 'hashes': hashes}
+
+def try_decode_utf8(bs, path):
+    try:
+        # str() accepts any buffer, so mmap-backed memoryviews decode directly
+        return str(bs, "utf-8")
+    except UnicodeDecodeError:
+        return None
+
+def to_b64(bs):
+    return base64.b64encode(bs).decode("ascii")
+
+def human_size(n):
+    if n < 1024:
+        return f"{n} B"
+    if n < 1024 * 1024:
+        return f"{n / 1024:.1f} KB"
+    return f"{n / (1024 * 1024):.2f} MB"
+
+def replace_variables_in_text(text, variables):
+    for k, v in variables.items():
+        # non-string entries are build flags (e.g. __embed_css_direct__), not template values
+        if isinstance(v, str):
+            text = text.replace(f"{{{{ {k} }}}}", v)
+    return text
+
+def make_data_uri(path, bs, mime=None):
+    mt = mime or mimetypes.guess_type(path)[0] or "application/octet-stream"
+    return f"data:{mt};base64,{to_b64(bs)}"
+
+def b64_length(size):
+    """Characters of base64 for `size` bytes."""
+    return 4 * ((size + 2) // 3)
+
+def data_uri_length(path, size, mime=None):
+    """Length of make_data_uri() for a `size`-byte asset, without encoding it."""
+    mt = mime or mimetypes.guess_type(path)[0] or "application/octet-stream"
+    return len(f"data:{mt};base64,") + b64_length(size)
+
+# Marker substituted for the EMBEDDED_FILES literal when the document shell is
+# rendered for a streaming build; the map itself is written in its place.
+EMBEDDED_MAP_PLACEHOLDER = '/*@@EVERBUILDER_EMBEDDED_MAP@@*/'
+# Likewise for the per-asset payload blocks that follow the runtime script.
+PAYLOAD_BLOCKS_PLACEHOLDER = '<!--@@EVERBUILDER_PAYLOAD_BLOCKS@@-->'
+
+def payload_block_id(key):
+    """DOM id of the payload block holding `key` (stable across builds)."""
+    return 'eb-' + hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+def build_lookup_index(keys):
+    """Precompute the tables the injected fetch patch resolves URLs with.
+
+    The runtime used to test every key against every request. Instead it
+    now gets, for the normalized keys (query/hash stripped, forward
+    slashes, exactly as normalizeUrlForMatch does):
+    - `keys`: the embedded keys in map order,
+    - `paths`: normalized key -> position of its first key (exact and
+      suffix matches look up the URL's tails of each length in `lens`),
+    - `lens`: the distinct normalized key lengths in UTF-16 units,
+    - `names`: basename -> position of the first key with that basename.
+    The runtime takes the lowest position among the hits, which is the key
+    the linear scan would have stopped at.
+    """
+    keys = list(keys)
+    paths = {}
+    names = {}
+    lens = set()
+    for i, key in enumerate(keys):
+        norm = key.split('?')[0].split('#')[0].replace('\\', '/')
+        if not norm:
+            continue
+        paths.setdefault(norm, i)
+        names.setdefault(norm.rsplit('/', 1)[-1], i)
+        # JS string lengths count UTF-16 code units
+        lens.add(len(norm.encode('utf-16-le')) // 2)
+    return {'keys': keys, 'paths': paths, 'lens': sorted(lens), 'names': names}
+
+def inject_fetch_patch_into_head(html_text, embedded_files_map, loader_html=None, embedded_json=None, embedded_keys=None, payload_blocks_html=None, runtime_options=None):
+    """Insert fetch/WASM monkeypatch into the <head> element of html_text.
+
+    `embedded_json` may be given to use a pre-serialised literal instead of
+    dumping `embedded_files_map` (streaming builds pass EMBEDDED_MAP_PLACEHOLDER
+    together with `embedded_keys`, the keys the map will contain).
+    `payload_blocks_html` is placed right after the runtime script; payload
+    block builds use it for the per-asset <script> blocks.
+    `runtime_options` is exposed to the runtime as RUNTIME_OPTIONS (e.g.
+    {'workerDecode': True}, 'assetCache' from asset_cache_options).
+    """
+    if embedded_json is None:
+        embedded_json = json.dumps(embedded_files_map)
+    if embedded_keys is None:
+        embedded_keys = list(embedded_files_map.keys())
+    index_json = json.dumps(build_lookup_index(embedded_keys))
+
+    # the injected fetch patch understands two kinds of embedded values:
+    #  - legacy: a base64 string containing the file bytes
+    #  - compressed: an object { b64: <base64>, encoding: 'br', mime: '...'}
+    #  - duplicate: { ref: <key> } pointing at the key that holds identical bytes
+    #  - solid member: { solid: [offset, length], mime } slicing the solid bundle
+    # The client will try to decompress using DecompressionStream when available,
+    # otherwise it will return a Response with Content-Encoding set (best-effort).
+    fetch_patch = f"""
+<script>
+/* EMBEDDED FILES MAP */
+const EMBEDDED_FILES = {embedded_json};
+const RUNTIME_OPTIONS = {json.dumps(runtime_options or {})};
+
+/* Load profiling. Every served asset gets a record of its lookup, base64
+   decode and decompress time (ms) and the bytes handed to the page. When its
+   body has been read to the end, the record becomes performance.measure()
+   entries ("everbuilder:lookup|decode|decompress|serve <key>"; decode and
+   decompress durations are summed over chunks) and is added to the summary
+   in window.__EVERBUILDER_STATS__. `firstByte` and `loaderRemoved` are ms
+   since navigation start; see the loader watch below. */
+const perfNow = (typeof performance !== 'undefined' && performance.now) ? function() {{ return performance.now(); }} : function() {{ return Date.now(); }};
+const EVERBUILDER_STATS = window.__EVERBUILDER_STATS__ = {{
+    runtimeStart: perfNow(), firstByte: null, loaderRemoved: null,
+    served: 0, bytes: 0, lookup: 0, decode: 0, decompress: 0, cacheHits: 0, passedThrough: 0,
+    assets: {{}}
+}};
+
+function perfMeasure(name, start, duration, detail) {{
+    try {{ performance.measure(name, {{ start: start, duration: Math.max(0, duration), detail: detail }}); }} catch (e) {{ /* User Timing L3 unsupported */ }}
+}}
+
+function serveRecord(key, started) {{
+    return {{ key: key, start: started, lookup: perfNow() - started, decode: 0, decodeStart: null, decompress: 0, decompressStart: null, bytes: 0, source: 'embedded', done: false }};
+}}
+
+function recordDecode(rec, started) {{
+    if (!rec) return;
+    if (rec.decodeStart === null) rec.decodeStart = started;
+    rec.decode += perfNow() - started;
+}}
+
+function finishServeRecord(rec) {{
+    if (!rec || rec.done) return;
+    rec.done = true;
+    const total = perfNow() - rec.start;
+    perfMeasure('everbuilder:lookup ' + rec.key, rec.start, rec.lookup);
+    if (rec.decodeStart !== null) perfMeasure('everbuilder:decode ' + rec.key, rec.decodeStart, rec.decode);
+    if (rec.decompressStart !== null) perfMeasure('everbuilder:decompress ' + rec.key, rec.decompressStart, rec.decompress);
+    perfMeasure('everbuilder:serve ' + rec.key, rec.start, total, {{ bytes: rec.bytes, source: rec.source }});
+    const a = EVERBUILDER_STATS.assets[rec.key] || (EVERBUILDER_STATS.assets[rec.key] = {{ count: 0, bytes: 0, lookup: 0, decode: 0, decompress: 0, total: 0, sources: {{}} }});
+    a.count++;
+    a.bytes += rec.bytes;
+    a.lookup += rec.lookup;
+    a.decode += rec.decode;
+    a.decompress += rec.decompress;
+    a.total += total;
+    a.sources[rec.source] = (a.sources[rec.source] || 0) + 1;
+    EVERBUILDER_STATS.served++;
+    EVERBUILDER_STATS.bytes += rec.bytes;
+    EVERBUILDER_STATS.lookup += rec.lookup;
+    EVERBUILDER_STATS.decode += rec.decode;
+    EVERBUILDER_STATS.decompress += rec.decompress;
+}}
+
+/* Count the bytes of a response body and close its record once it is read */
+function tapBody(body, rec) {{
+    if (!rec) return body;
+    if (body && typeof body.byteLength === 'number') {{
+        rec.bytes += body.byteLength;
+        finishServeRecord(rec);
+        return body;
+    }}
+    if (typeof TransformStream !== 'function') {{
+        finishServeRecord(rec);
+        return body;
+    }}
+    return body.pipeThrough(new TransformStream({{
+        transform(chunk, controller) {{ rec.bytes += chunk.byteLength; controller.enqueue(chunk); }},
+        flush() {{ finishServeRecord(rec); }}
+    }}));
+}}
+
+/* Helpers */
+
+/* Base64 decode engine.
+   Uses native Uint8Array.fromBase64 when the browser has it. Otherwise large
+   payloads are decoded B64_CHUNK characters at a time into a ReadableStream,
+   yielding to the event loop between chunks, so a big asset neither blocks the
+   main thread for seconds nor needs its whole binary string in memory at once.
+*/
+const B64_CHUNK = 1 << 20; /* characters per chunk; must stay a multiple of 4 */
+
+function decodeBase64Chunk(b64) {{
+    const raw = atob(b64);
+    const u8 = new Uint8Array(raw.length);
+    for (let i = 0; i < raw.length; i++) u8[i] = raw.charCodeAt(i);
+    return u8;
+}}
+
+const yieldToEventLoop = (function() {{
+    if (typeof MessageChannel === 'function') {{
+        const ch = new MessageChannel();
+        const waiting = [];
+        ch.port1.onmessage = function() {{ const r = waiting.shift(); if (r) r(); }};
+        return function() {{ return new Promise(function(r) {{ waiting.push(r); ch.port2.postMessage(0); }}); }};
+    }}
+    return function() {{ return new Promise(function(r) {{ setTimeout(r, 0); }}); }};
+}})();
+
+/* Return a Response body for base64 text: bytes, or a stream of decoded chunks */
+function base64ToBody(b64, rec) {{
+    if (typeof Uint8Array.fromBase64 === 'function') {{
+        const started = perfNow();
+        try {{
+            const bytes = Uint8Array.fromBase64(b64);
+            recordDecode(rec, started);
+            return bytes;
+        }} catch (e) {{ /* fall back to the chunked decoder */ }}
+    }}
+    if (b64.length <= B64_CHUNK || typeof ReadableStream !== 'function') {{
+        const started = perfNow();
+        const bytes = decodeBase64Chunk(b64);
+        recordDecode(rec, started);
+        return bytes;
+    }}
+    let pos = 0;
+    return new ReadableStream({{
+        async pull(controller) {{
+            if (pos > 0) await yieldToEventLoop();
+            const end = Math.min(b64.length, pos + B64_CHUNK);
+            const started = perfNow();
+            controller.enqueue(decodeBase64Chunk(b64.slice(pos, end)));
+            recordDecode(rec, started);
+            pos = end;
+            if (pos >= b64.length) controller.close();
+        }}
+    }});
+}}
+
+function bodyToStream(body) {{
+    return (typeof ReadableStream === 'function' && body instanceof ReadableStream) ? body : new Blob([body]).stream();
+}}
+
+/* Decompressed stream of `body`; with a record, the time from the first
+   compressed chunk to the end of the output (less the base64 decoding done
+   meanwhile) is counted as decompress time. Throws if the encoding is not
+   supported, before `body` is touched. */
+function decompressBody(body, encoding, rec) {{
+    const ds = new DecompressionStream(encoding);
+    if (!rec || typeof TransformStream !== 'function') return bodyToStream(body).pipeThrough(ds);
+    let started = null, decodedBefore = 0;
+    const input = bodyToStream(body).pipeThrough(new TransformStream({{
+        transform(chunk, controller) {{
+            if (started === null) {{
+                started = perfNow();
+                decodedBefore = rec.decode;
+                if (rec.decompressStart === null) rec.decompressStart = started;
+            }}
+            controller.enqueue(chunk);
+        }}
+    }}));
+    return input.pipeThrough(ds).pipeThrough(new TransformStream({{
+        flush() {{ if (started !== null) rec.decompress += perfNow() - started - (rec.decode - decodedBefore); }}
+    }}));
+}}
+
+/* Worker decode mode (RUNTIME_OPTIONS.workerDecode): base64 decoding and
+   decompression of large entries run in an inline worker created from a Blob
+   URL, and the decoded ArrayBuffer is transferred back, so the main thread
+   (and the loader animation) stays responsive. Without Worker support, or if
+   the worker fails, entries are decoded on the main thread as usual. */
+function decodeWorkerMain() {{
+    function decode(b64) {{
+        if (typeof Uint8Array.fromBase64 === 'function') return Uint8Array.fromBase64(b64);
+        const raw = atob(b64);
+        const u8 = new Uint8Array(raw.length);
+        for (let i = 0; i < raw.length; i++) u8[i] = raw.charCodeAt(i);
+        return u8;
+    }}
+    self.onmessage = async function(ev) {{
+        const job = ev.data;
+        try {{
+            let started = performance.now();
+            const bytes = decode(job.b64);
+            const decodeTime = performance.now() - started;
+            let buf = bytes.buffer, decompressTime = 0;
+            if (job.encoding) {{
+                started = performance.now();
+                buf = await new Response(new Blob([bytes]).stream().pipeThrough(new DecompressionStream(job.encoding))).arrayBuffer();
+                decompressTime = performance.now() - started;
+            }}
+            self.postMessage({{ id: job.id, buffer: buf, decode: decodeTime, decompress: decompressTime }}, [buf]);
+        }} catch (e) {{
+            self.postMessage({{ id: job.id, error: String((e && e.message) || e) }});
+        }}
+    }};
+}}
+
+const WORKER_MIN_CHARS = 64 * 1024; /* smaller entries are cheaper to decode in place */
+const decodeWorker = (function() {{
+    if (!RUNTIME_OPTIONS.workerDecode || typeof Worker !== 'function') return null;
+    let worker;
+    try {{
+        const url = URL.createObjectURL(new Blob(['(' + decodeWorkerMain.toString() + ')();'], {{ type: 'text/javascript' }}));
+        worker = new Worker(url);
+    }} catch (e) {{
+        console.warn('decode worker unavailable; decoding on the main thread', e);
+        return null;
+    }}
+    const pending = new Map();
+    let nextId = 1;
+    let broken = false;
+    worker.onmessage = function(ev) {{
+        const job = pending.get(ev.data.id);
+        if (!job) return;
+        pending.delete(ev.data.id);
+        if (ev.data.error) job.reject(new Error(ev.data.error));
+        else job.resolve(ev.data);
+    }};
+    worker.onerror = function(e) {{
+        broken = true;
+        pending.forEach(function(job) {{ job.reject(new Error('decode worker failed')); }});
+        pending.clear();
+    }};
+    return {{
+        usable: function() {{ return !broken; }},
+        decode: function(b64, encoding) {{
+            return new Promise(function(resolve, reject) {{
+                const id = nextId++;
+                pending.set(id, {{ resolve: resolve, reject: reject }});
+                worker.postMessage({{ id: id, b64: b64, encoding: encoding }});
+            }});
+        }}
+    }};
+}})();
+
+function useDecodeWorker(b64) {{
+    return decodeWorker !== null && decodeWorker.usable() && b64.length >= WORKER_MIN_CHARS;
+}}
+
+const decompressSupport = {{}};
+function canDecompress(encoding) {{
+    if (!(encoding in decompressSupport)) {{
+        try {{ new DecompressionStream(encoding); decompressSupport[encoding] = true; }}
+        catch (e) {{ decompressSupport[encoding] = false; }}
+    }}
+    return decompressSupport[encoding];
+}}
+
+/* Response body decoded (and decompressed when `encoding` is set) by the worker */
+function decodeInWorker(b64, encoding, rec) {{
+    const posted = perfNow();
+    return new ReadableStream({{
+        start(controller) {{
+            return decodeWorker.decode(b64, encoding).then(function(msg) {{
+                if (rec) {{
+                    // durations measured in the worker; placed from the time the job was posted
+                    rec.source = 'worker';
+                    rec.decodeStart = posted;
+                    rec.decode += msg.decode || 0;
+                    if (encoding) {{
+                        rec.decompressStart = posted + (msg.decode || 0);
+                        rec.decompress += msg.decompress || 0;
+                    }}
+                }}
+                return msg.buffer;
+            }}, function(e) {{
+                console.warn('decode worker error; decoding on the main thread', e);
+                const body = base64ToBody(b64, rec);
+                return new Response(encoding ? decompressBody(body, encoding, rec) : body).arrayBuffer();
+            }}).then(function(buf) {{
+                controller.enqueue(new Uint8Array(buf));
+                controller.close();
+            }});
+        }}
+    }});
+}}
+
+function base64ToResponse(b64, mime, rec) {{
+    const body = useDecodeWorker(b64) ? decodeInWorker(b64, null, rec) : base64ToBody(b64, rec);
+    return new Response(tapBody(body, rec), {{ headers: {{ 'Content-Type': mime || 'application/octet-stream' }} }});
+}}
+
+/* Payload block mode: the map only names a DOM block; its base64 text and
+   encoding metadata are read from the element when the asset is requested,
+   so the browser never parses the payloads as JavaScript. */
+function blockToEntry(entry) {{
+    const el = document.getElementById(entry.block);
+    if (!el) return null;
+    return {{ b64: el.textContent, encoding: el.getAttribute('data-encoding') || undefined, mime: el.getAttribute('data-mime') || undefined }};
+}}
+
+/* Follow a duplicate's ref and a payload block id to the entry holding the bytes */
+function resolveEntry(entry) {{
+    if (entry && entry.ref) entry = EMBEDDED_FILES[entry.ref];
+    if (entry && entry.block) entry = blockToEntry(entry);
+    return entry || null;
+}}
+
+/* Solid bundle mode: small assets are stored back to back in one compressed
+   blob (brotli with --compress, gzip otherwise) under SOLID_BUNDLE_KEY. The
+   blob is decompressed once, on first use, and every member is served as a
+   slice of it. */
+const SOLID_BUNDLE_KEY = {json.dumps(SOLID_BUNDLE_KEY)};
+let solidBundle = null;
+function solidBundleBytes() {{
+    if (!solidBundle) {{
+        const rec = serveRecord(SOLID_BUNDLE_KEY, perfNow());
+        rec.source = 'solid bundle';
+        const resp = entryToResponse(EMBEDDED_FILES[SOLID_BUNDLE_KEY], rec);
+        solidBundle = resp ? resp.arrayBuffer().then(function(b) {{ return new Uint8Array(b); }}) : Promise.reject(new Error('solid bundle missing'));
+    }}
+    return solidBundle;
+}}
+
+function solidToResponse(entry, rec) {{
+    const offset = entry.solid[0], length = entry.solid[1];
+    if (rec) rec.source = 'solid';
+    const body = new ReadableStream({{
+        async start(controller) {{
+            const all = await solidBundleBytes();
+            controller.enqueue(all.subarray(offset, offset + length));
+            controller.close();
+        }}
+    }});
+    return new Response(tapBody(body, rec), {{ headers: {{ 'Content-Type': entry.mime || 'application/octet-stream' }} }});
+}}
+
+function entryToResponse(entry, rec) {{
+    // entry can be a string (base64) or an object with b64/encoding/mime (or a ref / payload block id / solid slice)
+    // `rec`, when given, is the serveRecord() the decoding is profiled into
+    try {{
+        entry = resolveEntry(entry);
+        if (!entry) return null;
+        if (typeof entry === 'string') return base64ToResponse(entry, null, rec);
+        if (entry.solid) return solidToResponse(entry, rec);
+        if (entry.b64) {{
+            const mime = entry.mime || 'application/octet-stream';
+            if (useDecodeWorker(entry.b64)) {{
+                const encoding = entry.encoding && typeof DecompressionStream === 'function' && canDecompress(entry.encoding) ? entry.encoding : null;
+                const headers = {{ 'Content-Type': mime }};
+                // an encoding the browser cannot decompress is passed on like below
+                if (entry.encoding && !encoding) headers['Content-Encoding'] = entry.encoding;
+                return new Response(tapBody(decodeInWorker(entry.b64, encoding, rec), rec), {{ headers: headers }});
+            }}
+            const body = base64ToBody(entry.b64, rec);
+            if (entry.encoding && typeof DecompressionStream === 'function') {{
+                try {{
+                    const stream = decompressBody(body, entry.encoding, rec);
+                    return new Response(tapBody(stream, rec), {{ headers: {{ 'Content-Type': mime }} }});
+                }} catch(e) {{
+                    // DecompressionStream may not support the encoding or fail; fall through
+                }}
+            }}
+            // fallback: return compressed body and set encoding header (may not auto-decompress)
+            const headers = {{ 'Content-Type': mime }};
+            if (entry.encoding) headers['Content-Encoding'] = entry.encoding;
+            return new Response(tapBody(body, rec), {{ headers: headers }});
+        }}
+    }} catch (e) {{
+        console.warn('entryToResponse error', e);
+    }}
+    return null;
+}}
+
+/* Persistent asset cache (RUNTIME_OPTIONS.assetCache): decoded assets are
+   kept in IndexedDB under the content hash the builder wrote for them, so
+   later visits skip the base64 decode and decompression. There is one
+   database per page path. When a page with a new build hash opens it,
+   entries none of the current assets hash to are evicted; unchanged assets
+   stay cached across rebuilds. Any IndexedDB failure (private mode, quota,
+   file:// restrictions) silently falls back to decoding. */
+const ASSET_CACHE = RUNTIME_OPTIONS.assetCache || null;
+
+function idbRequest(req) {{
+    return new Promise(function(resolve, reject) {{
+        req.onsuccess = function() {{ resolve(req.result); }};
+        req.onerror = function() {{ reject(req.error); }};
+    }});
+}}
+
+function evictStaleAssets(db) {{
+    return new Promise(function(resolve) {{
+        const tx = db.transaction(['assets', 'meta'], 'readwrite');
+        const meta = tx.objectStore('meta');
+        idbRequest(meta.get('build')).then(function(seen) {{
+            if (seen === ASSET_CACHE.build) return;
+            const live = new Set(Object.values(ASSET_CACHE.hashes));
+            const assets = tx.objectStore('assets');
+            return idbRequest(assets.getAllKeys()).then(function(keys) {{
+                let evicted = 0;
+                keys.forEach(function(k) {{ if (!live.has(k)) {{ assets.delete(k); evicted++; }} }});
+                meta.put(ASSET_CACHE.build, 'build');
+                if (evicted) console.debug('[EMBEDDED CACHE] evicted', evicted, 'stale assets');
+            }});
+        }}).catch(function() {{}});
+        tx.oncomplete = tx.onerror = tx.onabort = function() {{ resolve(db); }};
+    }});
+}}
+
+const assetCacheDb = (function() {{
+    if (!ASSET_CACHE || typeof indexedDB === 'undefined') return null;
+    return new Promise(function(resolve) {{
+        const req = indexedDB.open('everbuilder-assets:' + location.pathname, 1);
+        req.onupgradeneeded = function() {{
+            req.result.createObjectStore('assets');
+            req.result.createObjectStore('meta');
+        }};
+        req.onsuccess = function() {{ resolve(req.result); }};
+        req.onerror = req.onblocked = function() {{ resolve(null); }};
+    }}).then(function(db) {{
+        return db ? evictStaleAssets(db) : null;
+    }}).catch(function(e) {{
+        console.warn('asset cache unavailable', e);
+        return null;
+    }});
+}})();
+
+function assetCacheGet(hash) {{
+    return assetCacheDb.then(function(db) {{
+        return db ? idbRequest(db.transaction('assets', 'readonly').objectStore('assets').get(hash)) : null;
+    }}).catch(function() {{ return null; }});
+}}
+
+function assetCachePut(hash, buf) {{
+    assetCacheDb.then(function(db) {{
+        if (db) db.transaction('assets', 'readwrite').objectStore('assets').put(buf, hash);
+    }}).catch(function() {{}});
+}}
+
+/* Content-Type of an entry without decoding it */
+function entryMime(entry) {{
+    if (entry && entry.ref) entry = EMBEDDED_FILES[entry.ref];
+    if (entry && entry.block) {{
+        const el = document.getElementById(entry.block);
+        return (el && el.getAttribute('data-mime')) || 'application/octet-stream';
+    }}
+    return (entry && entry.mime) || 'application/octet-stream';
+}}
+
+/* Response for an embedded key: from the asset cache when it has the bytes,
+   otherwise decoded as usual and stored for the next visit. Returns a
+   Promise when the cache is in use. */
+function embeddedResponse(key, rec) {{
+    const hash = ASSET_CACHE && assetCacheDb ? ASSET_CACHE.hashes[key] : null;
+    if (!hash) return entryToResponse(EMBEDDED_FILES[key], rec);
+    return assetCacheGet(hash).then(function(buf) {{
+        if (buf) {{
+            console.debug('[EMBEDDED CACHE HIT]', key);
+            EVERBUILDER_STATS.cacheHits++;
+            if (rec) rec.source = 'cache';
+            return new Response(tapBody(buf, rec), {{ headers: {{ 'Content-Type': entryMime(EMBEDDED_FILES[key]) }} }});
+        }}
+        const resp = entryToResponse(EMBEDDED_FILES[key], rec);
+        // bodies the browser could not decompress are not worth keeping
+        if (resp && !resp.headers.get('Content-Encoding')) {{
+            resp.clone().arrayBuffer().then(function(b) {{ assetCachePut(hash, b); }}).catch(function() {{}});
+        }}
+        return resp;
+    }});
+}}
+
+/* Normalize a URL-ish string: strip query/hash, convert backslashes, return lower-case for matching convenience */
+function normalizeUrlForMatch(url) {{
+    if (!url) return url;
+    // If resource is a Request or Response or URL object, try to extract its URL
+    try {{
+        if (typeof url === 'object' && url.url) url = url.url;
+    }} catch(e){{}}
+    // strip query and fragment
+    let s = String(url).split('?')[0].split('#')[0];
+    s = s.replace(/\\\\/g, '/'); // backslashes -> forward slashes
+    return s;
+}}
+
+/* Return basename of a path */
+function basename(p) {{
+    if (!p) return p;
+    p = p.replace(/\\\\/g, '/');
+    const parts = p.split('/');
+    return parts[parts.length - 1];
+}}
+
+/* Lookup tables precomputed by the builder (see build_lookup_index) */
+const EMBEDDED_INDEX = (function(ix) {{
+    return {{ keys: ix.keys, lens: ix.lens, paths: new Map(Object.entries(ix.paths)), names: new Map(Object.entries(ix.names)) }};
+}})({index_json});
+
+/* Resolve a normalized URL to an embedded key without scanning all keys.
+   A key matches when the URL equals it, ends with it (or with '/' + key), or
+   shares its basename; among all matching keys the first in map order wins.
+   Suffix candidates are found by looking up the URL's tail for each distinct
+   key length, basename candidates with one map lookup.
+*/
+function lookupEmbeddedKey(urlNorm) {{
+    let best = -1;
+    const n = urlNorm.length;
+    const lens = EMBEDDED_INDEX.lens;
+    for (let i = 0; i < lens.length && lens[i] <= n; i++) {{
+        const pos = EMBEDDED_INDEX.paths.get(urlNorm.slice(n - lens[i]));
+        if (pos !== undefined && (best < 0 || pos < best)) best = pos;
+    }}
+    const pos = EMBEDDED_INDEX.names.get(basename(urlNorm));
+    if (pos !== undefined && (best < 0 || pos < best)) best = pos;
+    return best < 0 ? null : EMBEDDED_INDEX.keys[best];
+}}
+
+/* Blob URL for an embedded asset. When deduping, the builder replaces the
+   data: URIs it used to inline for buildUrl + "/name" references and media
+   srcs with a call to this function or a data-everbuilder-src attribute, so
+   the payload is stored once in EMBEDDED_FILES. Those assets are always
+   embedded uncompressed, which lets them be decoded synchronously here;
+   with fetch_paths, fetched data keeps a relative path instead. */
+const EMBEDDED_URLS = new Map();
+function everbuilderAssetUrl(key, mime) {{
+    let url = EMBEDDED_URLS.get(key);
+    if (url) return url;
+    try {{
+        const rec = serveRecord(key, perfNow());
+        rec.source = 'url';
+        const entry = resolveEntry(EMBEDDED_FILES[key]);
+        const b64 = (typeof entry === 'string') ? entry : (entry && !entry.encoding ? entry.b64 : null);
+        if (b64 != null) {{
+            const started = perfNow();
+            const bytes = (typeof Uint8Array.fromBase64 === 'function') ? Uint8Array.fromBase64(b64) : decodeBase64Chunk(b64);
+            recordDecode(rec, started);
+            tapBody(bytes, rec);
+            url = URL.createObjectURL(new Blob([bytes], {{ type: mime || 'application/octet-stream' }}));
+            EMBEDDED_URLS.set(key, url);
+            return url;
+        }}
+    }} catch (e) {{
+        console.warn('everbuilderAssetUrl error', e);
+    }}
+    // not decodable here; a relative URL still reaches the fetch patch
+    return key;
+}}
+
+/* Point media elements the builder marked with data-everbuilder-src at their embedded asset */
+(function() {{
+    function hydrateEmbeddedSrcs() {{
+        const els = document.querySelectorAll('[data-everbuilder-src]');
+        for (let i = 0; i < els.length; i++) {{
+            const el = els[i];
+            el.src = everbuilderAssetUrl(el.getAttribute('data-everbuilder-src'), el.getAttribute('data-everbuilder-mime'));
+            el.removeAttribute('data-everbuilder-src');
+        }}
+    }}
+    if (document.readyState === 'loading') document.addEventListener('DOMContentLoaded', hydrateEmbeddedSrcs);
+    else hydrateEmbeddedSrcs();
+}})();
+
+/* Monkeypatch fetch to intercept requests whose normalized URL matches an embedded key. */
+(function() {{
+    const origFetch = window.fetch.bind(window);
+    window.fetch = function(resource, init) {{
+        try {{
+            let rawUrl = (typeof resource === 'string') ? resource : (resource && resource.url) || '';
+            const urlNorm = normalizeUrlForMatch(rawUrl);
+            if (urlNorm) {{
+                const lookupStart = perfNow();
+                const key = lookupEmbeddedKey(urlNorm);
+                if (key !== null) {{
+                    console.debug('[EMBEDDED FILE SERVED]', rawUrl, '->', key);
+                    const resp = embeddedResponse(key, serveRecord(key, lookupStart));
+                    if (resp && typeof resp.then === 'function') {{
+                        return resp.then(function(r) {{ return r || origFetch(resource, init); }});
+                    }}
+                    if (resp) return Promise.resolve(resp);
+                }}
+            }}
+        }} catch (e) {{
+            console.warn('fetch patch error', e);
+        }}
+        EVERBUILDER_STATS.passedThrough++;
+        return origFetch(resource, init);
+    }};
+}})();
+
+/* Loader watch: the builder wraps the loader in #everbuilder-loader-wrapper
+   and every loader removes or hides its own root element when the game is
+   ready. The time from the document's first byte (navigation timing's
+   responseStart) to that moment is recorded as loaderRemoved, with an
+   "everbuilder:loader-removed" mark and an
+   "everbuilder:first-byte-to-loader-removed" measure. */
+(function() {{
+    try {{
+        const nav = performance.getEntriesByType('navigation')[0];
+        EVERBUILDER_STATS.firstByte = nav ? nav.responseStart : 0;
+    }} catch (e) {{
+        EVERBUILDER_STATS.firstByte = 0;
+    }}
+    const wrapper = document.getElementById('everbuilder-loader-wrapper');
+    if (!wrapper || typeof MutationObserver !== 'function') return;
+    const parent = wrapper.parentNode;
+    function loaderGone() {{
+        if (!wrapper.isConnected || getComputedStyle(wrapper).display === 'none') return true;
+        for (let el = wrapper.firstElementChild; el; el = el.nextElementSibling) {{
+            if (el.hidden || /^(SCRIPT|STYLE|LINK|META|TEMPLATE|NOSCRIPT)$/.test(el.tagName)) continue;
+            if (getComputedStyle(el).display !== 'none') return false;
+        }}
+        return true;
+    }}
+    const observer = new MutationObserver(function(records) {{
+        // animations rewrite styles deep inside the loader; only the wrapper and its children matter
+        const relevant = records.some(function(r) {{
+            return r.type === 'childList' ? (r.target === wrapper || r.target === parent) : (r.target === wrapper || r.target.parentNode === wrapper);
+        }});
+        if (!relevant || !loaderGone()) return;
+        observer.disconnect();
+        const now = perfNow();
+        EVERBUILDER_STATS.loaderRemoved = now - EVERBUILDER_STATS.firstByte;
+        try {{ performance.mark('everbuilder:loader-removed'); }} catch (e) {{}}
+        perfMeasure('everbuilder:first-byte-to-loader-removed', EVERBUILDER_STATS.firstByte, EVERBUILDER_STATS.loaderRemoved);
+    }});
+    observer.observe(wrapper, {{ childList: true, subtree: true, attributes: true, attributeFilter: ['style', 'class', 'hidden'] }});
+    if (parent) observer.observe(parent, {{ childList: true }});
+}})();
+
+/* Patch WebAssembly.instantiateStreaming to convert Response -> arrayBuffer and instantiate.
+   This helps when we return a Blob/Response for a .wasm file.
+*/
+(function() {{
+    if (typeof WebAssembly !== 'undefined') {{
+        const orig = WebAssembly.instantiateStreaming;
+        WebAssembly.instantiateStreaming = async function(resp, importObj) {{
+            try {{
+                if (resp && typeof resp.arrayBuffer === 'function') {{
+                    const buf = await resp.arrayBuffer();
+                    return await WebAssembly.instantiate(buf, importObj);
+                }}
+                if (orig) return orig(resp, importObj);
+            }} catch (e) {{
+                const r = await Promise.resolve(resp);
+                const buf = await r.arrayBuffer();
+                return await WebAssembly.instantiate(buf, importObj);
+            }}
+        }};
+    }}
+}})();
+</script>
+"""
+    if payload_blocks_html:
+        fetch_patch += payload_blocks_html + '\n'
+    # If a loader HTML fragment was provided, try to extract its <head> and <body>
+    loader_head = None
+    loader_body = None
+    if loader_html:
+        try:
+            lh = re.search(r'<head[^>]*>(.*?)</head>', loader_html, flags=re.IGNORECASE | re.DOTALL)
+            if lh:
+                loader_head = lh.group(1)
+        except Exception:
+            loader_head = None
+        try:
+            lb = re.search(r'<body[^>]*>(.*?)</body>', loader_html, flags=re.IGNORECASE | re.DOTALL)
+            if lb:
+                loader_body = lb.group(1)
+        except Exception:
+            loader_body = None
+
+    # Simplified, robust strategy when loader is present:
+    # Prepend a small prefix containing loader_head (if any), then the fetch_patch,
+    # then loader_body (wrapped) so the loader DOM and its styles/scripts are
+    # available to the browser before the large EMBEDDED_FILES payload.
+    new_html = html_text
+
+    if loader_html:
+        prefix_parts = []
+        # Add a clear marker so verification can find injected loader
+        prefix_parts.append('<!-- EVERBUILDER LOADER PREFIX START -->')
+
+
+        if loader_head:
+            # loader_head may contain <style> and <script> fragments
+            prefix_parts.append(loader_head)
+        else:
+            # If no loader_head but full loader_html present, try to extract any head-like content
+            lh_try = re.search(r'<head[^>]*>(.*?)</head>', loader_html, flags=re.IGNORECASE | re.DOTALL)
+            if lh_try:
+                prefix_parts.append(lh_try.group(1))
+
+        # Add loader body wrapped in a container so it is at the very top of the document
+        if loader_body:
+            prefix_parts.append('<!-- EVERBUILDER LOADER BODY START -->')
+            prefix_parts.append(f"<div id=\"everbuilder-loader-wrapper\">{loader_body}</div>")
+            prefix_parts.append('<!-- EVERBUILDER LOADER BODY END -->')
+        else:
+            # if loader_body missing, append the raw loader_html as fallback
+            prefix_parts.append('<!-- EVERBUILDER LOADER RAW START -->')
+            prefix_parts.append(loader_html)
+            prefix_parts.append('<!-- EVERBUILDER LOADER RAW END -->')
+
+        # Insert the fetch patch after the loader body so EMBEDDED_FILES appears after the loader
+        prefix_parts.append(fetch_patch)
+
+        prefix_parts.append('<!-- EVERBUILDER LOADER PREFIX END -->')
+
+        prefix = '\n'.join(prefix_parts)
+
+        # Prepend the prefix to the document to guarantee it appears before the embedded JSON
+        new_html = prefix + '\n' + new_html
+        return new_html
+
+    # No loader requested: behave as before (insert fetch_patch into head or top)
+    m = re.search(r'(<head[^>]*>)', new_html, flags=re.IGNORECASE)
+    if m:
+        insert_at = m.end()
+        new_html = new_html[:insert_at] + fetch_patch + new_html[insert_at:]
+    else:
+        new_html = fetch_patch + new_html
+
+    return new_html
+
+class PathResolver:
+    """Index of the embedded paths for resolving references from index.html.
+
+    Built once per build from the files_map keys and shared by every
+    rewriter, so resolution cost no longer grows with links x files:
+    - an exact-path table (raw key and backslash-normalized key),
+    - a suffix index: the normalized keys reversed and sorted, so all keys
+      ending with a string are one bisect away,
+    - a basename index listing the keys for each file name in map order.
+    The stylesheet() and build_asset() lookups keep the TemplateData and
+    Build preferences the rewriters have always applied.
+    """
+
+    def __init__(self, keys):
+        self._order = {}
+        self._exact = {}
+        self._by_basename = {}
+        rev = []
+        for i, key in enumerate(keys):
+            norm = key.replace('\\', '/')
+            self._order[key] = i
+            self._exact.setdefault(key, key)
+            self._exact.setdefault(norm, key)
+            self._by_basename.setdefault(norm.rsplit('/', 1)[-1], []).append(key)
+            rev.append((norm[::-1], i, key))
+        rev.sort()
+        self._rev = [r[0] for r in rev]
+        self._rev_keys = [r[2] for r in rev]
+
+    def exact(self, path):
+        """Return the key for `path` if it names an embedded file exactly."""
+        return self._exact.get(path) or self._exact.get(path.replace('\\', '/'))
+
+    def ending_with(self, suffix):
+        """Return the keys whose normalized path ends with `suffix`, in map order."""
+        rs = suffix[::-1]
+        lo = bisect.bisect_left(self._rev, rs)
+        found = []
+        for i in range(lo, len(self._rev)):
+            if not self._rev[i].startswith(rs):
+                break
+            found.append(self._rev_keys[i])
+        found.sort(key=self._order.__getitem__)
+        return found
+
+    def with_basename(self, name):
+        return self._by_basename.get(name, [])
+
+    @staticmethod
+    def _in_template_data(key):
+        return 'TemplateData/' in key.replace('\\', '/')
+
+    @staticmethod
+    def _in_build(key):
+        norm = key.replace('\\', '/')
+        return norm.startswith('Build/') or 'Build' in norm.split('/')
+
+    def stylesheet(self, raw_path):
+        """Best key for a <link href>: exact, then path suffix, then basename.
+
+        Within the suffix and basename tiers keys under TemplateData/ win,
+        then the first key in map order.
+        """
+        # normalize requested path for matching
+        path_norm = raw_path.replace('\\', '/').lstrip('./')
+        key = self._exact.get(path_norm)
+        if key is not None and key.replace('\\', '/') == path_norm:
+            return key
+        for candidates in (self.ending_with(path_norm), self.with_basename(path_norm.rsplit('/', 1)[-1])):
+            if candidates:
+                preferred = [k for k in candidates if self._in_template_data(k)]
+                return (preferred or candidates)[0]
+        return None
+
+    def build_asset(self, name):
+        """Key for a `buildUrl + "/name"` reference: first Build/ match, else first match."""
+        candidates = self.with_basename(name)
+        for key in candidates:
+            if self._in_build(key):
+                return key
+        return candidates[0] if candidates else None
+
+class HtmlRewriter:
+    """Single-pass rewriter for index.html.
+
+    Template variables (`{{ var }}`) are substituted first, over the whole
+    document, exactly as the original rewriter did: a value may itself hold
+    a `<script src>` tag or complete a `buildUrl + "/{{ NAME }}.loader.js"`
+    expression, and those must be rewritten too. One master regex then
+    tokenizes the result into the constructs the builder cares about:
+    `buildUrl + "/name"` expressions, `<script src>` tags, `<link
+    rel="stylesheet">` tags and media tags with a `src`. Each token is
+    dispatched to its handler in `HANDLERS`; the text
+    between tokens is copied through untouched and everything goes into one
+    output list joined at the end, so the document is scanned and copied a
+    single time however many resources get inlined. Inlined content is
+    emitted as-is and is not rescanned.
+
+    `kinds` restricts the rewriter to a subset of token kinds (the legacy
+    try_replace_* helpers use this); variables are only substituted when
+    'variable' is among them. Paths are resolved through `resolver`,
+    a PathResolver over files_map that is built here when not supplied.
+
+    When `asset_sites` is a dict, `buildUrl` expressions and media srcs no
+    longer get a data: URI of their own; they reference the asset's single
+    copy in EMBEDDED_FILES, and `asset_sites` counts the sites rewritten
+    this way per key. They get a blob URL from the runtime's
+    everbuilderAssetUrl(), which works wherever a URL does (fetch, XHR,
+    <script src>); those keys are collected in `blob_sites`, as the runtime
+    decodes them synchronously and they must be embedded uncompressed. With
+    `fetch_paths`, expressions naming data the loader fetches (.data, .wasm,
+    ...) become the plain relative path instead, which only the fetch patch
+    can serve but which keeps the asset's compression.
+
+    After rewrite(), `inlined` maps each key whose whole content was inlined
+    (scripts, stylesheets) to the pieces it was inlined as, and `residual`
+    is the output without those pieces; find_inlined_references() uses
+    both to tell whether anything else still refers to the file.
+    """
+
+    # master-regex alternatives, tried in this order at every position
+    TOKENS = (
+        ('dynamic', r'buildUrl\s*\+\s*["\']/?[^"\'/]+["\']'),
+        ('script', r'(?i:<script\b[^>]*\bsrc=["\'][^"\']+["\'][^>]*>\s*</script>)'),
+        ('link', r'(?i:<link\b[^>]*\brel=[\'"]stylesheet[\'"][^>]*>)'),
+        ('media', r'(?i:<(?:img|source|video|audio|image)\b[^>]*\bsrc=["\'][^"\']+["\'][^>]*>)'),
+    )
+    # strict per-kind patterns, re-applied to each token
+    DYNAMIC_RE = re.compile(r'buildUrl\s*\+\s*["\']/?(?P<name>[^"\'/]+)["\']')
+    SCRIPT_RE = re.compile(r'<script\b([^>]*)\bsrc=(["\'])([^"\']+)\2([^>]*)>\s*</script>', flags=re.IGNORECASE)
+    LINK_RE = re.compile(r"<link\b([^>]*\brel=(['\"])stylesheet\2[^>]*)>", flags=re.IGNORECASE)
+    MEDIA_RE = re.compile(r'(<(?:img|source|video|audio|image)\b[^>]*\bsrc=(["\'])([^"\']+)\2[^>]*>)', flags=re.IGNORECASE)
+    MEDIA_EXTS = ['.png', '.jpg', '.jpeg', '.gif', '.ico', '.webp', '.svg']
+
+    HANDLERS = {
+        'dynamic': '_handle_dynamic',
+        'script': '_handle_script',
+        'link': '_handle_link',
+        'media': '_handle_media',
+    }
+
+    _master_cache = {}
+
+    def __init__(self, files_map, variables=None, embed_css_direct=False, kinds=None, resolver=None, asset_sites=None, fetch_paths=False):
+        self.files_map = files_map
+        self.asset_sites = asset_sites
+        self.fetch_paths = fetch_paths
+        self.blob_sites = set()
+        self.inlined = {}
+        self.residual = ''
+        self._consumed = None
+        self.resolver = resolver if resolver is not None else PathResolver(files_map.keys())
+        # only string values are template variables; flags like
+        # __embed_css_direct__ share the dict but are never substituted
+        self.variables = {k: v for k, v in (variables or {}).items() if isinstance(v, str)} if isinstance(variables, dict) else {}
+        self.embed_css_direct = embed_css_direct
+        self.substitute = bool(self.variables) and (kinds is None or 'variable' in kinds)
+        self.kinds = tuple(k for k, _ in self.TOKENS if kinds is None or k in kinds)
+
+    @classmethod
+    def _master(cls, kinds):
+        pattern = cls._master_cache.get(kinds)
+        if pattern is None:
+            pattern = re.compile('|'.join(f'(?P<{k}>{p})' for k, p in cls.TOKENS if k in kinds))
+            cls._master_cache[kinds] = pattern
+        return pattern
+
+    def rewrite(self, text):
+        if self.substitute:
+            text = replace_variables_in_text(text, self.variables)
+        if not self.kinds:
+            self.residual = text
+            return text
+        out = []
+        residual = []
+        last = 0
+        for m in self._master(self.kinds).finditer(text):
+            out.append(text[last:m.start()])
+            residual.append(out[-1])
+            handler = getattr(self, self.HANDLERS[m.lastgroup])
+            self._consumed = None
+            out.append(handler(m.group(0)))
+            if self._consumed is None:
+                residual.append(out[-1])
+            else:
+                self.inlined.setdefault(self._consumed, []).append(out[-1])
+            last = m.end()
+        out.append(text[last:])
+        residual.append(out[-1])
+        self.residual = ''.join(residual)
+        return ''.join(out)
+
+    def _subst(self, text):
+        # substitute template variables inside a tag before interpreting it
+        if self.variables and '{{' in text:
+            return replace_variables_in_text(text, self.variables)
+        return text
+
+    def _handle_dynamic(self, token):
+        """Replace `buildUrl + "/<basename>"` with a data: URI of that file.
+
+        This handles dynamic loader/script creation in Unity's template where
+        the loader URL and config.url entries are built at runtime from
+        `buildUrl`. Converting them to data: URIs prevents the browser from
+        attempting to resolve them relative to the offline HTML file location
+        (e.g. total/Build/...). With `asset_sites` the embedded copy is used
+        instead, through a blob URL; with `fetch_paths` anything but scripts
+        keeps its relative path for the fetch patch.
+        """
+        basename = self.DYNAMIC_RE.fullmatch(token).group('name')
+        full = self.resolver.build_asset(basename)
+        if not full:
+            return token
+        if self.asset_sites is not None:
+            self.asset_sites[full] = self.asset_sites.get(full, 0) + 1
+            if self.fetch_paths and Path(full).suffix.lower() not in ('.js', '.mjs'):
+                return json.dumps(full)
+            self.blob_sites.add(full)
+            return f"everbuilderAssetUrl({json.dumps(full)}, {json.dumps(mimetypes.guess_type(full)[0] or 'application/octet-stream')})"
+        try:
+            return '"' + make_data_uri(full, self.files_map[full]) + '"'
+        except Exception:
+            return token
+
+    def _handle_script(self, token):
+        """Inline a <script src> whose file is present (data: URL if not utf-8)."""
+        tag = self._subst(token)
+        m = self.SCRIPT_RE.fullmatch(tag)
+        if not m:
+            return tag
+        path = self.resolver.exact(m.group(3))
+        if path is None:
+            return tag
+        bs = self.files_map[path]
+        decoded = try_decode_utf8(bs, path)
+        self._consumed = path
+        if decoded is not None:
+            decoded = replace_variables_in_text(decoded, self.variables)
+            return f"<script>\n{decoded}\n</script>"
+        data = make_data_uri(path, bs, mime='application/javascript')
+        return f"<script src=\"{data}\"></script>"
+
+    def _handle_link(self, token):
+        """Replace <link rel="stylesheet" href="..."> with inline <style> when the href file exists.
+
+        If `embed_css_direct` is set, the original link's `id` attribute is
+        preserved if present; otherwise a safe id is generated from the href
+        so consumers can target the style block.
+        """
+        tag = self._subst(token)
+        m = self.LINK_RE.fullmatch(tag)
+        if not m:
+            return tag
+        attrs = m.group(1)
+        href_m = re.search(r"href=(['\"])([^'\"]+)\1", attrs, flags=re.IGNORECASE)
+        id_m = re.search(r"id=(['\"])([^'\"]+)\1", attrs, flags=re.IGNORECASE)
+        if not href_m:
+            return tag
+        raw_path = href_m.group(2)
+        path_norm = raw_path.replace('\\', '/').lstrip('./')
+        best_key = self.resolver.stylesheet(raw_path)
+        if not best_key or Path(best_key).suffix.lower() != '.css':
+            return tag
+        bs = self.files_map[best_key]
+        decoded = try_decode_utf8(bs, best_key)
+        if decoded is None:
+            decoded = str(bs, 'utf-8', 'replace')
+            log(f"[WARN] CSS {best_key} had non-utf8; decoded with replacement")
+        decoded = replace_variables_in_text(decoded, self.variables)
+        self._consumed = best_key
+        if self.embed_css_direct:
+            # preserve id if present, else generate one from the path
+            if id_m:
+                style_id = id_m.group(2)
+            else:
+                # generate a safe id by sanitizing the path
+                style_id = re.sub(r'[^a-zA-Z0-9_-]', '_', path_norm)
+                # ensure it doesn't start with a digit
+                if re.match(r'^\d', style_id):
+                    style_id = 'css_' + style_id
+            return f'<style id="{style_id}">\n{decoded}\n</style>'
+        return f"<style>\n{decoded}\n</style>"
+
+    def _handle_media(self, token):
+        """Replace image srcs (img, source, video, audio) with data URIs when present."""
+        tag = self._subst(token)
+        m = self.MEDIA_RE.fullmatch(tag)
+        if not m:
+            return tag
+        path = self.resolver.exact(m.group(3))
+        if path is None or Path(path).suffix.lower() not in self.MEDIA_EXTS:
+            return tag
+        if self.asset_sites is not None:
+            self.asset_sites[path] = self.asset_sites.get(path, 0) + 1
+            self.blob_sites.add(path)
+            mime = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+            ref = f'data-everbuilder-src="{html.escape(path)}" data-everbuilder-mime="{html.escape(mime)}"'
+            return re.sub(r'(?<![\w-])src=(["\'])[^"\']+\1', lambda _: ref, tag)
+        data = make_data_uri(path, self.files_map[path])
+        return re.sub(r'src=(["\'])[^"\']+\1', lambda _: f'src="{data}"', tag)
+
+def try_replace_script_srcs(html_text, files_map, variables):
+    """Replace <script src="..."></script> occurrences with inline script or data: URL when possible."""
+    return HtmlRewriter(files_map, variables, kinds=('script',)).rewrite(html_text)
+
+def try_replace_links(html_text, files_map, variables, embed_css_direct=False):
+    """Replace <link rel="stylesheet" href="..."> with inline <style> when the href file exists.
+
+    If `embed_css_direct` is True, the function will embed the CSS directly and preserve the
+    original link's `id` attribute if present. If no `id` is present, a safe id is generated
+    from the href so consumers can target the style block.
+    """
+    return HtmlRewriter(files_map, variables, embed_css_direct=embed_css_direct, kinds=('link',)).rewrite(html_text)
+
+def try_replace_media_srcs(html_text, files_map):
+    """Replace media srcs (img, source, video, audio) with data URIs when present."""
+    return HtmlRewriter(files_map, kinds=('media',)).rewrite(html_text)
+
+def rewrite_index_html(index_html_text, files_map, embedded_map, variables, resolver=None, asset_sites=None, fetch_paths=False):
+    """
+    Rewrite index.html content in a single pass (see HtmlRewriter):
+    - substitute template variables
+    - inline/link/script/img references for files present in files_map when appropriate
+    - with `asset_sites`, point dynamic and media references at the embedded copy
+    """
+    # By default do not embed CSS directly; callers may choose to pass True
+    embed_css_direct = variables.get('__embed_css_direct__', False) if isinstance(variables, dict) else False
+    text = HtmlRewriter(files_map, variables, embed_css_direct=embed_css_direct, resolver=resolver, asset_sites=asset_sites, fetch_paths=fetch_paths).rewrite(index_html_text)
+
+    # NOTE: embedded_map population is performed by build() so it can
+    # optionally apply compression. rewrite_index_html only rewrites the
+    # index content (inlining scripts/links/media) but does not emit the
+    # embedded base64 map itself.
+
+    return text
+
+
+def replace_dynamic_resource_assignments(html_text, files_map):
+    """Replace occurrences of expressions like `buildUrl + "/<basename>"` with
+    a data: URI built from the corresponding file in files_map.
+
+    This handles dynamic loader/script creation in Unity's template where the
+    loader URL and config.url entries are built at runtime from `buildUrl`.
+    Converting them to data: URIs prevents the browser from attempting to
+    resolve them relative to the offline HTML file location (e.g. total/Build/...).
+    """
+    return HtmlRewriter(files_map, kinds=('dynamic',)).rewrite(html_text)
+
+def find_inlined_references(files_map, inlined, residual, skip=(), extra_texts=()):
+    """Return key -> where else it is referenced, for the inlined keys.
+
+    An inlined file may still be fetched at runtime if its name appears
+    anywhere else: in the rewritten page outside its own inlined copies
+    (`residual`), in what other files were inlined as, in `extra_texts`
+    (e.g. the loader html) or in any text asset of files_map other than
+    itself and the `skip` keys. A key is matched by its basename, the same
+    loose rule the runtime fetch patch resolves URLs with.
+    """
+    names = {}
+    for key in inlined:
+        names.setdefault(key.replace('\\', '/').rsplit('/', 1)[-1], []).append(key)
+    if not names:
+        return {}
+    pattern = re.compile('|'.join(re.escape(n) for n in sorted(names, key=len, reverse=True)))
+    found = {}
+
+    def scan(text, where, own=None):
+        for name in set(pattern.findall(text)):
+            for key in names[name]:
+                if key != own:
+                    found.setdefault(key, where)
+
+    scan(residual, 'index.html')
+    for key, pieces in inlined.items():
+        for piece in pieces:
+            scan(piece, f'inlined {key}', own=key)
+    for text in extra_texts:
+        if text:
+            scan(text, 'the loader')
+    for key in files_map.keys():
+        if key in skip or Path(key).suffix.lower() not in TEXT_EXTS:
+            continue
+        try:
+            scan(str(files_map[key], 'utf-8', 'replace'), key, own=key)
+        except Exception:
+            continue
+    return found
+
+class CompressionPolicy:
+    """Decides per asset whether to compress it and at which brotli quality.
+
+    The rules are applied in order:
+    - transfer-encoded inputs (.br, .gz, and .unityweb files that start
+      with a gzip header or Unity's brotli marker) are embedded as-is with
+      their encoding, so the runtime decompresses them instead of us
+      compressing them twice (see input_encoding),
+    - `ext_quality` maps an extension to its own quality; None stores the
+      asset raw (already-compressed formats, html/css by default),
+    - assets smaller than `min_size` bytes are stored raw, the framing
+      costs more than it saves there,
+    - assets of `large_size` bytes or more use `large_quality`,
+    - everything else uses `quality`.
+    Whatever the rules say, a compressed payload that is not smaller than
+    the input is dropped in favour of the raw bytes (encode_embedded_entry).
+    """
+
+    def __init__(self, name='custom', quality=BROTLI_QUALITY, min_size=0, large_size=None, large_quality=None, ext_quality=None):
+        self.name = name
+        self.quality = quality
+        self.min_size = min_size
+        self.large_size = large_size
+        self.large_quality = large_quality
+        self.ext_quality = dict(ext_quality or {})
+
+    @classmethod
+    def preset(cls, name):
+        if name not in COMPRESSION_PRESETS:
+            raise ValueError(f"unknown compression preset '{name}' (expected one of: {', '.join(COMPRESSION_PRESETS)})")
+        return cls(name=name, **COMPRESSION_PRESETS[name])
+
+    def with_rules(self, ext_quality=None, min_size=None):
+        """Return a copy with extra per-extension rules and/or another size threshold."""
+        rules = dict(self.ext_quality)
+        rules.update(ext_quality or {})
+        return CompressionPolicy(self.name, self.quality, self.min_size if min_size is None else min_size, self.large_size, self.large_quality, rules)
+
+    def describe(self):
+        """JSON-able summary; incremental builds compare it to the previous one."""
+        return {
+            'preset': self.name,
+            'quality': self.quality,
+            'min_size': self.min_size,
+            'large_size': self.large_size,
+            'large_quality': self.large_quality,
+            'ext_quality': dict(sorted(self.ext_quality.items())),
+        }
+
+    @staticmethod
+    def input_encoding(path, head=b''):
+        """Content-Encoding of a pre-compressed input, or None.
+
+        `head` is the start of the file and is only needed for .unityweb.
+        """
+        ext = Path(path).suffix.lower()
+        if ext in ENCODED_INPUT_EXTS:
+            return ENCODED_INPUT_EXTS[ext]
+        if ext == '.unityweb':
+            head = bytes(head[:64])
+            if head[:2] == b'\x1f\x8b':
+                return 'gzip'
+            if b'UnityWeb Compressed Content (brotli)' in head:
+                return 'br'
+        return None
+
+    def may_compress(self, path):
+        """Cheap extension-only check: could this asset be brotli-compressed at all?"""
+        ext = Path(path).suffix.lower()
+        if ext in ENCODED_INPUT_EXTS or ext == '.unityweb':
+            return False
+        return self.ext_quality.get(ext, self.quality) is not None
+
+    def quality_for(self, path, size):
+        """Brotli quality for an asset of `size` bytes, or None to store it raw."""
+        if not self.may_compress(path):
+            return None
+        ext = Path(path).suffix.lower()
+        if size < self.min_size:
+            return None
+        if self.large_size is not None and size >= self.large_size and self.large_quality is not None:
+            return self.large_quality
+        return self.ext_quality.get(ext, self.quality)
+
+def get_compression_policy(compress):
+    """Normalize a `compress` argument to a CompressionPolicy, or None.
+
+    Accepts False/None (no compression), True (DEFAULT_COMPRESSION_PRESET),
+    a preset name or a CompressionPolicy.
+    """
+    if not compress:
+        return None
+    if isinstance(compress, CompressionPolicy):
+        return compress
+    if isinstance(compress, str):
+        return CompressionPolicy.preset(compress)
+    return CompressionPolicy.preset(DEFAULT_COMPRESSION_PRESET)
+
+def should_compress(path, compress):
+    policy = get_compression_policy(compress)
+    return bool(policy and get_brotli() and policy.may_compress(path))
+
+def decoded_path(path):
+    """`path` without the extension of its transfer encoding (game.wasm.br -> game.wasm)."""
+    p = Path(path)
+    if p.suffix.lower() in ENCODED_INPUT_EXTS or p.suffix.lower() == '.unityweb':
+        return str(p.with_suffix(''))
+    return path
+
+def make_compressed_entry(path, b64, encoding='br'):
+    return {
+        'b64': b64,
+        'encoding': encoding,
+        'mime': mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    }
+
+def encode_embedded_entry(path, bs, compress=False, quiet=False, timings=None):
+    """Return the EMBEDDED_FILES value for one asset.
+
+    This is either a plain base64 string or, when compression applies, an
+    object {b64, encoding, mime} understood by the injected fetch patch.
+    `compress` is anything get_compression_policy() accepts; with a policy
+    pre-compressed inputs are passed through with their encoding.
+    When `timings` is a dict it receives the compress/encode seconds (see
+    add_clock) and, if brotli output is kept, 'compressed_bytes'.
+    """
+    def b64(data):
+        if timings is None:
+            return to_b64(data)
+        started = clock()
+        value = to_b64(data)
+        add_clock(timings, 'encode', started)
+        return value
+    try:
+        policy = get_compression_policy(compress)
+        if not policy:
+            return b64(bs)
+        encoding = policy.input_encoding(path, bs[:64])
+        if encoding:
+            if verbose_enabled() and not quiet:
+                log(f"[INFO] Passing through {path} (already {encoding} encoded)")
+            return make_compressed_entry(decoded_path(path), b64(bs), encoding)
+        quality = policy.quality_for(path, len(bs))
+        brotli = get_brotli()
+        if quality is None or not brotli:
+            return b64(bs)
+        try:
+            if verbose_enabled() and not quiet:
+                log(f"[INFO] Compressing {path} (brotli q{quality})")
+            started = clock()
+            comp = brotli.compress(bs, quality=quality)
+            if timings is not None:
+                add_clock(timings, 'compress', started)
+        except Exception:
+            # fallback to raw base64 if compression fails
+            return b64(bs)
+        if len(comp) >= len(bs):
+            if verbose_enabled() and not quiet:
+                log(f"[INFO] Keeping {path} raw (brotli did not shrink it)")
+            return b64(bs)
+        if timings is not None:
+            timings['compressed_bytes'] = len(comp)
+        return make_compressed_entry(path, b64(comp))
+    except Exception:
+        return to_b64(bs)
+
+def new_cache_stats():
+    return {'hits': 0, 'misses': 0, 'bytes_saved': 0}
+
+def _cache_lookup(cache, path, bs, compress, stats):
+    """Return (key, entry) for a cacheable asset; entry is None on a miss.
+
+    Assets that are not compressed bypass the cache and return (None, None).
+    """
+    if cache is None or not should_compress(path, compress):
+        return None, None
+    quality = get_compression_policy(compress).quality_for(path, len(bs))
+    if quality is None:
+        return None, None
+    key = CompressionCache.make_key(bs, 'br', quality)
+    b64 = cache.get_b64(key)
+    if b64 is None:
+        stats['misses'] += 1
+        return key, None
+    stats['hits'] += 1
+    stats['bytes_saved'] += len(bs)
+    if verbose_enabled():
+        log(f"[INFO] Compression cache hit for {path}")
+    if not b64:
+        # negative record: compressing did not pay off last time
+        return key, to_b64(bs)
+    return key, make_compressed_entry(path, b64)
+
+def _cache_store(cache, key, value):
+    # compressed entries are cached as such; a plain string means the asset
+    # is embedded raw, which is recorded with an empty payload so later
+    # builds skip the compression attempt
+    if cache is not None and key:
+        try:
+            if isinstance(value, dict):
+                cache.put(key, base64.b64decode(value['b64']), b64=value['b64'])
+            else:
+                cache.put(key, b'', b64='')
+        except Exception as e:
+            log(f"[WARN] Could not update compression cache: {e}")
+
+def build_solid_bundle(files_map, max_size=SOLID_MAX_ASSET_SIZE, exclude=(), compress=False, cache=None):
+    """Pack the small assets of files_map into one compressed blob.
+
+    Small files compress poorly one by one since every stream starts
+    without context; compressed back to back they share it. Assets of at
+    most `max_size` bytes qualify unless they are in `exclude` or already
+    compressed (see COMPRESSED_EXTS / ENCODED_INPUT_EXTS).
+    With a `compress` policy (and brotli installed) the blob is brotli at
+    the policy's quality with the largest standard window (16 MB), so
+    repeats across the whole bundle are found; otherwise it is gzip, which
+    the runtime can always unpack with DecompressionStream.
+    The bundle is only used when its payload is smaller than the members
+    would take as entries of their own (encoded with `compress`, through
+    `cache` when given, so those encodings are not redone later).
+
+    Returns (members, entry, raw_size): path -> EMBEDDED_FILES value
+    {'solid': [offset, length], 'mime'} for each packed asset, the blob's
+    own value (stored under SOLID_BUNDLE_KEY) and the packed byte count;
+    ({}, None, 0) when fewer than two assets qualify or the bundle does not
+    pay off.
+    """
+    candidates = []
+    for path in files_map.keys():
+        ext = Path(path).suffix.lower()
+        if path in exclude or ext in COMPRESSED_EXTS or ext in ENCODED_INPUT_EXTS or ext == '.unityweb':
+            continue
+        try:
+            if asset_size(files_map, path) <= max_size:
+                candidates.append(path)
+        except Exception:
+            continue
+    if len(candidates) < 2:
+        log('[INFO] Solid bundle: fewer than two small assets; not used')
+        return {}, None, 0
+    members = {}
+    parts = []
+    offset = 0
+    separate = 0
+    stats = new_cache_stats()
+    for path in candidates:
+        try:
+            bs = bytes(files_map[path])
+        except Exception as e:
+            log(f"[WARN] Could not read file '{path}': {e}")
+            continue
+        members[path] = {'solid': [offset, len(bs)], 'mime': mimetypes.guess_type(path)[0] or 'application/octet-stream'}
+        parts.append(bs)
+        offset += len(bs)
+        # what the asset would cost as an entry of its own
+        if compress and should_compress(path, compress):
+            key, value = _cache_lookup(cache, path, bs, compress, stats)
+            if value is None:
+                value = encode_embedded_entry(path, bs, compress, quiet=True)
+                _cache_store(cache, key, value)
+            separate += encoded_length(value)
+        else:
+            separate += b64_length(len(bs))
+    raw = b''.join(parts)
+    brotli = get_brotli() if compress else None
+    if brotli:
+        blob = brotli.compress(raw, quality=get_compression_policy(compress).quality, lgwin=24)
+        encoding = 'br'
+    else:
+        blob = gzip.compress(raw, compresslevel=9, mtime=0)
+        encoding = 'gzip'
+    if b64_length(len(blob)) >= separate:
+        log(f"[INFO] Solid bundle: {human_size(len(raw))} -> {human_size(len(blob))} ({encoding}) is not smaller than "
+            f"the {len(members)} assets encoded one by one; not used")
+        return {}, None, 0
+    log(f"[INFO] Solid bundle: {len(members)} assets up to {human_size(max_size)}, {human_size(len(raw))} -> {human_size(len(blob))} ({encoding}); "
+        f"{human_size(separate * 3 // 4)} as entries of their own")
+    return members, make_compressed_entry(SOLID_BUNDLE_KEY, to_b64(blob), encoding), len(raw)
+
+def resolve_jobs(jobs):
+    """Normalize a --jobs value: None/1 -> serial, 0 or negative -> one per CPU."""
+    try:
+        jobs = int(jobs) if jobs is not None else 1
+    except (TypeError, ValueError):
+        jobs = 1
+    if jobs <= 0:
+        jobs = os.cpu_count() or 1
+    return jobs
+
+def _encode_entry_job(path, bs, src, compress, want_hash=False, want_timings=False):
+    """Process-pool worker: encode one asset, reading it from `src` when `bs` is None.
+
+    Returns (value, sha256 hex digest or None, timings dict or None).
+    """
+    if bs is None:
+        bs = read_asset(src)
+    digest = hashlib.sha256(bs).hexdigest() if want_hash else None
+    timings = {} if want_timings else None
+    return encode_embedded_entry(path, bs, compress, quiet=True, timings=timings), digest, timings
+
+def iter_encoded_entries(files_map, compress=False, jobs=1, cache=None, cache_stats=None, precomputed=None, hashes=None, uncompressed=None, asset_stats=None):
+    """Yield (idx, path, value) for every asset in files_map, in files_map order.
+
+    With jobs > 1 the compression and base64 work is spread over a process
+    pool. Results are collected strictly in submission order so the output
+    and the progress lines stay deterministic, and only a small window of
+    jobs is in flight at once so memory does not grow with the project.
+    When a CompressionCache is given, compressed assets are looked up by
+    content hash first and only misses are compressed (hits/misses are
+    counted into `cache_stats`). Assets that cannot be read are skipped
+    with a warning.
+
+    Paths present in `precomputed` are not read at all; their mapped value
+    is yielded as-is (incremental builds use this for unchanged files).
+    When `hashes` is a dict it receives path -> sha256 of every asset read.
+    Paths in `uncompressed` are always embedded as plain base64.
+    When `asset_stats` is a dict it receives path -> timings (see
+    encode_embedded_entry) of every asset encoded here; cache hits are
+    marked 'cached'.
+    """
+    paths = list(files_map.keys())
+    jobs = resolve_jobs(jobs)
+    if cache_stats is None:
+        cache_stats = new_cache_stats()
+    if precomputed is None:
+        precomputed = {}
+    uncompressed = uncompressed or ()
+
+    def compress_for(path):
+        return compress if path not in uncompressed else False
+
+    def cached_timings(path, value):
+        if asset_stats is not None and isinstance(value, str):
+            # negative cache record: embedded raw
+            asset_stats[path] = {'cached': True}
+        elif asset_stats is not None:
+            b64 = value['b64']
+            asset_stats[path] = {'cached': True, 'compressed_bytes': len(b64) * 3 // 4 - (len(b64) - len(b64.rstrip('=')))}
+    if jobs <= 1 or len(paths) - len(precomputed) <= 1:
+        for idx, path in enumerate(paths):
+            if path in precomputed:
+                yield idx, path, precomputed[path]
+                continue
+            try:
+                bs = files_map[path]
+            except Exception as e:
+                log(f"[WARN] Could not read file '{path}': {e}")
+                continue
+            if hashes is not None:
+                hashes[path] = hashlib.sha256(bs).hexdigest()
+            key, value = _cache_lookup(cache, path, bs, compress_for(path), cache_stats)
+            if value is None:
+                timings = {} if asset_stats is not None else None
+                value = encode_embedded_entry(path, bs, compress_for(path), timings=timings)
+                _cache_store(cache, key, value)
+                if timings is not None:
+                    asset_stats[path] = timings
+            else:
+                cached_timings(path, value)
+            yield idx, path, value
+        return
+
+    if verbose_enabled():
+        log(f"[INFO] Encoding {len(paths)} resources with {jobs} worker processes")
+    # lazy maps hand the worker a file path so the bytes are not pickled over
+    lazy = isinstance(files_map, LazyFileMap)
+    # spawn keeps workers independent of the server's threads and matches Windows
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=ctx) as pool:
+        pending = deque()
+        it = iter(enumerate(paths))
+
+        def submit_next():
+            for idx, path in it:
+                if path in precomputed:
+                    pending.append((idx, path, None, None, precomputed[path]))
+                    return True
+                try:
+                    bs = None
+                    key = None
+                    if cache is not None and should_compress(path, compress_for(path)):
+                        # hashing needs the bytes in this process anyway
+                        bs = files_map[path]
+                        key, value = _cache_lookup(cache, path, bs, compress_for(path), cache_stats)
+                        if hashes is not None and key is not None:
+                            hashes[path] = key.split('-', 1)[0]
+                        if value is not None:
+                            cached_timings(path, value)
+                            pending.append((idx, path, None, None, value))
+                            return True
+                    want_hash = hashes is not None and key is None
+                    if lazy:
+                        # memoryviews cannot be pickled; the worker maps the file itself
+                        bs = None
+                        fut = pool.submit(_encode_entry_job, path, None, files_map.source_path(path), compress_for(path), want_hash, asset_stats is not None)
+                    else:
+                        if bs is None:
+                            bs = files_map[path]
+                        # memoryviews (in-memory builds) cannot be pickled
+                        fut = pool.submit(_encode_entry_job, path, bytes(bs) if isinstance(bs, memoryview) else bs, None, compress_for(path), want_hash, asset_stats is not None)
+                except Exception as e:
+                    log(f"[WARN] Could not read file '{path}': {e}")
+                    continue
+                if verbose_enabled() and should_compress(path, compress_for(path)):
+                    try:
+                        quality = get_compression_policy(compress).quality_for(path, asset_size(files_map, path))
+                    except Exception:
+                        quality = None
+                    if quality is not None:
+                        log(f"[INFO] Compressing {path} (brotli q{quality})")
+                pending.append((idx, path, key, fut, None))
+                return True
+            return False
+
+        for _ in range(jobs * 2):
+            if not submit_next():
+                break
+        while pending:
+            idx, path, key, fut, value = pending.popleft()
+            submit_next()
+            if fut is not None:
+                try:
+                    value, digest, timings = fut.result()
+                except Exception as e:
+                    log(f"[WARN] Could not read file '{path}': {e}")
+                    continue
+                if digest is not None:
+                    hashes[path] = digest
+                if timings is not None:
+                    asset_stats[path] = timings
+                _cache_store(cache, key, value)
+            yield idx, path, value
+
+class EmbedProgress:
+    """Progress of the embedding phase: the [NN%] lines and 'asset' events.
+
+    Progress (mapped to 50-99%) and the ETA follow input bytes rather than
+    the file count, so one large .data file does not stall the bar while
+    dozens of tiny files race through it.
+    """
+
+    def __init__(self, files_map):
+        self.count = len(files_map) or 1
+        self.sizes = {}
+        for path in files_map.keys():
+            try:
+                self.sizes[path] = asset_size(files_map, path)
+            except Exception:
+                self.sizes[path] = 0
+        self.total_bytes = sum(self.sizes.values())
+        self.done_bytes = 0
+        self.started = time.time()
+
+    def step(self, idx, path, value=None):
+        size = self.sizes.get(path, 0)
+        self.done_bytes += size
+        if self.total_bytes:
+            frac = self.done_bytes / self.total_bytes
+        else:
+            frac = (idx + 1) / self.count
+        pct = 50 + int(frac * 49)
+        elapsed = time.time() - self.started
+        eta = elapsed * (1 - frac) / frac if frac > 0 else None
+        try:
+            if progress_enabled():
+                if verbose_enabled():
+                    log(f"[{pct}%] embedded {path}")
+                else:
+                    log(f"[{pct}%]")
+        except Exception:
+            pass
+        emit_event('asset', path=path, index=idx + 1, count=self.count, bytes=size,
+                   encoded=encoded_length(value) if value is not None else None,
+                   done_bytes=self.done_bytes, total_bytes=self.total_bytes,
+                   percent=pct, eta=round(eta, 1) if eta is not None else None)
+
+def peak_rss():
+    """Peak resident set size in bytes of (this process, its largest finished child), or (None, None)."""
+    if resource is None:
+        return None, None
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    try:
+        return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+                resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale)
+    except Exception:
+        return None, None
+
+class BuildReport:
+    """Where one build spent its time and its bytes; build() returns it.
+
+    `phases` maps a phase to its wall and CPU seconds. read, rewrite and
+    verify time those steps of build() and embed the whole embedding pass;
+    compress (brotli, the solid bundle), encode (base64), serialise
+    (JSON/HTML text) and write (output I/O) are summed over the assets
+    inside it. With jobs > 1 compress and encode run in worker processes
+    and their sums can exceed the wall time of embed. CPU time is counted
+    per thread, so concurrent web builds do not see each other's work.
+
+    `assets` maps every input path to its input, compressed and emitted
+    (payload characters) bytes, the compression ratio and its compress and
+    encode seconds. Peak RSS covers the whole process (and, separately, the
+    largest pool worker), so it is shared by concurrent builds.
+    """
+
+    PHASES = ('read', 'rewrite', 'compress', 'encode', 'serialise', 'write', 'verify')
+
+    def __init__(self):
+        self.phases = {name: {'wall': 0.0, 'cpu': 0.0} for name in self.PHASES}
+        self.assets = {}
+        self.embedded_keys = []
+        self.input_bytes = 0
+        self.output_bytes = None
+        self.duplicates = 0
+        self.cache = None
+        self.elapsed = None
+        self.peak_rss = None
+        self.peak_rss_workers = None
+        self.started = time.perf_counter()
+
+    def add_time(self, phase, wall, cpu=0.0):
+        entry = self.phases.setdefault(phase, {'wall': 0.0, 'cpu': 0.0})
+        entry['wall'] += wall
+        entry['cpu'] += cpu
+
+    @contextmanager
+    def timed(self, phase):
+        started = clock()
+        try:
+            yield
+        finally:
+            wall, cpu = clock()
+            self.add_time(phase, wall - started[0], cpu - started[1])
+
+    def add_asset(self, path, input_bytes, emitted_bytes, timings=None, source='encoded'):
+        """Record one asset; `timings` is what encode_embedded_entry filled in."""
+        timings = timings or {}
+        compressed = timings.get('compressed_bytes')
+        self.assets[path] = {
+            'source': 'cache' if timings.get('cached') else source,
+            'input_bytes': input_bytes,
+            'compressed_bytes': compressed,
+            'emitted_bytes': emitted_bytes,
+            'ratio': round(compressed / input_bytes, 4) if compressed is not None and input_bytes else None,
+            'compress_seconds': round(timings.get('compress', 0.0), 6),
+            'compress_cpu': round(timings.get('compress_cpu', 0.0), 6),
+            'encode_seconds': round(timings.get('encode', 0.0), 6),
+            'encode_cpu': round(timings.get('encode_cpu', 0.0), 6),
+        }
+        for name in ('compress', 'encode'):
+            if name in timings:
+                self.add_time(name, timings[name], timings.get(name + '_cpu', 0.0))
+
+    def finish(self, output_bytes):
+        self.elapsed = time.perf_counter() - self.started
+        self.output_bytes = output_bytes
+        self.peak_rss, self.peak_rss_workers = peak_rss()
+
+    def summary(self):
+        """Everything but the per-asset table."""
+        return {
+            'embedded': len(self.embedded_keys),
+            'elapsed': round(self.elapsed, 3) if self.elapsed is not None else None,
+            'input_bytes': self.input_bytes,
+            'output_bytes': self.output_bytes,
+            'duplicates': self.duplicates,
+            'cache': self.cache,
+            'peak_rss': self.peak_rss,
+            'peak_rss_workers': self.peak_rss_workers,
+            'phases': {name: {'wall': round(t['wall'], 4), 'cpu': round(t['cpu'], 4)} for name, t in self.phases.items()},
+        }
+
+    def to_dict(self):
+        report = self.summary()
+        report['assets'] = self.assets
+        return report
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as fh:
+            json.dump(self.to_dict(), fh, indent=1)
+
+    def describe(self):
+        """One line of the slowest phases for the log."""
+        slowest = sorted(((t['wall'], name) for name, t in self.phases.items() if name != 'embed' and t['wall'] >= 0.0005), reverse=True)
+        parts = [f'{name} {wall:.2f}s' for wall, name in slowest[:5]]
+        rss = f', peak RSS {human_size(self.peak_rss)}' if self.peak_rss else ''
+        return f"{', '.join(parts) or 'no timed phases'}{rss}"
+
+class ReusedSegment:
+    """A serialised `"key": value` pair copied verbatim from a previous output.
+
+    The segment is pure ASCII (json.dumps escapes everything else), so it can
+    be copied in chunks from the old file without decoding the payload.
+    """
+
+    def __init__(self, fh, offset, length):
+        self.fh = fh
+        self.offset = offset
+        self.length = length
+
+    def copy_to(self, out):
+        self.fh.seek(self.offset)
+        remaining = self.length
+        while remaining > 0:
+            chunk = self.fh.read(min(remaining, 1 << 20))
+            if not chunk:
+                raise IOError('previous output is shorter than its manifest')
+            out.write(chunk.decode('ascii'))
+            remaining -= len(chunk)
+
+def encoded_length(value):
+    """Characters of payload carried by one EMBEDDED_FILES value."""
+    if isinstance(value, ReusedSegment):
+        return value.length
+    if isinstance(value, dict):
+        return len(value.get('b64') or '')
+    return len(value) if isinstance(value, str) else 0
+
+def write_embedded_map(fh, entries, segments=None, report=None):
+    """Write a JSON object literal to `fh` one (key, value) pair at a time.
+
+    The result is byte-identical to json.dumps(dict(entries)) but only one
+    serialised entry is held in memory at any point. A ReusedSegment value
+    is copied as-is. When `segments` is a dict it receives key -> (offset,
+    length) of each `"key": value` pair in the file. With a BuildReport the
+    serialise and write time is recorded. Returns the entry count.
+    """
+    fh.write('{')
+    count = 0
+    for key, value in entries:
+        if count:
+            fh.write(', ')
+        start = fh.tell() if segments is not None else None
+        if isinstance(value, ReusedSegment):
+            with timed(report, 'write'):
+                value.copy_to(fh)
+        else:
+            with timed(report, 'serialise'):
+                key_json = json.dumps(key)
+                value_json = json.dumps(value)
+            with timed(report, 'write'):
+                fh.write(key_json)
+                fh.write(': ')
+                fh.write(value_json)
+            del value_json
+        if segments is not None:
+            segments[key] = (start, fh.tell() - start)
+        count += 1
+    fh.write('}')
+    return count
+
+def write_payload_blocks(fh, entries, segments=None, report=None):
+    """Write one non-executing <script type="application/octet-stream"> per asset.
+
+    Compressed entries carry their encoding and mime as data- attributes.
+    Duplicates ({'ref': key}) and solid bundle members get no block of
+    their own. A ReusedSegment
+    value is copied as-is; `segments` receives key -> (offset, length) of
+    each block like write_embedded_map, as is `report`. Returns the block count.
+    """
+    count = 0
+    for key, value in entries:
+        if isinstance(value, dict) and ('ref' in value or 'solid' in value):
+            continue
+        start = fh.tell() if segments is not None else None
+        if isinstance(value, ReusedSegment):
+            with timed(report, 'write'):
+                value.copy_to(fh)
+        else:
+            attrs = ''
+            if isinstance(value, dict):
+                attrs = f' data-encoding="{html.escape(value["encoding"])}" data-mime="{html.escape(value["mime"])}"'
+                value = value['b64']
+            with timed(report, 'write'):
+                fh.write(f'<script type="application/octet-stream" id="{payload_block_id(key)}"{attrs}>')
+                fh.write(value)
+                fh.write('</script>\n')
+        if segments is not None:
+            segments[key] = (start, fh.tell() - start)
+        count += 1
+    return count
+
+def write_streaming_output(outpath, rewritten_index, files_map, loader_html=None, compress=False, jobs=1, cache=None, cache_stats=None, reuse=None, segments=None, hashes=None, payload_blocks=False, refs=None, uncompressed=None, encoded_sizes=None, solid=None, runtime_options=None, out=None, asset_stats=None, report=None):
+    """Write the final document to `outpath` without materialising it in memory.
+
+    The loader prefix, runtime and rewritten index are rendered around
+    EMBEDDED_MAP_PLACEHOLDER; the EMBEDDED_FILES literal is then written in
+    its place asset by asset, so peak memory is bounded by the largest single
+    asset rather than the whole project. Returns the embedded keys in order.
+
+    `reuse` maps path -> (offset, length) of segments in the existing
+    `outpath` that are copied instead of re-encoded (incremental builds);
+    `segments` and `hashes` are filled as described in write_embedded_map
+    and iter_encoded_entries. The document is written to a temporary file
+    and moved over `outpath` once complete.
+
+    With `payload_blocks` the EMBEDDED_FILES literal only maps each key to
+    a block id and the payloads are streamed as per-asset blocks after the
+    runtime script instead (see write_payload_blocks).
+
+    `refs` maps duplicate paths to the path holding identical content; they
+    are written as {"ref": path} and never read. `uncompressed` is passed
+    on to iter_encoded_entries and `encoded_sizes`, when a dict, receives
+    path -> payload characters written for every asset.
+
+    `solid` is the (members, entry) pair of build_solid_bundle: members are
+    written as their slice entries and the bundle follows the last asset.
+    `runtime_options` is passed to inject_fetch_patch_into_head.
+    With `out` (a text stream such as TextSink) the document is written
+    there instead of `outpath`; `reuse` and `segments` are not supported then.
+    `asset_stats` goes to iter_encoded_entries; `report` (a BuildReport)
+    receives the serialise and write time.
+    """
+    refs = refs or {}
+    members, bundle = solid or ({}, None)
+    serialise_started = clock()
+    if payload_blocks:
+        index = {}
+        for k in files_map.keys():
+            index[k] = {'ref': refs[k]} if k in refs else members[k] if k in members else {'block': payload_block_id(k)}
+        if bundle is not None:
+            index[SOLID_BUNDLE_KEY] = {'block': payload_block_id(SOLID_BUNDLE_KEY)}
+        block_index = json.dumps(index)
+        shell = inject_fetch_patch_into_head(rewritten_index, None, loader_html=loader_html, embedded_json=block_index, embedded_keys=files_map.keys(), payload_blocks_html=PAYLOAD_BLOCKS_PLACEHOLDER, runtime_options=runtime_options)
+        before, _, after = shell.partition(PAYLOAD_BLOCKS_PLACEHOLDER)
+    else:
+        shell = inject_fetch_patch_into_head(rewritten_index, None, loader_html=loader_html, embedded_json=EMBEDDED_MAP_PLACEHOLDER, embedded_keys=files_map.keys(), runtime_options=runtime_options)
+        before, _, after = shell.partition(EMBEDDED_MAP_PLACEHOLDER)
+    del shell
+    if report is not None:
+        wall, cpu = clock()
+        report.add_time('serialise', wall - serialise_started[0], cpu - serialise_started[1])
+
+    emitted = []
+    progress = EmbedProgress(files_map)
+    previous = open(outpath, 'rb') if reuse else None
+    precomputed = {path: ReusedSegment(previous, off, length) for path, (off, length) in (reuse or {}).items()}
+    precomputed.update((path, {'ref': canonical}) for path, canonical in refs.items())
+    precomputed.update(members)
+
+    def entries():
+        for idx, path, value in iter_encoded_entries(files_map, compress, jobs, cache, cache_stats, precomputed=precomputed, hashes=hashes, uncompressed=uncompressed, asset_stats=asset_stats):
+            emitted.append(path)
+            if encoded_sizes is not None:
+                encoded_sizes[path] = encoded_length(value)
+            yield path, value
+            progress.step(idx, path, value)
+        if bundle is not None:
+            yield SOLID_BUNDLE_KEY, bundle
+
+    def write_document(fh):
+        with timed(report, 'write'):
+            fh.write(before)
+        if payload_blocks:
+            write_payload_blocks(fh, entries(), segments=segments, report=report)
+        else:
+            write_embedded_map(fh, entries(), segments=segments, report=report)
+        with timed(report, 'write'):
+            fh.write(after)
+
+    if out is not None:
+        write_document(out)
+        return emitted
+
+    tmp_path = outpath + '.tmp'
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            write_document(fh)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    finally:
+        if previous is not None:
+            previous.close()
+    os.replace(tmp_path, outpath)
+    return emitted
+
+def _build_in_memory(outpath, rewritten_index, files_map, embedded_map, loader_html, compress, jobs=1, cache=None, cache_stats=None, refs=None, uncompressed=None, encoded_sizes=None, solid=None, runtime_options=None, out=None, asset_stats=None, report=None):
+    """Original emit path: fill embedded_map, render the document and write it once (to `out` when given)."""
+    # Populate embedded_map now so we can optionally compress certain assets.
+    progress = EmbedProgress(files_map)
+    # duplicates point at the first path with the same content
+    precomputed = {path: {'ref': canonical} for path, canonical in (refs or {}).items()}
+    members, bundle = solid or ({}, None)
+    precomputed.update(members)
+    for idx, path, value in iter_encoded_entries(files_map, compress, jobs, cache, cache_stats, precomputed=precomputed, uncompressed=uncompressed, asset_stats=asset_stats):
+        embedded_map[path] = value
+        if encoded_sizes is not None:
+            encoded_sizes[path] = encoded_length(value)
+        # emit progress mapped to 50-99% during embedding/compression
+        progress.step(idx, path, value)
+
+    # Emit progress: embedding phase
+    try:
+        if progress_enabled():
+            if verbose_enabled():
+                log(f"[50%] Starting embedding {len(files_map)} resources")
+            else:
+                log('[50%]')
+    except Exception:
+        pass
+
+    embedded_keys = list(embedded_map.keys())
+    if bundle is not None:
+        embedded_map[SOLID_BUNDLE_KEY] = bundle
+    with timed(report, 'serialise'):
+        final_html = inject_fetch_patch_into_head(rewritten_index, embedded_map, loader_html=loader_html, embedded_keys=embedded_keys, runtime_options=runtime_options)
+
+    # emit incremental progress while we report embedded keys (map size growth)
+    try:
+        if progress_enabled() and embedded_keys:
+            total_keys = len(embedded_keys)
+            shown = 0
+            for idx, k in enumerate(embedded_keys):
+                # map embedding progress to 50-99%
+                pct = 50 + int(((idx + 1) / total_keys) * 49)
+                if verbose_enabled():
+                    log(f"[{pct}%] embedded {k}")
+                else:
+                    log(f"[{pct}%]")
+                shown += 1
+    except Exception:
+        pass
+
+    with timed(report, 'write'):
+        if out is not None:
+            out.write(final_html)
+        else:
+            with open(outpath, "w", encoding="utf-8") as fh:
+                fh.write(final_html)
+
+    return embedded_keys
+
+def manifest_path_for(outpath):
+    return outpath + MANIFEST_SUFFIX
+
+def load_build_manifest(outpath):
+    """Return the manifest of the previous build of `outpath`, or None.
+
+    The manifest is ignored when it is missing, from another format version,
+    or when the output on disk no longer matches what it describes.
+    """
+    mpath = manifest_path_for(outpath)
+    try:
+        with open(mpath, 'r', encoding='utf-8') as fh:
+            manifest = json.load(fh)
+        if manifest.get('version') != MANIFEST_VERSION:
+            return None
+        st = os.stat(outpath)
+        out = manifest.get('output') or {}
+        if out.get('size') != st.st_size or out.get('mtime_ns') != st.st_mtime_ns:
+            log('[INFO] Previous output changed since its manifest was written; rebuilding all assets')
+            return None
+        return manifest
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        log(f"[WARN] Ignoring unreadable build manifest {mpath}: {e}")
+        return None
+
+def stat_inputs(files_map):
+    """Return path -> (size, mtime_ns) for every asset of a LazyFileMap."""
+    stats = {}
+    for path in files_map.keys():
+        try:
+            st = os.stat(files_map.source_path(path))
+            stats[path] = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            continue
+    return stats
+
+def plan_incremental_reuse(manifest, files_map, encoding, stats, refs=None, uncompressed=None):
+    """Work out which embedded segments of the previous output can be reused.
+
+    An asset is unchanged when its size and mtime match the manifest or, if
+    only the mtime moved, when its content hash still matches. Duplicate
+    references (previous or current `refs`) are never reused since their
+    target may have moved, nor are assets whose `uncompressed` pinning
+    differs from the previous build. Returns
+    (reuse, hashes): path -> (offset, length) of each reusable segment and
+    the known content hashes of those assets.
+    """
+    reuse = {}
+    hashes = {}
+    if not manifest:
+        return reuse, hashes
+    if manifest.get('encoding') != encoding:
+        log('[INFO] Encoding settings changed since the last build; rebuilding all assets')
+        return reuse, hashes
+    previous = manifest.get('files') or {}
+    refs = refs or {}
+    uncompressed = uncompressed or ()
+    for path, (size, mtime_ns) in stats.items():
+        entry = previous.get(path)
+        if not entry or entry.get('size') != size:
+            continue
+        if entry.get('ref') or path in refs or bool(entry.get('plain')) != (path in uncompressed):
+            continue
+        if entry.get('mtime_ns') != mtime_ns:
+            try:
+                digest = hashlib.sha256(files_map[path]).hexdigest()
+            except Exception:
+                continue
+            if digest != entry.get('sha256'):
+                continue
+        reuse[path] = (entry['offset'], entry['length'])
+        hashes[path] = entry['sha256']
+    return reuse, hashes
+
+def save_build_manifest(outpath, settings, encoding, stats, segments, hashes, refs=None, uncompressed=None):
+    """Record size, mtime, hash and output segment of every embedded asset."""
+    files = {}
+    refs = refs or {}
+    uncompressed = uncompressed or ()
+    for path, (offset, length) in segments.items():
+        if path not in stats or path not in hashes:
+            continue
+        size, mtime_ns = stats[path]
+        files[path] = {
+            'size': size,
+            'mtime_ns': mtime_ns,
+            'sha256': hashes[path],
+            'offset': offset,
+            'length': length,
+        }
+        if path in refs:
+            files[path]['ref'] = True
+        if path in uncompressed:
+            files[path]['plain'] = True
+    st = os.stat(outpath)
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'output': {'size': st.st_size, 'mtime_ns': st.st_mtime_ns},
+        'settings': settings,
+        'encoding': encoding,
+        'files': files,
+    }
+    mpath = manifest_path_for(outpath)
+    try:
+        with open(mpath + '.tmp', 'w', encoding='utf-8') as fh:
+            json.dump(manifest, fh, indent=1)
+        os.replace(mpath + '.tmp', mpath)
+    except OSError as e:
+        log(f"[WARN] Could not write build manifest {mpath}: {e}")
+
+def build(files_list, variables, outpath, inject_loader=True, selected_loader=None, embed_css_direct=False, compress=False, stream=False, jobs=1, cache=None, incremental=False, payload_blocks=False, dedupe=True, inlined='auto', solid=False, worker_decode=False, asset_cache=False, root=None, out=None, fetch_paths=False):
+    """Build `outpath` from the files in `files_list`.
+
+    With `stream=True` the embedded map is written to disk asset by asset
+    instead of being assembled in memory first.
+    `jobs` sets how many worker processes encode assets (0 = one per CPU).
+    `compress` is False, True (the default preset), a preset name ('fast',
+    'balanced', 'max') or a CompressionPolicy.
+    `cache` is an optional CompressionCache consulted before compressing.
+    `incremental=True` implies streaming, records a manifest next to the
+    output and reuses the encoded segments of unchanged files from the
+    previous output. `payload_blocks=True` (also streaming) emits each asset
+    as its own non-executing <script> block that the runtime reads on first
+    request, leaving only a small index in EMBEDDED_FILES.
+    With `dedupe` (the default) assets with identical content are embedded
+    once and the other paths reference that copy, and the `buildUrl` and
+    media references in index.html point at the embedded asset instead of
+    carrying a data: URI of their own. `fetch_paths` keeps the `buildUrl`
+    references to data the loader fetches as relative paths, served by the
+    runtime's fetch patch: they stay compressed, but loaders that use
+    XMLHttpRequest cannot load them.
+    `inlined` decides what happens to scripts and stylesheets that were
+    inlined into the page: 'auto' leaves them out of the embedded files
+    unless their name is referenced anywhere else (see
+    find_inlined_references), 'drop' always leaves them out and 'keep'
+    embeds them anyway.
+    `solid` packs the small assets (up to SOLID_MAX_ASSET_SIZE bytes, or
+    `solid` bytes when it is a number) into one compressed blob that the runtime
+    unpacks once and slices; see build_solid_bundle.
+    `worker_decode` makes the runtime decode and decompress large entries
+    in an inline Web Worker instead of on the page's main thread.
+    `asset_cache` writes a content hash per asset into the page so the
+    runtime can keep decoded assets in IndexedDB across visits.
+    Relative paths in `files_list` are read from `root` (default: the
+    current directory); the embedded keys stay as listed. `files_list` may
+    also be a mapping of path -> content (see memory_file_map), and with
+    `out`, a writable binary stream, the document is written there instead
+    of `outpath`; build_from_files() combines the two.
+    Returns a BuildReport (its `embedded_keys` are the embedded keys in
+    order), or None when the build was aborted.
+    """
+    if incremental and (out is not None or isinstance(files_list, Mapping)):
+        log('[WARN] Incremental builds need input files and an output file on disk; building everything')
+        incremental = False
+    if incremental or payload_blocks:
+        stream = True
+    report = BuildReport()
+    read_started = phase_start('read')
+    if isinstance(files_list, Mapping):
+        files_map = memory_file_map(files_list)
+    else:
+        # assets are read on demand (large ones memory-mapped) in both emit modes
+        files_map = file_bytes_map(files_list, lazy=True, root=root)
+    sink = TextSink(out) if out is not None else None
+
+    index_keys = [k for k in files_map.keys() if Path(k).name.lower() == 'index.html']
+    if not index_keys:
+        log("[ERROR] index.html not found in files.txt. Aborting.")
+        return
+    index_path = index_keys[0]
+    index_bytes = files_map[index_path]
+    decoded_index = try_decode_utf8(index_bytes, index_path)
+    if decoded_index is None:
+        decoded_index = str(index_bytes, 'utf-8', 'replace')
+        log(f"[WARN] index.html not strict-utf8; decoded with replacement chars.")
+
+    # Detect loader HTML (under loaders/.../index.html or src/loaders/...) and extract it
+    loader_html = None
+    loader_keys = [k for k in files_map.keys() if re.match(r'(^|/|\\)loaders/[^/\\]+/index\.html$', k, flags=re.IGNORECASE) or re.match(r'(^|/|\\)src/loaders/[^/\\]+/index\.html$', k, flags=re.IGNORECASE)]
+    if inject_loader and loader_keys:
+        # prefer first
+        lk = loader_keys[0]
+        try:
+            decoded_loader = try_decode_utf8(files_map[lk], lk)
+            if decoded_loader is None:
+                decoded_loader = str(files_map[lk], 'utf-8', 'replace')
+            loader_html = decoded_loader
+            # remove loader from files_map so it doesn't get embedded into the large JSON
+            del files_map[lk]
+            log(f"[INFO] Using loader from uploaded file: {lk}")
+        except Exception:
+            loader_html = None
+    elif inject_loader:
+        # try repository-local fallback paths relative to the checkout
+        repo_root = ASSET_ROOT
+        candidate_used = None
+        # If a specific loader name was requested, prefer that
+        candidates = []
+        if selected_loader:
+            candidates.append(f'src/loaders/{selected_loader}/index.html')
+            candidates.append(f'loaders/{selected_loader}/index.html')
+        # fallback: try the list file or default basic
+        candidates.extend(['src/loaders/basic/index.html', 'loaders/basic/index.html'])
+        for candidate in candidates:
+            try:
+                cand_path = repo_root / candidate
+                if cand_path.exists():
+                    with open(cand_path, 'r', encoding='utf-8') as fh:
+                        loader_html = fh.read()
+                    candidate_used = str(cand_path)
+                    break
+            except Exception:
+                continue
+
+    if loader_html:
+        if 'lk' in locals():
+            log(f"[INFO] Using loader from uploaded file: {lk}")
+        elif 'candidate_used' in locals() and candidate_used:
+            log(f"[INFO] Using loader from repo path: {candidate_used}")
+        else:
+            log("[INFO] Using loader_html from fallback")
+    phase_end('read', read_started, report)
+
+    rewrite_started = phase_start('rewrite')
+    embedded_map = {}
+    # allow callers to request direct css embedding by setting a special variable
+    # so rewrite_index_html can pick it up when deciding how to replace <link> tags
+    if isinstance(variables, dict) and '__embed_css_direct__' in variables:
+        embed_css_direct = bool(variables.get('__embed_css_direct__'))
+    else:
+        embed_css_direct = False
+
+    # one path index per build, shared by every rewriter
+    resolver = PathResolver(files_map.keys())
+    asset_sites = {} if dedupe else None
+    rewriter = HtmlRewriter(files_map, variables, embed_css_direct=embed_css_direct, resolver=resolver, asset_sites=asset_sites, fetch_paths=fetch_paths)
+    rewritten_index = rewriter.rewrite(decoded_index)
+
+    # Files inlined as <script>/<style> are already in the page; embedding
+    # them again only pays off if something may still fetch them by name.
+    if rewriter.inlined:
+        if inlined == 'keep':
+            still_used = {k: 'inlined assets are kept' for k in rewriter.inlined}
+        elif inlined == 'drop':
+            still_used = {}
+        else:
+            refs_found = find_inlined_references(files_map, rewriter.inlined, rewriter.residual, skip={index_path}, extra_texts=[loader_html])
+            still_used = {k: f'referenced by {where}' for k, where in refs_found.items()}
+        for key in rewriter.inlined:
+            if key in (asset_sites or {}):
+                # the page also points at this file (blob URL or fetched path)
+                log(f"[INFO] Inlined {key}: still embedded (used by a page reference)")
+            elif key in still_used:
+                log(f"[INFO] Inlined {key}: still embedded ({still_used[key]})")
+            else:
+                try:
+                    size = human_size(asset_size(files_map, key))
+                except Exception:
+                    size = '?'
+                del files_map[key]
+                log(f"[INFO] Inlined {key}: left out of the embedded files ({size})")
+    phase_end('rewrite', rewrite_started, report)
+
+    with report.timed('read'):
+        refs, dup_hashes = find_duplicate_assets(files_map) if dedupe else ({}, {})
+    # blob URLs are decoded synchronously by the runtime, so the copy they
+    # point at is embedded uncompressed; with fetch_paths, references to
+    # fetched data go through the fetch patch and keep their compression
+    uncompressed = {refs.get(k, k) for k in rewriter.blob_sites}
+    encoded_sizes = {}
+
+    # resolve the compression policy once; it is handed down as `compress`
+    try:
+        compress = get_compression_policy(compress)
+    except ValueError as e:
+        log(f"[WARN] {e}; using the {DEFAULT_COMPRESSION_PRESET} preset")
+        compress = CompressionPolicy.preset(DEFAULT_COMPRESSION_PRESET)
+    # If compression requested but brotli missing, warn (pre-compressed inputs still pass through)
+    if compress and not get_brotli():
+        log('[WARN] Compression requested but brotli module not available. Install brotli to enable compression. Falling back to uncompressed embedding.')
+    if compress and verbose_enabled():
+        log(f"[INFO] Compression policy: {json.dumps(compress.describe())}")
+
+    runtime_options = {'workerDecode': bool(worker_decode)}
+
+    solid_bundle = None
+    if solid:
+        solid_max = SOLID_MAX_ASSET_SIZE if solid is True else int(solid)
+        # duplicates and assets decoded synchronously by the page stay out
+        with report.timed('compress'):
+            members, bundle, raw_size = build_solid_bundle(files_map, solid_max, exclude=set(refs) | uncompressed, compress=compress, cache=cache)
+        if bundle is not None:
+            solid_bundle = (members, bundle)
+            report.add_asset(SOLID_BUNDLE_KEY, raw_size, encoded_length(bundle), {'compressed_bytes': encoded_length(bundle) * 3 // 4}, source='solid bundle')
+
+    # digests found along the way, reused by the asset cache hashes
+    known_hashes = dict(dup_hashes)
+
+    def add_asset_cache_option():
+        if asset_cache:
+            with report.timed('read'):
+                hashed = content_hashes(files_map, known_hashes)
+            runtime_options['assetCache'] = asset_cache_options(hashed)
+            log(f"[INFO] Asset cache: {len(runtime_options['assetCache']['hashes'])} assets hashed, build {runtime_options['assetCache']['build']}")
+
+    embed_started = phase_start('embed')
+    cache_stats = new_cache_stats()
+    asset_stats = {}
+    reuse = None
+    if stream:
+        # Streaming emit: the shell is written first and the embedded map is
+        # serialised one asset at a time straight into the output file.
+        try:
+            if progress_enabled():
+                if verbose_enabled():
+                    log(f"[50%] Starting embedding {len(files_map)} resources")
+                else:
+                    log('[50%]')
+        except Exception:
+            pass
+        segments = None
+        hashes = None
+        if incremental:
+            encoding = {'compress': compress.describe() if compress else False, 'payload_blocks': bool(payload_blocks), 'solid': solid_max if solid else False}
+            with report.timed('read'):
+                input_stats = stat_inputs(files_map)
+                reuse, hashes = plan_incremental_reuse(load_build_manifest(outpath), files_map, encoding, input_stats, refs=refs, uncompressed=uncompressed)
+            hashes.update(dup_hashes)
+            known_hashes.update(hashes)
+            segments = {}
+            # solid members are re-sliced from the fresh bundle every build
+            members = solid_bundle[0] if solid_bundle else {}
+            for path in members:
+                reuse.pop(path, None)
+            to_encode = len(files_map) - len(reuse) - len(refs) - len(members)
+            log(f"[INFO] Incremental build: {len(reuse)} of {len(files_map)} assets unchanged, {to_encode} to encode")
+        add_asset_cache_option()
+        embedded_keys = write_streaming_output(outpath, rewritten_index, files_map, loader_html=loader_html, compress=compress, jobs=jobs, cache=cache, cache_stats=cache_stats, reuse=reuse, segments=segments, hashes=hashes, payload_blocks=payload_blocks, refs=refs, uncompressed=uncompressed, encoded_sizes=encoded_sizes, solid=solid_bundle, runtime_options=runtime_options, out=sink, asset_stats=asset_stats, report=report)
+        if incremental:
+            settings = {
+                'inject_loader': bool(inject_loader),
+                'selected_loader': selected_loader,
+                'embed_css_direct': bool(embed_css_direct),
+                'compress': compress.name if compress else False,
+                'jobs': jobs,
+                'payload_blocks': bool(payload_blocks),
+                'dedupe': bool(dedupe),
+                'fetch_paths': bool(fetch_paths),
+                'inlined': inlined,
+                'solid': solid,
+                'worker_decode': bool(worker_decode),
+                'asset_cache': bool(asset_cache),
+            }
+            save_build_manifest(outpath, settings, encoding, input_stats, segments, hashes, refs=refs, uncompressed=uncompressed)
+    else:
+        add_asset_cache_option()
+        embedded_keys = _build_in_memory(outpath, rewritten_index, files_map, embedded_map, loader_html, compress, jobs=jobs, cache=cache, cache_stats=cache_stats, refs=refs, uncompressed=uncompressed, encoded_sizes=encoded_sizes, solid=solid_bundle, runtime_options=runtime_options, out=sink, asset_stats=asset_stats, report=report)
+
+    phase_end('embed', embed_started, report)
+
+    if compress and cache is not None:
+        log(f"[INFO] Compression cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, {human_size(cache_stats['bytes_saved'])} not recompressed")
+
+    if refs or asset_sites:
+        # each duplicate would have repeated its original's payload, each
+        # page reference a data: URI of the whole file
+        saved = sum(encoded_sizes.get(canonical, 0) for canonical in refs.values())
+        for path, count in asset_sites.items():
+            try:
+                saved += count * data_uri_length(path, asset_size(files_map, path))
+            except Exception:
+                pass
+        log(f"[INFO] Dedupe: {len(refs)} duplicate assets stored once, {sum(asset_sites.values())} page references point at embedded assets; {human_size(saved)} saved")
+
+    # Post-write verification: if loader was requested/injected, check it appears before the EMBEDDED_FILES
+    verify_started = phase_start('verify')
+    if inject_loader and loader_html:
+        try:
+            if sink is not None:
+                head = sink.head()
+            else:
+                with open(outpath, 'r', encoding='utf-8', errors='replace') as fh:
+                    head = fh.read(2000000)
+            # Prefer explicit prefix marker; fall back to known loader ids
+            loader_prefix_marker = '<!-- EVERBUILDER LOADER PREFIX START -->'
+            loader_pos = head.find(loader_prefix_marker)
+            if loader_pos == -1:
+                # try other markers
+                for marker in ['everbuilder-loader', 'basicFill', 'Basic loader', 'Preparing assets']:
+                    p = head.find(marker)
+                    if p != -1:
+                        loader_pos = p
+                        break
+            emb_pos = head.find('EMBEDDED FILES')
+            if loader_pos == -1:
+                # no loader present in the output: treat as failure
+                raise RuntimeError('Loader was requested but loader markers not found in output file')
+            else:
+                if emb_pos != -1 and loader_pos > emb_pos:
+                    raise RuntimeError('Loader appears after embedded files in output; expected before')
+                else:
+                    log('[OK] Loader appears before the embedded files in output')
+        except Exception as e:
+            # For CLI builds we want to surface failures; raise so callers can detect/exit non-zero.
+            log('[ERROR] Loader verification failed:', e)
+            raise
+
+    # Quick check: ensure no loader files were accidentally left in embedded_map
+    try:
+        leftover_loaders = [k for k in embedded_keys if '/loaders/' in k.replace('\\','/') or k.lower().startswith('loaders/')]
+        if leftover_loaders:
+            log('[WARN] Found loader paths still embedded (should have been removed):')
+            for lked in leftover_loaders[:10]:
+                log('  embedded loader key:', lked)
+    except Exception:
+        pass
+
+    phase_end('verify', verify_started, report)
+
+    report.embedded_keys = embedded_keys
+    report.duplicates = len(refs)
+    report.cache = dict(cache_stats) if compress and cache is not None else None
+    members = solid_bundle[0] if solid_bundle else {}
+    for path in files_map.keys():
+        try:
+            size = asset_size(files_map, path)
+        except Exception:
+            size = None
+        report.input_bytes += size or 0
+        source = 'duplicate' if path in refs else 'solid' if path in members else 'reused' if reuse and path in reuse else 'encoded'
+        report.add_asset(path, size, encoded_sizes.get(path), asset_stats.get(path), source=source)
+    try:
+        report.finish(sink.bytes if sink is not None else os.path.getsize(outpath))
+        emit_event('stats', **report.summary())
+    except Exception:
+        pass
+
+    # Finalize at 100%
+    log(f"[100%] Wrote {outpath if out is None else 'the output stream'}. Embedded keys: {len(embedded_keys)}")
+    if verbose_enabled() and embedded_keys:
+        for k in embedded_keys[:20]:
+            log("  embedded:", k)
+        log(f"[INFO] Timing: {report.describe()}")
+    return report
+
+def precompress_artifact(path, gzip_level=ARTIFACT_GZIP_LEVEL, brotli_quality=ARTIFACT_BROTLI_QUALITY):
+    """Write gzip and (with the brotli module) br copies of a built document.
+
+    The copies are streamed next to `path` as <path>.gz and <path>.br.
+    Returns encoding -> path of each copy that came out smaller than the
+    document; the others are removed again.
+    """
+    import shutil
+    brotli = get_brotli()
+    variants = {}
+    size = os.path.getsize(path)
+    codecs = [('gzip', '.gz')] + ([('br', '.br')] if brotli else [])
+    for encoding, ext in codecs:
+        dest = path + ext
+        try:
+            with open(path, 'rb') as src, open(dest, 'wb') as fh:
+                if encoding == 'gzip':
+                    with gzip.GzipFile(filename='', mode='wb', fileobj=fh, compresslevel=gzip_level, mtime=0) as gz:
+                        shutil.copyfileobj(src, gz, 1 << 20)
+                else:
+                    comp = brotli.Compressor(quality=brotli_quality)
+                    for chunk in iter(lambda: src.read(1 << 20), b''):
+                        fh.write(comp.process(chunk))
+                    fh.write(comp.finish())
+            if os.path.getsize(dest) < size:
+                variants[encoding] = dest
+            else:
+                os.remove(dest)
+        except Exception as e:
+            log(f"[WARN] Could not precompress {path} ({encoding}): {e}")
+            try:
+                os.remove(dest)
+            except OSError:
+                pass
+    return variants
+
+def build_from_files(files, out, variables=None, **options):
+    """Build from assets held in memory and write the document to `out`.
+
+    `files` maps each path, as it would be listed in files.txt, to its
+    content: bytes, a memoryview or a file object (see memory_file_map).
+    `out` is a writable binary stream; the document is written to it as
+    UTF-8 and the stream is left open. Other keyword arguments are those of
+    build(), except `incremental`, which needs files on disk. Returns what
+    build() returns: a BuildReport, or None when the build was aborted.
+    """
+    return build(files, VARIABLES if variables is None else variables, None, out=out, **options)
@@ -0,0 +1,171 @@
+"""Command line entry point: `everbuilder --cli [options]` builds from files.txt,
+anything else starts the web UI.
+
+The web server (and Flask) is only imported when the UI is started, so CLI
+builds don't pay for it.
+"""
+import sys
+
+from . import builder
+from .builder import (
+    CompressionPolicy, DEFAULT_COMPRESSION_PRESET, FILES_LIST, OUTPUT_FILE,
+    SOLID_MAX_ASSET_SIZE, VARIABLES, build, get_compression_cache, log, read_files_list,
+)
+from .watch import WATCH_DEBOUNCE, watch
+
+
+def cli_build():
+    try:
+        # enable progress in CLI by default
+        try:
+            builder.GLOBAL_EMIT_PROGRESS = True
+            # if user passed --verbose, enable verbose
+            if '--verbose' in sys.argv:
+                builder.GLOBAL_VERBOSE = True
+        except Exception:
+            pass
+        # if user passed --no-loader, disable loader injection
+        inject_loader_flag = not ('--no-loader' in sys.argv)
+        # support --loader NAME for CLI
+        selected_loader = None
+        if '--loader' in sys.argv:
+            try:
+                idx = sys.argv.index('--loader')
+                selected_loader = sys.argv[idx+1]
+            except Exception:
+                selected_loader = None
+        # support --embed-css flag to embed css directly preserving ids
+        embed_css_flag = '--embed-css' in sys.argv
+
+        # prepare variables dict for build
+        vars_for_build = dict(VARIABLES) if isinstance(VARIABLES, dict) else {}
+        if embed_css_flag:
+            vars_for_build['__embed_css_direct__'] = True
+        compress_flag = '--compress' in sys.argv
+        # support --compress-preset fast|balanced|max (implies --compress),
+        # --compress-rule .ext=QUALITY|off (repeatable) and --compress-min-size BYTES
+        if '--compress-preset' in sys.argv or '--compress-rule' in sys.argv or '--compress-min-size' in sys.argv:
+            preset = DEFAULT_COMPRESSION_PRESET
+            rules = {}
+            min_size = None
+            for i, arg in enumerate(sys.argv[:-1]):
+                value = sys.argv[i + 1]
+                try:
+                    if arg == '--compress-preset':
+                        preset = value
+                    elif arg == '--compress-rule':
+                        ext, _, quality = value.partition('=')
+                        ext = ext.lower() if ext.startswith('.') else '.' + ext.lower()
+                        rules[ext] = None if quality.lower() == 'off' else int(quality)
+                    elif arg == '--compress-min-size':
+                        min_size = int(value)
+                except ValueError:
+                    log(f'[WARN] Ignoring invalid {arg} {value}')
+            try:
+                compress_flag = CompressionPolicy.preset(preset).with_rules(rules, min_size=min_size)
+            except ValueError as e:
+                log(f'[WARN] {e}; using {DEFAULT_COMPRESSION_PRESET}')
+                compress_flag = CompressionPolicy.preset(DEFAULT_COMPRESSION_PRESET).with_rules(rules, min_size=min_size)
+        # support --stream to write the output asset by asset (bounded memory)
+        stream_flag = '--stream' in sys.argv
+        # support --jobs N to encode assets in N worker processes (0 = one per CPU)
+        jobs = 1
+        if '--jobs' in sys.argv:
+            try:
+                jobs = int(sys.argv[sys.argv.index('--jobs') + 1])
+            except Exception:
+                log('[WARN] --jobs expects an integer; using 1')
+                jobs = 1
+        # compressed payloads are cached on disk across builds unless --no-cache
+        cache = None
+        if compress_flag and '--no-cache' not in sys.argv:
+            cache_dir = None
+            cache_max = None
+            try:
+                if '--cache-dir' in sys.argv:
+                    cache_dir = sys.argv[sys.argv.index('--cache-dir') + 1]
+                if '--cache-size' in sys.argv:
+                    cache_max = int(sys.argv[sys.argv.index('--cache-size') + 1]) * 1024 * 1024
+            except Exception:
+                log('[WARN] Invalid --cache-dir/--cache-size; using defaults')
+            cache = get_compression_cache(cache_dir, cache_max, store_b64='--cache-b64' in sys.argv)
+        # support --incremental to reuse unchanged assets from the previous offline.html
+        incremental_flag = '--incremental' in sys.argv
+        # support --payload-blocks to emit each asset as its own lazily read block
+        payload_blocks_flag = '--payload-blocks' in sys.argv
+        # identical assets are embedded once unless --no-dedupe
+        dedupe_flag = '--no-dedupe' not in sys.argv
+        # --fetch-paths keeps fetched buildUrl data as relative paths (compressed, fetch() loaders only)
+        fetch_paths_flag = '--fetch-paths' in sys.argv
+        # support --inlined auto|keep|drop for scripts/styles already inlined into the page
+        inlined_mode = 'auto'
+        if '--inlined' in sys.argv:
+            try:
+                inlined_mode = sys.argv[sys.argv.index('--inlined') + 1]
+            except Exception:
+                inlined_mode = 'auto'
+            if inlined_mode not in ('auto', 'keep', 'drop'):
+                log('[WARN] --inlined expects auto, keep or drop; using auto')
+                inlined_mode = 'auto'
+        # support --solid [--solid-max-size BYTES] to pack small assets into one compressed blob
+        solid_flag = '--solid' in sys.argv
+        if '--solid-max-size' in sys.argv:
+            try:
+                solid_flag = int(sys.argv[sys.argv.index('--solid-max-size') + 1])
+            except Exception:
+                log(f'[WARN] --solid-max-size expects a byte count; using {SOLID_MAX_ASSET_SIZE}')
+                solid_flag = True
+        # support --worker-decode to decode large assets in a Web Worker at runtime
+        worker_decode_flag = '--worker-decode' in sys.argv
+        # support --asset-cache to keep decoded assets in the browser's IndexedDB
+        asset_cache_flag = '--asset-cache' in sys.argv
+        # support --report PATH to write per-phase timings and per-asset sizes as JSON
+        report_path = None
+        if '--report' in sys.argv:
+            try:
+                report_path = sys.argv[sys.argv.index('--report') + 1]
+            except Exception:
+                log('[WARN] --report expects a file name; no report written')
+        # support --watch [--watch-debounce MS] [--watch-poll] to rebuild whenever a listed file changes
+        watch_flag = '--watch' in sys.argv
+        debounce = WATCH_DEBOUNCE
+        if '--watch-debounce' in sys.argv:
+            try:
+                debounce = int(sys.argv[sys.argv.index('--watch-debounce') + 1]) / 1000.0
+            except Exception:
+                log(f'[WARN] --watch-debounce expects milliseconds; using {int(WATCH_DEBOUNCE * 1000)}')
+        if watch_flag:
+            # rebuilds only re-encode the files that changed
+            incremental_flag = True
+
+        def run_build():
+            files = read_files_list(FILES_LIST)
+            total = len(files)
+            log(f"[0%] Found {total} files listed.")
+            report = build(files, vars_for_build, OUTPUT_FILE, inject_loader=inject_loader_flag, selected_loader=selected_loader, compress=compress_flag, stream=stream_flag, jobs=jobs, cache=cache, incremental=incremental_flag, payload_blocks=payload_blocks_flag, dedupe=dedupe_flag, inlined=inlined_mode, solid=solid_flag, worker_decode=worker_decode_flag, asset_cache=asset_cache_flag, fetch_paths=fetch_paths_flag)
+            if report is not None and report_path:
+                try:
+                    report.write(report_path)
+                    log(f"[INFO] Report written to {report_path} ({report.describe()})")
+                except OSError as e:
+                    log(f"[WARN] Could not write report {report_path}: {e}")
+            return report
+
+        run_build()
+        if watch_flag:
+            watch(lambda: [FILES_LIST] + read_files_list(FILES_LIST), run_build, debounce=debounce, poll='--watch-poll' in sys.argv)
+    except Exception as e:
+        print("ERROR:", e, file=sys.stderr)
+        raise
+
+
+def main(argv=None):
+    """Run a CLI build with --cli, otherwise serve the web UI (--no-browser skips opening it)."""
+    if argv is not None:
+        sys.argv[1:] = argv
+    if len(sys.argv) > 1 and sys.argv[1] == '--cli':
+        cli_build()
+    else:
+        from .server import serve_ui
+        serve_ui(no_browser='--no-browser' in sys.argv)
+    return 0
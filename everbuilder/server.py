@@ -0,0 +1,617 @@
+"""Web UI: a Flask app that queues uploaded builds and streams their progress.
+
+Flask is imported inside create_app(), so importing this module stays cheap.
+"""
+import itertools
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import webbrowser
+from collections import OrderedDict, deque
+from pathlib import Path
+
+from .builder import (
+    ASSET_ROOT, COMPRESSION_PRESETS, VARIABLES, build_from_files, build_output, clock,
+    get_compression_cache, human_size, log, phase_end, phase_start, precompress_artifact,
+)
+
+# Finished build jobs kept for /build/<id>/... before the oldest are forgotten
+JOB_HISTORY = 50
+# Build events (log lines, phases, asset progress) kept per job for late subscribers
+EVENT_BUFFER = 5000
+# Uploaded files bigger than this wait for their build in a temporary file instead of in memory
+UPLOAD_SPOOL_SIZE = 4 * 1024 * 1024
+
+
+class EventBus:
+    """Fan-out of typed build events with a bounded replay buffer.
+
+    publish() stamps each event with the next id (from 1) and appends it to
+    a ring buffer holding the last `capacity` events. Every subscribe()
+    call gets its own cursor: it replays the buffered events after `after`
+    (e.g. an SSE Last-Event-ID) and then waits for new ones, so any number
+    of clients can watch without taking events from each other. A client
+    that fell further behind than the buffer first gets a 'gap' event with
+    the number of events it missed.
+    """
+
+    def __init__(self, capacity=EVENT_BUFFER):
+        self._events = deque(maxlen=capacity)
+        self._next_id = 1
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def publish(self, kind, data=None):
+        with self._cond:
+            event = (self._next_id, kind, data or {})
+            self._next_id += 1
+            self._events.append(event)
+            self._cond.notify_all()
+            return event[0]
+
+    def close(self):
+        """No more events; subscribers return once they have seen the last one."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    @property
+    def last_id(self):
+        return self._next_id - 1
+
+    def subscribe(self, after=0, timeout=15):
+        """Yield (id, kind, data) for every event after id `after`.
+
+        Yields None after `timeout` seconds without news so streaming
+        callers can send a keep-alive and notice clients that went away.
+        """
+        pos = after
+        while True:
+            with self._cond:
+                if not self._closed and pos >= self._next_id - 1:
+                    self._cond.wait(timeout)
+                first = self._events[0][0] if self._events else self._next_id
+                new = list(itertools.islice(self._events, max(0, pos + 1 - first), None))
+                closed = self._closed
+            if new and new[0][0] > pos + 1:
+                yield (None, 'gap', {'missed': new[0][0] - pos - 1})
+            for event in new:
+                pos = event[0]
+                yield event
+            if closed and pos >= self.last_id:
+                return
+            if not new:
+                yield None
+
+class _JobLogHandler(logging.Handler):
+    def __init__(self, job):
+        super().__init__()
+        self.job = job
+
+    def emit(self, record):
+        try:
+            self.job.add_line(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+class BuildJob:
+    """One build submitted to the web server.
+
+    A job owns its uploads (path -> content, as build_from_files takes
+    them), its settings, a directory for its outputs and its log: lines written
+    to `job.logger` (log() routes build output there, see build_output) are
+    kept in `lines` for build.log and published as 'log' events on
+    `job.events`, next to the typed events of the build itself (queue,
+    phase, asset, stats) and a final 'done'. `state` goes queued -> running
+    -> done/failed. `report` is the BuildReport's to_dict() once built.
+    """
+
+    def __init__(self, tempdir, settings=None, job_id=None, uploads=None):
+        self.id = job_id or uuid.uuid4().hex[:12]
+        self.tempdir = tempdir
+        self.settings = settings or {}
+        self.uploads = uploads or {}
+        self.state = 'queued'
+        self.lines = []
+        self.error = None
+        self.artifact = None
+        self.artifact_name = None
+        self.artifact_variants = {}
+        self.log_path = None
+        self.report = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.events = EventBus()
+        # not registered with logging.getLogger(), so finished jobs are freed
+        self.logger = logging.Logger(f'everbuilder.job.{self.id}', logging.INFO)
+        self.logger.addHandler(_JobLogHandler(self))
+
+    def add_line(self, text):
+        # normalize line endings so each stored item is one logical line
+        for part in str(text).replace('\r\n', '\n').replace('\r', '\n').split('\n'):
+            if part:
+                self.lines.append(part)
+                self.events.publish('log', {'line': part})
+
+    def finish(self, state, error=None):
+        self.state = state
+        self.error = error
+        self.finished = time.time()
+        self.events.publish('done', {'state': state, 'error': error, 'elapsed': round(self.finished - (self.started or self.created), 3)})
+        self.events.close()
+
+    @property
+    def done(self):
+        return self.state in ('done', 'failed')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'state': self.state,
+            'error': self.error,
+            'lines': len(self.lines),
+            'artifact_name': self.artifact_name if self.artifact else None,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+        }
+
+class BuildService:
+    """FIFO queue of BuildJobs run by a bounded pool of worker threads.
+
+    `run_job(job)` does the actual work; it runs on one of `workers`
+    threads (default: one per CPU) and should leave the job's artifact and
+    log set. Jobs submitted while every worker is busy wait their turn in
+    submission order and are told their queue position as it changes. The
+    last JOB_HISTORY finished jobs stay available through get().
+    """
+
+    def __init__(self, run_job, workers=None, history=JOB_HISTORY):
+        self.run_job = run_job
+        self.workers = max(1, int(workers or os.cpu_count() or 1))
+        self.history = history
+        self._pending = deque()
+        self._jobs = OrderedDict()
+        self._running = 0
+        self._threads = []
+        self._cond = threading.Condition()
+
+    def submit(self, job):
+        """Queue `job`; returns its queue position (0 when a worker is free for it)."""
+        with self._cond:
+            self._jobs[job.id] = job
+            self._forget_old()
+            self._pending.append(job)
+            if len(self._threads) < self.workers:
+                t = threading.Thread(target=self._worker, name=f'everbuilder-build-{len(self._threads) + 1}', daemon=True)
+                self._threads.append(t)
+                t.start()
+            position = self._position(job)
+            self._cond.notify()
+        if position:
+            job.logger.info(f"[QUEUED] All {self.workers} build workers are busy; position {position} in the queue")
+            job.events.publish('queue', {'position': position, 'workers': self.workers})
+        return position
+
+    def get(self, job_id):
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def latest(self):
+        with self._cond:
+            return next(reversed(self._jobs.values()), None)
+
+    def position(self, job):
+        with self._cond:
+            return self._position(job)
+
+    def _position(self, job):
+        # jobs a free worker is about to pick up do not count as waiting
+        try:
+            return max(0, self._pending.index(job) + 1 - (self.workers - self._running))
+        except ValueError:
+            return 0
+
+    def queue_depth(self):
+        """Number of jobs waiting for a worker."""
+        with self._cond:
+            return max(0, len(self._pending) - (self.workers - self._running))
+
+    def stats(self):
+        with self._cond:
+            return {
+                'workers': self.workers,
+                'running': self._running,
+                'queued': max(0, len(self._pending) - (self.workers - self._running)),
+                'jobs': len(self._jobs),
+            }
+
+    def _forget_old(self):
+        finished = [jid for jid, j in self._jobs.items() if j.done]
+        for jid in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[jid]
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                job = self._pending.popleft()
+                self._running += 1
+                waiting = list(self._pending)
+            job.state = 'running'
+            job.started = time.time()
+            job.events.publish('queue', {'position': 0, 'workers': self.workers})
+            for other in waiting:
+                position = self.position(other)
+                if position:
+                    other.logger.info(f"[QUEUED] Position {position} in the queue")
+                    other.events.publish('queue', {'position': position, 'workers': self.workers})
+            try:
+                self.run_job(job)
+                job.finish('done' if job.artifact else 'failed', None if job.artifact else 'no artifact was written')
+            except Exception as e:
+                job.logger.info(f'[ERROR] {e}')
+                job.finish('failed', str(e))
+            finally:
+                with self._cond:
+                    self._running -= 1
+
+def create_app():
+    """The web UI's Flask app, with its own BuildService (app.extensions['everbuilder'])."""
+    from flask import Flask, Request, send_from_directory, request, Response, jsonify, send_file, stream_with_context
+
+    class _UploadFile(tempfile.SpooledTemporaryFile):
+        # the request closes its uploads when it ends; the queued job still needs them
+        def close(self):
+            pass
+
+        def release(self):
+            super().close()
+
+    class UploadRequest(Request):
+        # small uploads stay in memory so build_from_files() reads them without a
+        # disk round trip; big ones are spooled to disk so queued builds don't pile
+        # up their uploads in memory, and the build memory-maps them from there
+        def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+            return _UploadFile(max_size=UPLOAD_SPOOL_SIZE)
+
+    # serve the UI under a namespaced path to avoid collisions with other index.html files
+    app = Flask(__name__, static_folder=str(ASSET_ROOT / 'src'), static_url_path='/everbuilder_static')
+    app.request_class = UploadRequest
+
+    @app.route('/everbuilder')
+    def index():
+        return send_from_directory(app.static_folder, 'index.html')
+
+    @app.route('/everbuilder_static/<path:filename>')
+    def static_files(filename):
+        return send_from_directory(app.static_folder, filename)
+
+    def auto_open(path):
+        try:
+            if os.name == 'nt':
+                os.startfile(path)
+            else:
+                # macOS or Linux
+                if shutil.which('open'):
+                    subprocess.Popen(['open', path])
+                elif shutil.which('xdg-open'):
+                    subprocess.Popen(['xdg-open', path])
+                else:
+                    # fallback to webbrowser
+                    webbrowser.open('file://' + path)
+        except Exception:
+            pass
+
+    def run_job(job):
+        """Run one queued web build; called on a BuildService worker thread."""
+        settings = job.settings
+        tempdir = job.tempdir
+        offline_path = os.path.join(tempdir, 'offline.html')
+        # the build reads the uploads from memory, writes into the job's own
+        # directory (no chdir, no stdout swapping) and reports through the
+        # job's logger
+        with build_output(job.logger, verbose=settings.get('verbose'), emit_progress=settings.get('emit_progress', True), events=job.events.publish):
+            log(f"[0%] Found {len(job.uploads)} files listed.")
+            try:
+                inject_loader_flag = bool(settings.get('inject_loader', True))
+                selected_loader_name = settings.get('selected_loader')
+                # construct variables dict and include embed_css setting
+                vars_for_build = dict(VARIABLES) if isinstance(VARIABLES, dict) else {}
+                if settings.get('embed_css'):
+                    vars_for_build['__embed_css_direct__'] = True
+                compress_flag = bool(settings.get('compress'))
+                if compress_flag and settings.get('compress_preset') in COMPRESSION_PRESETS:
+                    compress_flag = settings.get('compress_preset')
+                stream_flag = bool(settings.get('stream'))
+                jobs = settings.get('jobs', 1)
+                # share the on-disk compression cache with CLI builds
+                cache = get_compression_cache() if compress_flag and settings.get('cache', True) else None
+                payload_blocks_flag = bool(settings.get('payload_blocks'))
+                dedupe_flag = bool(settings.get('dedupe', True))
+                fetch_paths_flag = bool(settings.get('fetch_paths'))
+                inlined_mode = settings.get('inlined') if settings.get('inlined') in ('auto', 'keep', 'drop') else 'auto'
+                solid_flag = bool(settings.get('solid'))
+                worker_decode_flag = bool(settings.get('worker_decode'))
+                asset_cache_flag = bool(settings.get('asset_cache'))
+                with open(offline_path + '.tmp', 'wb') as out:
+                    report = build_from_files(job.uploads, out, vars_for_build, inject_loader=inject_loader_flag, selected_loader=selected_loader_name, compress=compress_flag, stream=stream_flag, jobs=jobs, cache=cache, payload_blocks=payload_blocks_flag, dedupe=dedupe_flag, inlined=inlined_mode, solid=solid_flag, worker_decode=worker_decode_flag, asset_cache=asset_cache_flag, fetch_paths=fetch_paths_flag)
+                if report is not None:
+                    job.report = report.to_dict()
+                    os.replace(offline_path + '.tmp', offline_path)
+                    # compress the download once here rather than on every request
+                    started = phase_start('precompress')
+                    job.artifact_variants = precompress_artifact(offline_path)
+                    phase_end('precompress', started)
+                    sizes = ', '.join(f'{enc} {human_size(os.path.getsize(p))}' for enc, p in job.artifact_variants.items())
+                    log(f"[INFO] Download copies: {sizes or 'none'} (of {human_size(os.path.getsize(offline_path))}, {clock()[0] - started[0]:.1f}s)")
+                    log('[100%] Build finished')
+            except Exception as e:
+                log('[ERROR] ' + str(e))
+            finally:
+                # free the uploads (and their spool files); the artifact is on disk now
+                for upload in job.uploads.values():
+                    if hasattr(upload, 'release'):
+                        upload.release()
+                job.uploads = {}
+                if os.path.exists(offline_path + '.tmp'):
+                    os.remove(offline_path + '.tmp')
+
+        # save the job's log lines into a log file
+        log_path = os.path.join(tempdir, 'build.log')
+        try:
+            with open(log_path, 'w', encoding='utf-8') as fh:
+                # write settings at top
+                try:
+                    fh.write('Settings: ' + json.dumps(settings) + '\n')
+                except Exception:
+                    fh.write('Settings: (invalid)\n')
+                fh.write('\n'.join(job.lines))
+            job.log_path = log_path
+        except Exception:
+            job.log_path = None
+
+        if os.path.exists(offline_path):
+            job.artifact = offline_path
+            job.artifact_name = 'offline.html'
+            # Auto-open artifact if requested and supported
+            if settings.get('auto_open') and supports_auto_open():
+                auto_open(offline_path)
+
+        if settings.get('clean_temp'):
+            # give the client a moment to download, then remove the upload dir
+            def cleanup():
+                try:
+                    shutil.rmtree(tempdir)
+                except Exception:
+                    pass
+            threading.Timer(10, cleanup).start()
+
+    service = BuildService(run_job)
+
+    def job_urls(job):
+        return {
+            'status_url': f'/build/{job.id}',
+            'stream_url': f'/build/{job.id}/stream',
+            'events_url': f'/build/{job.id}/events',
+            'result_url': f'/build/{job.id}/result',
+            'log_url': f'/build/{job.id}/log',
+            'report_url': f'/build/{job.id}/report',
+            'artifact_url': f'/build/{job.id}/artifact',
+        }
+
+    @app.route('/build', methods=['POST'])
+    def build_route():
+        tempdir = tempfile.mkdtemp(prefix='hazmob-build-')
+
+        # parse settings if provided
+        settings = {}
+        if 'settings' in request.form:
+            try:
+                settings = json.loads(request.form['settings'])
+            except Exception:
+                settings = {}
+
+        # path -> in-memory upload, keyed like the files.txt entries the builder expects
+        uploads = {}
+        for f in request.files.getlist('files'):
+            filename = f.filename.replace('\\', '/').lstrip('/')
+            uploads[Path(filename).as_posix()] = f.stream
+
+        job = BuildJob(tempdir, settings, uploads=uploads)
+        position = service.submit(job)
+
+        # Clients follow the job's log at stream_url and fetch the
+        # artifact from artifact_url once the stream ends.
+        return jsonify(dict(job_urls(job), id=job.id, status='queued' if position else 'started', queue_position=position, queue_depth=service.queue_depth()))
+
+    def job_or_404(job_id):
+        job = service.latest() if job_id is None else service.get(job_id)
+        if job is None:
+            return None, (jsonify({'error': 'No such build'}) if job_id else 'No active build', 404)
+        return job, None
+
+    @app.route('/build/queue')
+    def build_queue():
+        return jsonify(service.stats())
+
+    @app.route('/build/<job_id>')
+    def build_status(job_id):
+        job, err = job_or_404(job_id)
+        if err:
+            return err
+        return jsonify(dict(job.to_dict(), queue_position=service.position(job), **job_urls(job)))
+
+    # the /build/stream, /build/result, /build/log and /build/artifact
+    # routes without an id refer to the most recently submitted build
+    @app.route('/build/stream')
+    @app.route('/build/<job_id>/stream')
+    def build_stream(job_id=None):
+        job, err = job_or_404(job_id)
+        if err:
+            return err
+
+        def stream2():
+            # plain-text view of the job's 'log' events
+            for event in job.events.subscribe():
+                if event is not None and event[1] == 'log':
+                    yield event[2]['line'] + '\n'
+            yield 'READY\n'
+
+        resp2 = Response(stream_with_context(stream2()), mimetype='text/plain')
+        resp2.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+        return resp2
+
+    @app.route('/build/events')
+    @app.route('/build/<job_id>/events')
+    def build_events(job_id=None):
+        """Server-Sent Events: the job's events, replayed from Last-Event-ID (or ?after=N)."""
+        job, err = job_or_404(job_id)
+        if err:
+            return err
+        try:
+            after = int(request.headers.get('Last-Event-ID') or request.args.get('after') or 0)
+        except ValueError:
+            after = 0
+        if job.events.closed and after >= job.events.last_id:
+            # nothing left to send; 204 tells EventSource not to reconnect
+            return '', 204
+
+        def sse():
+            yield 'retry: 3000\n\n'
+            for event in job.events.subscribe(after):
+                if event is None:
+                    yield ': keep-alive\n\n'
+                    continue
+                event_id, kind, data = event
+                yield (f'id: {event_id}\n' if event_id else '') + f'event: {kind}\ndata: {json.dumps(data)}\n\n'
+
+        resp = Response(stream_with_context(sse()), mimetype='text/event-stream')
+        resp.headers['Cache-Control'] = 'no-cache'
+        resp.headers['X-Accel-Buffering'] = 'no'
+        return resp
+
+    @app.route('/build/result')
+    @app.route('/build/<job_id>/result')
+    def build_result(job_id=None):
+        job, err = job_or_404(job_id)
+        if err:
+            return err
+        if job.log_path is None and job.artifact is None:
+            return jsonify({}), 404
+        urls = job_urls(job)
+        info = {
+            'id': job.id,
+            'state': job.state,
+            'log_url': urls['log_url'],
+            'report_url': urls['report_url'] if job.report is not None else None,
+            'build_url': urls['artifact_url'],
+            'build_name': job.artifact_name
+        }
+        try:
+            info['build_size'] = os.path.getsize(job.artifact)
+            info['build_encodings'] = {enc: os.path.getsize(p) for enc, p in job.artifact_variants.items()}
+        except (OSError, TypeError):
+            pass
+        return jsonify(info)
+
+    @app.route('/build/log')
+    @app.route('/build/<job_id>/log')
+    def build_log(job_id=None):
+        job, err = job_or_404(job_id)
+        if err:
+            return err
+        if not job.log_path or not os.path.exists(job.log_path):
+            return 'No log', 404
+        return send_file(job.log_path, mimetype='text/plain', as_attachment=True, download_name='build.log')
+
+    @app.route('/build/report')
+    @app.route('/build/<job_id>/report')
+    def build_report(job_id=None):
+        job, err = job_or_404(job_id)
+        if err:
+            return err
+        if job.report is None:
+            return jsonify({}), 404
+        return jsonify(job.report)
+
+    @app.route('/build/artifact')
+    @app.route('/build/<job_id>/artifact')
+    def build_artifact(job_id=None):
+        job, err = job_or_404(job_id)
+        if err:
+            return err
+        if not job.artifact or not os.path.exists(job.artifact):
+            return 'No artifact', 404
+        # serve the smallest copy the client accepts; send_file handles
+        # Range, ETag (per copy) and If-None-Match/If-Modified-Since
+        variants = {enc: p for enc, p in job.artifact_variants.items() if os.path.exists(p)}
+        offers = [enc for enc in ('br', 'gzip') if enc in variants] + ['identity']
+        encoding = request.accept_encodings.best_match(offers, default='identity')
+        resp = send_file(variants.get(encoding, job.artifact), mimetype='text/html', as_attachment=True, download_name=job.artifact_name)
+        if encoding in variants:
+            resp.headers['Content-Encoding'] = encoding
+        resp.vary.add('Accept-Encoding')
+        # always revalidate; an unchanged artifact then costs a 304
+        resp.headers['Cache-Control'] = 'no-cache'
+        return resp
+
+    def supports_auto_open():
+        # check whether we can open files programmatically on this OS
+        try:
+            if os.name == 'nt':
+                return True
+            if shutil.which('open') or shutil.which('xdg-open'):
+                return True
+            return True if webbrowser else False
+        except Exception:
+            return False
+
+    @app.route('/features')
+    def features():
+        return jsonify({
+            'auto_open': supports_auto_open()
+        })
+
+    @app.route('/everbuilder/_debug')
+    def _everbuilder_debug():
+        # expose some internal state for local debugging
+        job = service.latest()
+        return jsonify({
+            'queue': service.stats(),
+            'latest': job.to_dict() if job else None,
+            'tempdir': job.tempdir if job else None,
+        })
+
+    app.extensions['everbuilder'] = service
+    return app
+
+
+def serve_ui(port=5000, no_browser=False):
+    try:
+        app = create_app()
+    except ImportError:
+        print("Flask is required for the web UI. Install with: python -m pip install Flask", file=sys.stderr)
+        sys.exit(1)
+
+    url = f'http://127.0.0.1:{port}/everbuilder'
+    # Only auto-open the browser if not suppressed (the embedded launcher passes --no-browser)
+    try:
+        if not no_browser:
+            threading.Timer(0.5, lambda: webbrowser.open(url)).start()
+    except Exception:
+        pass
+    app.run(port=port, debug=False, threaded=True)
@@ -0,0 +1,213 @@
+"""Watch mode: rebuild whenever one of the listed files changes.
+
+Changes are picked up with inotify on Linux (through ctypes, no extra
+dependency) and by polling mtimes everywhere else. Bursts of changes, such
+as a Unity build rewriting a dozen files, are debounced into one rebuild.
+"""
+import os
+import select
+import struct
+import sys
+import time
+
+from .builder import log
+
+# Quiet period after the last change before rebuilding
+WATCH_DEBOUNCE = 0.2
+# How often the polling watcher stats the watched files
+WATCH_POLL_INTERVAL = 0.5
+
+# inotify(7) event bits
+_IN_MODIFY = 0x002
+_IN_ATTRIB = 0x004
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_FROM = 0x040
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_Q_OVERFLOW = 0x4000
+_IN_MASK = _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+_IN_EVENT = struct.Struct('iIII')
+
+
+class PollingWatcher:
+    """Finds changed files by comparing their mtime and size every `interval` seconds."""
+
+    name = 'polling'
+
+    def __init__(self, paths, interval=WATCH_POLL_INTERVAL):
+        self.interval = interval
+        self.update(paths)
+
+    def _stat(self, path):
+        try:
+            st = os.stat(path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def update(self, paths):
+        # known files keep their last seen state, so a change made during a rebuild is not lost
+        state = getattr(self, 'state', {})
+        self.state = {path: state[path] if path in state else self._stat(path) for path in paths}
+
+    def poll(self):
+        changed = set()
+        for path, before in self.state.items():
+            now = self._stat(path)
+            if now != before:
+                self.state[path] = now
+                changed.add(path)
+        return changed
+
+    def wait(self, timeout=None):
+        """Changed paths, or an empty set once `timeout` seconds passed without changes."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            changed = self.poll()
+            if changed:
+                return changed
+            if deadline is None:
+                time.sleep(self.interval)
+                continue
+            left = deadline - time.monotonic()
+            if left <= 0:
+                return set()
+            time.sleep(min(self.interval, left))
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """Linux watcher: inotify on the directories holding the watched files.
+
+    Directories rather than the files themselves are watched so editors and
+    build tools that replace a file (write a temp file, rename it over) are
+    still seen. Events for files that aren't watched are dropped.
+    """
+
+    name = 'inotify'
+
+    def __init__(self, paths):
+        import ctypes
+        import ctypes.util
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.dirs = {}
+        self.update(paths)
+
+    def update(self, paths):
+        self.paths = {}
+        for path in paths:
+            self.paths.setdefault(os.path.abspath(path), set()).add(path)
+        for d in {os.path.dirname(p) for p in self.paths}:
+            if d in self.dirs.values():
+                continue
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(d), _IN_MASK)
+            if wd >= 0:
+                self.dirs[wd] = d
+            elif os.path.isdir(d):
+                # e.g. out of inotify watches; that directory's files go unnoticed
+                log(f"[WARN] Cannot watch {d}; changes there need a restart of --watch")
+
+    def _read(self, timeout):
+        try:
+            ready, _, _ = select.select([self.fd], [], [], timeout)
+        except InterruptedError:
+            return set()
+        if not ready:
+            return set()
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        changed = set()
+        offset = 0
+        while offset + _IN_EVENT.size <= len(buf):
+            wd, mask, _cookie, length = _IN_EVENT.unpack_from(buf, offset)
+            name = buf[offset + _IN_EVENT.size:offset + _IN_EVENT.size + length].rstrip(b'\0')
+            offset += _IN_EVENT.size + length
+            if mask & _IN_Q_OVERFLOW:
+                # events were lost; assume everything changed
+                for listed in self.paths.values():
+                    changed |= listed
+                continue
+            d = self.dirs.get(wd)
+            if d is None or not name:
+                continue
+            changed |= self.paths.get(os.path.join(d, os.fsdecode(name)), set())
+        return changed
+
+    def wait(self, timeout=None):
+        """Changed paths, or an empty set once `timeout` seconds passed without changes."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            left = None if deadline is None else max(0.0, deadline - time.monotonic())
+            changed = self._read(left)
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+
+    def close(self):
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+def open_watcher(paths, poll=False):
+    """inotify on Linux unless `poll`, polling everywhere else (or if inotify fails)."""
+    if not poll and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(paths)
+        except Exception as e:
+            log(f"[WARN] inotify unavailable ({e}); polling for changes")
+    return PollingWatcher(paths)
+
+
+def watch(get_paths, rebuild, debounce=WATCH_DEBOUNCE, poll=False):
+    """Call `rebuild()` after each burst of changes to the files `get_paths()` lists.
+
+    A rebuild starts once no further change arrived for `debounce` seconds.
+    The watched list is refreshed after every rebuild, so files added to
+    files.txt are picked up. Every rebuild reports how long it took and its
+    latency: the time from the first change of the burst to the rebuilt
+    output. Runs until interrupted (Ctrl+C).
+    """
+    paths = get_paths()
+    watcher = open_watcher(paths, poll=poll)
+    log(f"[INFO] Watching {len(paths)} files ({watcher.name}); press Ctrl+C to stop")
+    rebuilds = 0
+    try:
+        while True:
+            changed = watcher.wait()
+            if not changed:
+                continue
+            first_change = time.perf_counter()
+            while True:
+                more = watcher.wait(debounce)
+                if not more:
+                    break
+                changed |= more
+            names = sorted(changed)
+            shown = ', '.join(names[:5]) + (f' and {len(names) - 5} more' if len(names) > 5 else '')
+            log(f"[INFO] Changed: {shown}")
+            started = time.perf_counter()
+            try:
+                rebuild()
+            except Exception as e:
+                log(f"[ERROR] Rebuild failed: {e}")
+            else:
+                rebuilds += 1
+                finished = time.perf_counter()
+                log(f"[INFO] Rebuild {rebuilds} took {finished - started:.2f}s; {finished - first_change:.2f}s from the first change to the new output")
+            try:
+                watcher.update(get_paths())
+            except Exception as e:
+                log(f"[WARN] Keeping the previous watch list: {e}")
+    except KeyboardInterrupt:
+        log('[INFO] Stopped watching')
+    finally:
+        watcher.close()
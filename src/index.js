@@ -19,6 +19,17 @@
     const optAutoOpen = $id('opt_auto_open');
     const optVerbose = $id('opt_verbose');
     const optCompress = $id('opt_compress');
+    const optStream = $id('opt_stream');
+    const optJobs = $id('opt_jobs');
+    const optCache = $id('opt_cache');
+    const optPayloadBlocks = $id('opt_payload_blocks');
+    const optDedupe = $id('opt_dedupe');
+    const optFetchPaths = $id('opt_fetch_paths');
+    const optInlined = $id('opt_inlined');
+    const optCompressPreset = $id('opt_compress_preset');
+    const optSolid = $id('opt_solid');
+    const optWorkerDecode = $id('opt_worker_decode');
+    const optAssetCache = $id('opt_asset_cache');
   const loaderSelect = $id('loaderSelect');
   const loaderPreview = $id('loaderPreview');
 
@@ -37,26 +48,29 @@
     if(clearBtn) clearBtn.addEventListener('click', ()=>{ files=[]; if(dirInput) dirInput.value=null; updateUI(); if(logArea) logArea.textContent='Cleared.'; if(downloadLog) downloadLog.style.display='none'; if(downloadBuild) downloadBuild.style.display='none'; if(artifactNameEl) artifactNameEl.textContent='-'; if(artifactSizeEl) artifactSizeEl.textContent='-'; setStatus('Idle'); });
 
     // settings
-    try{ const s = JSON.parse(localStorage.getItem('everbuilder.settings')||'{}'); if(s){ if(optClean) optClean.checked = !!s.clean_temp; if(optAutoOpen) optAutoOpen.checked = !!s.auto_open; if(optVerbose) optVerbose.checked = !!s.verbose; if(optCompress) optCompress.checked = !!s.compress; } }catch(e){}
-  function saveSettings(){ localStorage.setItem('everbuilder.settings', JSON.stringify({ clean_temp: optClean?optClean.checked:false, auto_open: optAutoOpen?optAutoOpen.checked:false, verbose: optVerbose?optVerbose.checked:false, compress: optCompress?optCompress.checked:false, loader: loaderSelect?loaderSelect.value:'basic' })); }
-    [optClean,optAutoOpen,optVerbose,optCompress].forEach(n=>n&&n.addEventListener('change', saveSettings));
+    try{ const s = JSON.parse(localStorage.getItem('everbuilder.settings')||'{}'); if(s){ if(optClean) optClean.checked = !!s.clean_temp; if(optAutoOpen) optAutoOpen.checked = !!s.auto_open; if(optVerbose) optVerbose.checked = !!s.verbose; if(optCompress) optCompress.checked = !!s.compress; if(optStream) optStream.checked = !!s.stream; if(optJobs && s.jobs !== undefined) optJobs.value = s.jobs; if(optCache && s.cache !== undefined) optCache.checked = !!s.cache; if(optPayloadBlocks) optPayloadBlocks.checked = !!s.payload_blocks; if(optDedupe && s.dedupe !== undefined) optDedupe.checked = !!s.dedupe; if(optFetchPaths) optFetchPaths.checked = !!s.fetch_paths; if(optInlined && s.inlined) optInlined.value = s.inlined; if(optCompressPreset && s.compress_preset) optCompressPreset.value = s.compress_preset; if(optSolid) optSolid.checked = !!s.solid; if(optWorkerDecode) optWorkerDecode.checked = !!s.worker_decode; if(optAssetCache) optAssetCache.checked = !!s.asset_cache; } }catch(e){}
+  function jobsValue(){ const n = parseInt(optJobs.value, 10); return isNaN(n) || n < 0 ? 1 : n; }
+  function saveSettings(){ localStorage.setItem('everbuilder.settings', JSON.stringify({ clean_temp: optClean?optClean.checked:false, auto_open: optAutoOpen?optAutoOpen.checked:false, verbose: optVerbose?optVerbose.checked:false, compress: optCompress?optCompress.checked:false, stream: optStream?optStream.checked:false, jobs: optJobs?jobsValue():1, cache: optCache?optCache.checked:true, payload_blocks: optPayloadBlocks?optPayloadBlocks.checked:false, dedupe: optDedupe?optDedupe.checked:true, fetch_paths: optFetchPaths?optFetchPaths.checked:false, inlined: optInlined?optInlined.value:'auto', compress_preset: optCompressPreset?optCompressPreset.value:'max', solid: optSolid?optSolid.checked:false, worker_decode: optWorkerDecode?optWorkerDecode.checked:false, asset_cache: optAssetCache?optAssetCache.checked:false, loader: loaderSelect?loaderSelect.value:'basic' })); }
+    [optClean,optAutoOpen,optVerbose,optCompress,optStream,optJobs,optCache,optPayloadBlocks,optDedupe,optInlined,optCompressPreset,optSolid,optWorkerDecode,optAssetCache].forEach(n=>n&&n.addEventListener('change', saveSettings));
 
     // network helpers
     function candidatePaths(path){ return [path, '/everbuilder'+path]; }
     async function fetchWithFallback(path, opts){ const c = candidatePaths(path); for(const u of c){ try{ const r = await fetch(u, opts); if(r && r.ok) return r; }catch(e){} } return fetch(c[0], opts); }
+    // for URLs another API opens itself (EventSource): the first candidate that answers a HEAD request
+    async function resolveWithFallback(path){ for(const u of candidatePaths(path)){ try{ const r = await fetch(u, {method:'HEAD'}); if(r && r.ok) return u; }catch(e){} } return path; }
 
-    // build flow: upload via XHR (to get upload progress) then open a streaming fetch to /build/stream
+    // build flow: upload via XHR (to get upload progress) then open a streaming fetch to /build/<id>/stream
   async function startBuild(){
       if(!files.length) return;
       if(logArea) logArea.textContent = 'Starting upload...\n'; if(progressBar) progressBar.style.width='0%'; if(progressPct) progressPct.textContent='0%'; if(etaLabel) etaLabel.textContent='ETA: --:--'; setStatus('Uploading');
 
-  const settingsObj = { clean_temp: optClean?optClean.checked:false, auto_open: optAutoOpen?optAutoOpen.checked:false, verbose: optVerbose?optVerbose.checked:false, embed_css: false, compress: optCompress?optCompress.checked:false };
+  const settingsObj = { clean_temp: optClean?optClean.checked:false, auto_open: optAutoOpen?optAutoOpen.checked:false, verbose: optVerbose?optVerbose.checked:false, embed_css: false, compress: optCompress?optCompress.checked:false, stream: optStream?optStream.checked:false, jobs: optJobs?jobsValue():1, cache: optCache?optCache.checked:true, payload_blocks: optPayloadBlocks?optPayloadBlocks.checked:false, dedupe: optDedupe?optDedupe.checked:true, fetch_paths: optFetchPaths?optFetchPaths.checked:false, inlined: optInlined?optInlined.value:'auto', compress_preset: optCompressPreset?optCompressPreset.value:'max', solid: optSolid?optSolid.checked:false, worker_decode: optWorkerDecode?optWorkerDecode.checked:false, asset_cache: optAssetCache?optAssetCache.checked:false };
   if(loaderSelect && loaderSelect.value) settingsObj.selected_loader = loaderSelect.value;
   const form = new FormData(); files.forEach(f=>form.append('files', f, f.webkitRelativePath||f.name)); form.append('settings', JSON.stringify(settingsObj));
       if(buildBtn) buildBtn.disabled=true; if(dirInput) dirInput.disabled=true; if(clearBtn) clearBtn.disabled=true; if(spinnerSmall) spinnerSmall.textContent='⏳';
 
       try{
-        // first, upload via XHR to start the server-side build which will populate LAST_BUILD['queue'] on the server
+        // first, upload via XHR; the server queues a build job and answers with its id and URLs
         const urls = candidatePaths('/build');
         const xhr = new XMLHttpRequest();
         xhr.open('POST', urls[0], true);
@@ -64,9 +78,10 @@
 
         xhr.onload = function(){
           if(xhr.status < 200 || xhr.status >= 300){ if(logArea) logArea.textContent += '\nUpload failed: ' + xhr.statusText; buildFinishedCleanup(); return; }
-          // upload succeeded; now open the streaming connection to receive logs
-          setStatus('Building'); if(logArea) logArea.textContent += '\nUpload complete. Connecting to build stream...\n';
-          openBuildStream();
+          // upload succeeded; now open the streaming connection to this build's logs
+          let job = {}; try{ job = JSON.parse(xhr.responseText) || {}; }catch(e){}
+          setStatus(job.status === 'queued' ? 'Queued' : 'Building'); if(logArea) logArea.textContent += '\nUpload complete.' + (job.queue_position ? ' Queued at position ' + job.queue_position + '.' : '') + ' Connecting to build stream...\n';
+          openBuildStream(job);
         };
         xhr.onerror = function(){ if(logArea) logArea.textContent += '\nUpload failed (network)'; buildFinishedCleanup(); };
         xhr.send(form);
@@ -74,20 +89,47 @@
       }catch(err){ if(logArea) logArea.textContent += '\nERROR: '+err.message; buildFinishedCleanup(); }
     }
 
-    async function openBuildStream(){
-      try{
-        const r = await fetchWithFallback('/build/stream');
-        if(!r.ok) throw new Error('Stream not available: ' + r.status);
-        setStatus('Streaming');
-        const reader = r.body.getReader(); const dec = new TextDecoder(); let acc=''; const start = Date.now(); let lastPct = 10;
-        while(true){ const {value, done} = await reader.read(); if(done) break; if(value){ const text = dec.decode(value, {stream:true}); acc += text; if(logArea){ logArea.textContent = acc; logArea.scrollTop = logArea.scrollHeight; }
-            const re = /\[(\d{1,3})%\]/g; let m; while((m=re.exec(text))){ const pct = Math.max(0, Math.min(100, Number(m[1]))); if(progressBar) progressBar.style.width = pct + '%'; if(progressPct) progressPct.textContent = pct + '%'; const now = Date.now(); if(pct>0 && pct>lastPct){ const elapsed = (now-start)/1000; const estTotal = elapsed*(100/pct); const remain = Math.max(0, estTotal - elapsed); const mins = Math.floor(remain/60); const secs = Math.floor(remain%60).toString().padStart(2,'0'); if(etaLabel) etaLabel.textContent = `ETA: ${mins}:${secs}`; lastPct = pct; } }
-          }
+    function showProgress(pct, eta){ if(progressBar) progressBar.style.width = pct + '%'; if(progressPct) progressPct.textContent = pct + '%'; if(etaLabel && eta != null){ const mins = Math.floor(eta/60); const secs = Math.floor(eta%60).toString().padStart(2,'0'); etaLabel.textContent = `ETA: ${mins}:${secs}`; } }
+    function appendLog(line){ if(logArea){ logArea.textContent += line + '\n'; logArea.scrollTop = logArea.scrollHeight; } }
+
+    // typed build events over Server-Sent Events: log lines, queue position, phases, per-asset progress with ETA
+    async function followBuildEvents(job){
+      const eventsUrl = await resolveWithFallback(job.events_url);
+      return new Promise(resolve => {
+        const es = new EventSource(eventsUrl);
+        const on = (type, fn) => es.addEventListener(type, ev => { try{ fn(JSON.parse(ev.data)); }catch(e){ console.warn('bad build event', type, e); } });
+        on('log', d => appendLog(d.line));
+        on('gap', d => appendLog(`... ${d.missed} earlier events not shown ...`));
+        on('queue', d => setStatus(d.position ? 'Queued (#' + d.position + ')' : 'Building'));
+        on('phase', d => { if(d.state === 'start') setStatus(PHASE_LABELS[d.name] || 'Building'); if(d.name === 'embed' && d.state === 'start') showProgress(50); });
+        on('asset', d => showProgress(d.percent, d.eta));
+        on('done', d => { es.close(); if(d.state === 'done') showProgress(100, 0); resolve(d); });
+        // EventSource reconnects by itself (resuming from the last event id); give up only when it stops trying
+        es.onerror = () => { if(es.readyState === EventSource.CLOSED) resolve(null); };
+      });
+    }
+    const PHASE_LABELS = { read: 'Reading files', rewrite: 'Rewriting index.html', embed: 'Embedding', verify: 'Verifying', precompress: 'Compressing download' };
+
+    // plain-text log stream (servers without the events endpoint)
+    async function followBuildText(job){
+      const r = await fetchWithFallback(job.stream_url || '/build/stream');
+      if(!r.ok) throw new Error('Stream not available: ' + r.status);
+      setStatus('Streaming');
+      const reader = r.body.getReader(); const dec = new TextDecoder(); let acc=''; const start = Date.now(); let lastPct = 10;
+      while(true){ const {value, done} = await reader.read(); if(done) break; if(value){ const text = dec.decode(value, {stream:true}); acc += text; if(logArea){ logArea.textContent = acc; logArea.scrollTop = logArea.scrollHeight; }
+          const re = /\[(\d{1,3})%\]/g; let m; while((m=re.exec(text))){ const pct = Math.max(0, Math.min(100, Number(m[1]))); const now = Date.now(); let eta = null; if(pct>0 && pct>lastPct){ const elapsed = (now-start)/1000; eta = Math.max(0, elapsed*(100/pct) - elapsed); lastPct = pct; } showProgress(pct, eta); }
         }
+      }
+    }
 
-        // after stream ends, fetch result metadata
-        try{ const r2 = await fetchWithFallback('/build/result'); if(r2.ok){ const info = await r2.json(); if(info.log_url && downloadLog){ downloadLog.href = info.log_url; downloadLog.style.display='inline'; } if(info.build_url && downloadBuild){ downloadBuild.href = info.build_url; downloadBuild.style.display='inline'; downloadBuild.download = info.build_name || 'artifact'; downloadBuild.textContent = 'Download: '+(info.build_name||'artifact'); if(artifactNameEl) artifactNameEl.textContent = info.build_name||'artifact'; try{ /* replaced direct fetch with fallback to avoid 404 when server uses namespaced paths */ fetchWithFallback(info.build_url,{method:'HEAD'}).then(h=>{ if(h && h.ok){ try{ const s = h.headers.get('content-length'); if(s && artifactSizeEl) artifactSizeEl.textContent = (Number(s)>1024? (Number(s)/1024).toFixed(1)+' KB' : Number(s)+' B'); }catch(e){} try{ if(downloadBuild) downloadBuild.href = h.url; }catch(e){} } }).catch(()=>{}); }catch(e){} } } }catch(e){ console.warn('result metadata fetch failed', e); }
+    async function openBuildStream(job){
+      job = job || {};
+      try{
+        if(job.events_url && typeof EventSource === 'function') await followBuildEvents(job);
+        else await followBuildText(job);
 
+        // after stream ends, fetch result metadata
+        try{ const r2 = await fetchWithFallback(job.result_url || '/build/result'); if(r2.ok){ const info = await r2.json(); if(info.log_url && downloadLog){ downloadLog.href = info.log_url; downloadLog.style.display='inline'; } if(info.build_url && downloadBuild){ downloadBuild.href = info.build_url; downloadBuild.style.display='inline'; downloadBuild.download = info.build_name || 'artifact'; downloadBuild.textContent = 'Download: '+(info.build_name||'artifact'); if(artifactNameEl) artifactNameEl.textContent = info.build_name||'artifact'; try{ /* replaced direct fetch with fallback to avoid 404 when server uses namespaced paths */ fetchWithFallback(info.build_url,{method:'HEAD'}).then(h=>{ if(h && h.ok){ try{ /* content-length is the compressed transfer size; prefer the document size */ const s = info.build_size || h.headers.get('content-length'); if(s && artifactSizeEl) artifactSizeEl.textContent = (Number(s)>1024? (Number(s)/1024).toFixed(1)+' KB' : Number(s)+' B'); }catch(e){} try{ if(downloadBuild) downloadBuild.href = h.url; }catch(e){} } }).catch(()=>{}); }catch(e){} } } }catch(e){ console.warn('result metadata fetch failed', e); }
       }catch(err){ if(logArea) logArea.textContent += '\nStream error: '+err.message; }
       finally{ buildFinishedCleanup(); }
     }
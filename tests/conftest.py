@@ -0,0 +1,35 @@
+import io
+import json
+import shutil
+
+import pytest
+
+from project import FILES
+
+
+@pytest.fixture
+def app():
+    """The web UI app; job directories are removed afterwards."""
+    server = pytest.importorskip('everbuilder.server')
+    pytest.importorskip('flask')
+    app = server.create_app()
+    yield app
+    for job in app.extensions['everbuilder']._jobs.values():
+        shutil.rmtree(job.tempdir, ignore_errors=True)
+
+
+@pytest.fixture
+def submit():
+    """submit(client, settings) uploads the test project and waits for its build."""
+    def submit(client, settings=None):
+        data = {
+            'files': [(io.BytesIO(content), name) for name, content in FILES.items()],
+            'settings': json.dumps(settings or {}),
+        }
+        resp = client.post('/build', data=data, content_type='multipart/form-data')
+        assert resp.status_code == 200
+        job = resp.get_json()
+        # the plain-text stream ends once the build is done
+        assert client.get(job['stream_url']).get_data(as_text=True).endswith('READY\n')
+        return job
+    return submit
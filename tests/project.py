@@ -0,0 +1,62 @@
+"""A small Unity-like project shared by the build tests, and helpers to read the output."""
+import base64
+import json
+
+INDEX = """<!DOCTYPE html>
+<html lang="en-us">
+  <head>
+    <meta charset="utf-8">
+    <link rel="stylesheet" href="TemplateData/style.css">
+  </head>
+  <body>
+    <img src="TemplateData/logo.png">
+    <script>
+      var buildUrl = "Build";
+      var loaderUrl = buildUrl + "/game.loader.js";
+      var config = {
+        dataUrl: buildUrl + "/game.data",
+        frameworkUrl: buildUrl + "/game.framework.js",
+        codeUrl: buildUrl + "/game.wasm",
+      };
+    </script>
+  </body>
+</html>
+"""
+
+FILES = {
+    'index.html': INDEX.encode(),
+    'Build/game.loader.js': b'function createUnityInstance() { return 1; }\n' * 20,
+    'Build/game.framework.js': b'var unityFramework = function () { return 2; };\n' * 200,
+    'Build/game.data': bytes(range(256)) * 64,
+    'Build/game.wasm': b'\x00asm\x01\x00\x00\x00' + bytes(4096),
+    'TemplateData/style.css': b'body { background: #231F20; }\n',
+    'TemplateData/logo.png': b'\x89PNG\r\n\x1a\n' + bytes(64),
+    # same content under another path; stored once with dedupe
+    'Build/logo-copy.png': b'\x89PNG\r\n\x1a\n' + bytes(64),
+}
+
+
+def write_project(root, files=FILES):
+    for name, content in files.items():
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+    return root
+
+
+def embedded_files(html):
+    """The EMBEDDED_FILES object of a built page (not payload-block builds)."""
+    start = html.index('EMBEDDED_FILES = ') + len('EMBEDDED_FILES = ')
+    return json.JSONDecoder().raw_decode(html, start)[0]
+
+
+def entry_bytes(files, key):
+    """Decode an entry the way the runtime does without DecompressionStream, or None."""
+    entry = files.get(key)
+    if isinstance(entry, dict) and entry.get('ref'):
+        entry = files.get(entry['ref'])
+    if isinstance(entry, str):
+        return base64.b64decode(entry)
+    if isinstance(entry, dict) and 'b64' in entry and not entry.get('encoding'):
+        return base64.b64decode(entry['b64'])
+    return None
@@ -0,0 +1,202 @@
+// Runs the runtime scripts of a built page in node and fetches URLs through
+// the patched window.fetch.
+//
+// usage: node runtime.js offline.html < request.json
+// request: { urls: [...], decompressionStream: true, fromBase64: false,
+//            worker: false, brokenWorker: false, indexedDB: null }
+// prints: { responses: { url: { status, encoding, body (base64, decoded) } },
+//           passedThrough: [urls the patch handed to the network],
+//           fromBase64Calls: n, workerMessages: n, workerErrors: n, cacheHits: n,
+//           cachedKeys: [keys of the asset cache after the run],
+//           stats: window.__EVERBUILDER_STATS__, measures: [{ name, detail }] }
+'use strict';
+const fs = require('fs');
+const vm = require('vm');
+const zlib = require('zlib');
+
+const html = fs.readFileSync(process.argv[2], 'utf8');
+const request = JSON.parse(fs.readFileSync(0, 'utf8'));
+
+// inline runtime scripts run in order; payload blocks are looked up by id
+const scripts = [];
+const blocks = {};
+const scriptRe = /<script\b([^>]*)>([\s\S]*?)<\/script>/gi;
+let m;
+while ((m = scriptRe.exec(html))) {
+  const attrs = {};
+  m[1].replace(/([\w-]+)="([^"]*)"/g, (_, k, v) => { attrs[k] = v; });
+  if (attrs.type === 'application/octet-stream' || attrs.type === 'application/json') {
+    if (attrs.id) blocks[attrs.id] = { text: m[2], attrs };
+  } else if (!('src' in attrs) && m[2].includes('EMBEDDED_FILES')) {
+    scripts.push(m[2]);
+  }
+}
+
+const element = (block) => ({
+  textContent: block.text,
+  getAttribute: (k) => (k in block.attrs ? block.attrs[k] : null),
+});
+
+// node's DecompressionStream has no brotli; stand in with zlib
+function DecompressionStream(format) {
+  if (format !== 'br') return new globalThis.DecompressionStream(format);
+  const chunks = [];
+  return new TransformStream({
+    transform(chunk) { chunks.push(Buffer.from(chunk)); },
+    flush(controller) { controller.enqueue(new Uint8Array(zlib.brotliDecompressSync(Buffer.concat(chunks)))); },
+  });
+}
+
+// Uint8Array.fromBase64 is not in node 20; provide it on request and count its uses
+let fromBase64Calls = 0;
+if (request.fromBase64) {
+  Uint8Array.fromBase64 = (s) => { fromBase64Calls++; return new Uint8Array(Buffer.from(s, 'base64')); };
+}
+
+// Worker on top of worker_threads; a broken worker answers every job with an error
+let workerMessages = 0, workerErrors = 0;
+class Worker {
+  constructor(url) {
+    this.queue = [];
+    this.thread = null;
+    this.onmessage = this.onerror = null;
+    const { Worker: Thread } = require('worker_threads');
+    const { resolveObjectURL } = require('buffer');
+    const prelude = `const { parentPort } = require('worker_threads');
+      globalThis.self = globalThis;
+      self.postMessage = ${request.brokenWorker
+        ? "(m) => parentPort.postMessage({ id: m.id, error: 'broken' })"
+        : '(m, transfer) => parentPort.postMessage(m, transfer)'};
+      parentPort.on('message', (data) => self.onmessage({ data }));\n`;
+    resolveObjectURL(url).text().then((code) => {
+      this.thread = new Thread(prelude + code, { eval: true });
+      this.thread.on('message', (data) => { workerMessages++; if (data.error) workerErrors++; if (this.onmessage) this.onmessage({ data }); });
+      this.thread.on('error', (e) => { if (this.onerror) this.onerror(e); });
+      this.thread.unref();
+      for (const m of this.queue) this.thread.postMessage(m);
+    });
+  }
+  postMessage(m) { if (this.thread) this.thread.postMessage(m); else this.queue.push(m); }
+}
+
+// IndexedDB with just what the asset cache uses, kept in the JSON file named
+// by request.indexedDB so a later run sees what an earlier one stored
+class FakeIndexedDB {
+  constructor(file) {
+    this.file = file;
+    this.pending = 0;
+    this.data = fs.existsSync(file) ? JSON.parse(fs.readFileSync(file, 'utf8')) : {};
+  }
+  static dump(value) {
+    return typeof value === 'string' ? { string: value } : { buffer: Buffer.from(value).toString('base64') };
+  }
+  static load(value) {
+    return 'string' in value ? value.string : new Uint8Array(Buffer.from(value.buffer, 'base64')).buffer;
+  }
+  request(fn) {
+    const req = { result: undefined, error: null, onsuccess: null, onerror: null };
+    this.pending++;
+    setImmediate(() => {
+      this.pending--;
+      req.result = fn();
+      if (req.onsuccess) req.onsuccess();
+    });
+    return req;
+  }
+  open(name) {
+    const req = { onupgradeneeded: null, onsuccess: null, onerror: null, onblocked: null };
+    setImmediate(() => {
+      const isNew = !(name in this.data);
+      const stores = this.data[name] || (this.data[name] = {});
+      req.result = {
+        createObjectStore: (store) => { stores[store] = {}; },
+        transaction: (names) => this.transaction(stores, [].concat(names)),
+      };
+      if (isNew && req.onupgradeneeded) req.onupgradeneeded();
+      req.onsuccess();
+    });
+    return req;
+  }
+  transaction(stores, names) {
+    const tx = { oncomplete: null, onerror: null, onabort: null };
+    tx.objectStore = (name) => {
+      const store = stores[name];
+      return {
+        get: (k) => this.request(() => (k in store ? FakeIndexedDB.load(store[k]) : undefined)),
+        put: (v, k) => this.request(() => { store[k] = FakeIndexedDB.dump(v); }),
+        delete: (k) => this.request(() => { delete store[k]; }),
+        getAllKeys: () => this.request(() => Object.keys(store)),
+      };
+    };
+    // commits once no request is left, like an IndexedDB transaction
+    const settle = () => setImmediate(() => {
+      if (this.pending) settle();
+      else if (tx.oncomplete) tx.oncomplete();
+    });
+    settle();
+    return tx;
+  }
+  async idle() {
+    do await new Promise((r) => setTimeout(r, 10)); while (this.pending);
+  }
+  save() {
+    fs.writeFileSync(this.file, JSON.stringify(this.data));
+  }
+}
+const indexedDB = request.indexedDB ? new FakeIndexedDB(request.indexedDB) : undefined;
+
+const passedThrough = [];
+const sandbox = {
+  console: { debug() {}, log() {}, info() {}, warn: console.error, error: console.error },
+  atob, btoa, setTimeout, clearTimeout, performance, URL,
+  Blob, Response, ReadableStream, TransformStream, MessageChannel, TextDecoder, TextEncoder,
+  Uint8Array, ArrayBuffer, Map, Set, Promise, Object, String, JSON, Math, Date, Error,
+  DecompressionStream: request.decompressionStream === false ? undefined : DecompressionStream,
+  Worker: request.worker || request.brokenWorker ? Worker : undefined,
+  indexedDB,
+  document: {
+    readyState: 'complete',
+    addEventListener() {},
+    querySelectorAll() { return []; },
+    getElementById(id) { return id in blocks ? element(blocks[id]) : null; },
+  },
+  location: { href: 'file:///game/offline.html', pathname: '/game/offline.html' },
+  navigator: {},
+  WebAssembly: {},
+  fetch: async (url) => { passedThrough.push(String(url)); return new Response('not found', { status: 404 }); },
+};
+sandbox.window = sandbox.self = sandbox.globalThis = sandbox;
+vm.createContext(sandbox);
+for (const s of scripts) vm.runInContext(s, sandbox);
+
+function decodeBody(buf, encoding) {
+  if (encoding === 'br') return zlib.brotliDecompressSync(buf);
+  if (encoding === 'gzip') return zlib.gunzipSync(buf);
+  return buf;
+}
+
+(async () => {
+  const responses = {};
+  for (const url of request.urls) {
+    const resp = await sandbox.window.fetch(url);
+    const encoding = resp.headers.get('Content-Encoding');
+    const body = decodeBody(Buffer.from(await resp.arrayBuffer()), encoding);
+    responses[url] = { status: resp.status, encoding, body: body.toString('base64') };
+  }
+  let cachedKeys = [];
+  if (indexedDB) {
+    await indexedDB.idle();
+    indexedDB.save();
+    cachedKeys = Object.keys(Object.values(indexedDB.data)[0].assets).sort();
+  }
+  const stats = sandbox.__EVERBUILDER_STATS__;
+  const measures = performance.getEntriesByType('measure')
+    .filter((e) => e.name.startsWith('everbuilder:'))
+    .map((e) => ({ name: e.name, detail: e.detail }));
+  const result = {
+    responses, passedThrough, fromBase64Calls, workerMessages, workerErrors,
+    cacheHits: stats.cacheHits, cachedKeys, stats, measures,
+  };
+  // the runtime's MessageChannel would keep node alive
+  process.stdout.write(JSON.stringify(result), () => process.exit(0));
+})().catch((e) => { console.error(e); process.exit(1); });
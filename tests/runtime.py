@@ -0,0 +1,25 @@
+"""Run the runtime of a built page in node (see runtime.js)."""
+import base64
+import json
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+NODE = shutil.which('node')
+HARNESS = Path(__file__).resolve().with_name('runtime.js')
+
+needs_node = pytest.mark.skipif(NODE is None, reason='node is not installed')
+
+
+def run_page(html_path, urls, **options):
+    """Fetch `urls` through the page's fetch patch; bodies come back decoded."""
+    request = json.dumps(dict(options, urls=list(urls)))
+    proc = subprocess.run([NODE, str(HARNESS), str(html_path)], input=request,
+                          capture_output=True, text=True, timeout=120)
+    assert proc.returncode == 0, proc.stderr
+    result = json.loads(proc.stdout)
+    for response in result['responses'].values():
+        response['body'] = base64.b64decode(response['body'])
+    return result
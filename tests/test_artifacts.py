@@ -0,0 +1,60 @@
+import gzip
+import os
+import random
+
+import pytest
+
+from everbuilder.builder import get_brotli, precompress_artifact
+
+
+def test_precompressed_copies_decode_to_the_document(tmp_path):
+    path = tmp_path / 'offline.html'
+    path.write_bytes(b'<p>EMBEDDED_FILES</p>\n' * 1000)
+    variants = precompress_artifact(str(path))
+    assert gzip.decompress((tmp_path / 'offline.html.gz').read_bytes()) == path.read_bytes()
+    assert variants['gzip'] == str(path) + '.gz'
+    brotli = get_brotli()
+    if brotli:
+        assert brotli.decompress((tmp_path / 'offline.html.br').read_bytes()) == path.read_bytes()
+        assert variants['br'] == str(path) + '.br'
+
+
+def test_copies_that_are_not_smaller_are_removed(tmp_path):
+    path = tmp_path / 'offline.html'
+    path.write_bytes(random.Random(0).randbytes(4096))
+    assert precompress_artifact(str(path)) == {}
+    assert os.listdir(tmp_path) == ['offline.html']
+
+
+def test_artifact_etag_and_range(app, submit):
+    client = app.test_client()
+    job = submit(client)
+    full = client.get(job['artifact_url'])
+    assert full.status_code == 200
+    etag = full.headers['ETag']
+    assert full.headers['Cache-Control'] == 'no-cache'
+
+    assert client.get(job['artifact_url'], headers={'If-None-Match': etag}).status_code == 304
+
+    part = client.get(job['artifact_url'], headers={'Range': 'bytes=100-199'})
+    assert part.status_code == 206
+    assert part.data == full.data[100:200]
+    assert part.headers['Content-Range'] == f'bytes 100-199/{len(full.data)}'
+
+
+@pytest.mark.parametrize('accept, encoding', [('gzip', 'gzip'), ('br, gzip', 'br'), ('identity', None)])
+def test_artifact_prefers_compressed_copy(app, submit, accept, encoding):
+    if encoding == 'br' and get_brotli() is None:
+        encoding = 'gzip'
+    client = app.test_client()
+    job = submit(client)
+    identity = client.get(job['artifact_url']).data
+    resp = client.get(job['artifact_url'], headers={'Accept-Encoding': accept})
+    assert resp.headers.get('Content-Encoding') == encoding
+    assert 'Accept-Encoding' in resp.headers['Vary']
+    if encoding == 'gzip':
+        assert gzip.decompress(resp.data) == identity
+    elif encoding == 'br':
+        assert get_brotli().decompress(resp.data) == identity
+    else:
+        assert resp.data == identity
@@ -0,0 +1,59 @@
+import hashlib
+import json
+import re
+
+from everbuilder.builder import asset_cache_options, build
+
+from project import FILES, write_project
+from runtime import needs_node, run_page
+
+URLS = ['Build/game.data', 'Build/game.wasm', 'Build/game.framework.js']
+
+
+def runtime_options(html):
+    return json.loads(re.search(r'const RUNTIME_OPTIONS = (.*);', html).group(1))
+
+
+def build_page(tmp_path, files=FILES, **options):
+    write_project(tmp_path, files)
+    out = tmp_path / 'offline.html'
+    build(list(files), {}, str(out), root=str(tmp_path), fetch_paths=True, **options)
+    return out
+
+
+def test_page_carries_a_content_hash_per_asset(tmp_path):
+    options = runtime_options(build_page(tmp_path, asset_cache=True).read_text(encoding='utf-8'))
+    hashes = options['assetCache']['hashes']
+    assert hashes['Build/game.data'] == hashlib.sha256(FILES['Build/game.data']).hexdigest()
+    assert hashes['Build/logo-copy.png'] == hashes['TemplateData/logo.png']
+    assert options['assetCache'] == asset_cache_options(hashes)
+    assert 'assetCache' not in runtime_options(build_page(tmp_path).read_text(encoding='utf-8'))
+
+
+def test_build_hash_changes_with_any_asset():
+    hashes = {'a': '1', 'b': '2'}
+    assert asset_cache_options(hashes)['build'] == asset_cache_options(dict(hashes))['build']
+    assert asset_cache_options(hashes)['build'] != asset_cache_options(dict(hashes, b='3'))['build']
+
+
+@needs_node
+def test_second_visit_is_served_from_the_cache(tmp_path):
+    db = str(tmp_path / 'indexeddb.json')
+    page = build_page(tmp_path, asset_cache=True, compress=True)
+    first = run_page(page, URLS, indexedDB=db)
+    assert first['cacheHits'] == 0
+    second = run_page(page, URLS, indexedDB=db)
+    assert second['cacheHits'] == len(URLS)
+    for url in URLS:
+        assert second['responses'][url]['body'] == FILES[url]
+
+
+@needs_node
+def test_rebuild_keeps_unchanged_assets_and_evicts_the_rest(tmp_path):
+    db = str(tmp_path / 'indexeddb.json')
+    run_page(build_page(tmp_path, asset_cache=True), URLS, indexedDB=db)
+    files = dict(FILES, **{'Build/game.data': bytes(4096)})
+    result = run_page(build_page(tmp_path, files, asset_cache=True), URLS, indexedDB=db)
+    assert result['cacheHits'] == len(URLS) - 1
+    assert result['responses']['Build/game.data']['body'] == files['Build/game.data']
+    assert result['cachedKeys'] == sorted(hashlib.sha256(files[url]).hexdigest() for url in URLS)
@@ -0,0 +1,54 @@
+import hashlib
+import importlib.util
+import json
+from pathlib import Path
+
+import pytest
+
+TOOLS = Path(__file__).resolve().parent.parent / 'tools'
+
+
+@pytest.fixture(scope='module')
+def benchmark():
+    spec = importlib.util.spec_from_file_location('benchmark', TOOLS / 'benchmark.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def digest(files):
+    h = hashlib.sha256()
+    for path, content in files:
+        h.update(path.encode() + b'\0' + content)
+    return h.hexdigest()
+
+
+def test_generated_project_depends_only_on_the_seed(benchmark):
+    assert digest(benchmark.project_files('small', 1)) == digest(benchmark.project_files('small', 1))
+    assert digest(benchmark.project_files('small', 1)) != digest(benchmark.project_files('small', 2))
+
+
+def test_case_names_cover_every_flag_combination(benchmark):
+    names = benchmark.case_names()
+    assert len(names) == 2 ** len(benchmark.FLAGS)
+    assert names[0] == 'plain'
+    assert benchmark.case_flags('compress+solid') == {'compress': True, 'embed_css': False, 'loader': False, 'solid': True}
+
+
+@pytest.mark.parametrize('case', ['plain', 'loader+solid'])
+def test_committed_sizes_are_reproduced(benchmark, tmp_path, case):
+    sizes = json.loads((TOOLS / 'benchmark-sizes-small.json').read_text())
+    assert benchmark.generate_project(str(tmp_path), sizes['scale'], sizes['seed']) == sizes['project']
+    assert benchmark.run_one(str(tmp_path), case, 1)['output_bytes'] == sizes['cases'][case]['output_bytes']
+
+
+def test_sizes_only_baseline_compares_sizes(benchmark, capsys):
+    results = {'scale': 'small', 'seed': 1, 'jobs': 2, 'project': {'files': 1, 'bytes': 100},
+               'environment': {'brotli': True},
+               'cases': {'plain': {'wall': 1.0, 'peak_rss': 10, 'output_bytes': 200}}}
+    sizes = benchmark.size_figures(results)
+    assert sizes['cases'] == {'plain': {'output_bytes': 200, 'ratio': 2.0}}
+    assert benchmark.compare(results, sizes, 10) == []
+    results['cases']['plain']['output_bytes'] = 210
+    assert [r[:2] for r in benchmark.compare(results, sizes, 10)] == [('plain', 'output_bytes')]
+    assert 'not comparable' not in capsys.readouterr().out
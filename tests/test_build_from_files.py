@@ -0,0 +1,65 @@
+import io
+import mmap
+import tempfile
+
+from everbuilder import builder
+from everbuilder.builder import build_from_files, memory_file_map
+
+from project import FILES
+
+
+def test_build_from_files_into_bytesio():
+    out = io.BytesIO()
+    report = build_from_files(dict(FILES), out, {})
+    assert report is not None
+    html = out.getvalue().decode('utf-8')
+    assert '<html lang="en-us">' in html
+    assert set(report.embedded_keys) <= set(FILES)
+    assert 'Build/game.data' in report.embedded_keys
+    # the stream is left open for the caller
+    assert not out.closed
+
+
+def test_build_from_files_accepts_file_objects():
+    expected = io.BytesIO()
+    build_from_files(dict(FILES), expected, {})
+    files = {name: io.BytesIO(content) for name, content in FILES.items()}
+    out = io.BytesIO()
+    build_from_files(files, out, {})
+    assert out.getvalue() == expected.getvalue()
+
+
+def test_build_from_files_without_index_html_is_aborted():
+    files = {name: content for name, content in FILES.items() if name != 'index.html'}
+    assert build_from_files(files, io.BytesIO(), {}) is None
+
+
+def spooled(content, max_size):
+    f = tempfile.SpooledTemporaryFile(max_size=max_size)
+    f.write(content)
+    f.seek(0)
+    return f
+
+
+def test_spooled_uploads_on_disk_are_memory_mapped(monkeypatch):
+    monkeypatch.setattr(builder, 'MMAP_THRESHOLD', 1024)
+    small = spooled(FILES['TemplateData/logo.png'], 1024 * 1024)
+    large = spooled(FILES['Build/game.data'], 16)
+    m = memory_file_map({'TemplateData/logo.png': small, 'Build/game.data': large})
+    assert isinstance(m['Build/game.data'], memoryview)
+    assert isinstance(m['Build/game.data'].obj, mmap.mmap)
+    assert m['Build/game.data'] == FILES['Build/game.data']
+    assert m['TemplateData/logo.png'] == FILES['TemplateData/logo.png']
+    # the views must go before the files can close
+    del m
+    small.close()
+    large.close()
+
+
+def test_build_from_spooled_files(monkeypatch):
+    monkeypatch.setattr(builder, 'MMAP_THRESHOLD', 1024)
+    expected = io.BytesIO()
+    build_from_files(dict(FILES), expected, {})
+    out = io.BytesIO()
+    build_from_files({name: spooled(content, 256) for name, content in FILES.items()}, out, {})
+    assert out.getvalue() == expected.getvalue()
@@ -0,0 +1,58 @@
+import io
+import os
+import time
+
+import pytest
+
+from everbuilder.builder import CompressionCache, build_from_files, get_brotli, to_b64
+
+from project import FILES
+
+
+def test_entries_round_trip(tmp_path):
+    cache = CompressionCache(tmp_path, store_b64=True)
+    key = CompressionCache.make_key(b'content', 'br', 11)
+    assert cache.get_b64(key) is None
+    cache.put(key, b'compressed')
+    assert cache.get_b64(key) == to_b64(b'compressed')
+    # a fresh instance (another process, a later build) finds it on disk
+    assert CompressionCache(tmp_path).get_b64(key) == to_b64(b'compressed')
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = CompressionCache(tmp_path, max_bytes=250)
+    keys = [CompressionCache.make_key(bytes([i]), 'br', 11) for i in range(3)]
+    for key in keys[:2]:
+        cache.put(key, bytes(100))
+    # reading the first entry makes the second the least recently used
+    assert cache.get_b64(keys[0]) is not None
+    cache.put(keys[2], bytes(100))
+    assert cache.get_b64(keys[1]) is None
+    assert cache.get_b64(keys[0]) is not None
+    assert cache.get_b64(keys[2]) is not None
+
+
+def test_eviction_order_survives_a_restart(tmp_path):
+    cache = CompressionCache(tmp_path)
+    keys = [CompressionCache.make_key(bytes([i]), 'br', 11) for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.put(key, bytes(100))
+        path = tmp_path / key[:2] / (key + '.bin')
+        os.utime(path, (time.time() - 100 + i, time.time() - 100 + i))
+    CompressionCache(tmp_path, max_bytes=250).get_b64(keys[2])
+    assert not (tmp_path / keys[0][:2] / (keys[0] + '.bin')).exists()
+    assert (tmp_path / keys[2][:2] / (keys[2] + '.bin')).exists()
+
+
+@pytest.mark.skipif(get_brotli() is None, reason='brotli is not installed')
+def test_warm_build_is_served_from_the_cache(tmp_path):
+    cache = CompressionCache(tmp_path / 'cache')
+    outputs, reports = [], []
+    for _ in range(2):
+        out = io.BytesIO()
+        reports.append(build_from_files(dict(FILES), out, {}, compress=True, cache=cache, fetch_paths=True))
+        outputs.append(out.getvalue())
+    assert reports[0].cache['hits'] == 0 and reports[0].cache['misses'] > 0
+    assert reports[1].cache['hits'] == reports[0].cache['misses']
+    assert reports[1].cache['misses'] == 0
+    assert outputs[0] == outputs[1]
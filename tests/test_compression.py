@@ -0,0 +1,47 @@
+import gzip
+import io
+import random
+
+import pytest
+
+from everbuilder.builder import CompressionCache, build_from_files, encode_embedded_entry, get_brotli
+
+from project import FILES, embedded_files, entry_bytes
+
+pytestmark = pytest.mark.skipif(get_brotli() is None, reason='brotli is not installed')
+
+# brotli cannot make this smaller
+NOISE = random.Random(0).randbytes(32 * 1024)
+
+
+def test_policy_stores_compressed_formats_as_is():
+    assert isinstance(encode_embedded_entry('TemplateData/logo.png', bytes(4096), 'max'), str)
+    assert encode_embedded_entry('Build/game.data', bytes(4096), 'max')['encoding'] == 'br'
+
+
+def test_policy_passes_precompressed_inputs_through():
+    raw = b'var unityFramework = 1;\n' * 100
+    entry = encode_embedded_entry('Build/game.framework.js.gz', gzip.compress(raw), 'max')
+    assert entry['encoding'] == 'gzip'
+    assert entry['mime'] == 'text/javascript'
+
+
+def test_incompressible_asset_is_kept_raw():
+    assert isinstance(encode_embedded_entry('Build/game.data', NOISE, 'max'), str)
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_cache_remembers_incompressible_assets(tmp_path, jobs):
+    files = dict(FILES, **{'Build/game.data': NOISE})
+    cache = CompressionCache(tmp_path / 'cache')
+    outputs = []
+    for _ in range(2):
+        out = io.BytesIO()
+        report = build_from_files(files, out, {}, compress=True, cache=cache, jobs=jobs, fetch_paths=True)
+        outputs.append(out.getvalue())
+    assert report.cache['misses'] == 0
+    assert report.assets['Build/game.data']['source'] == 'cache'
+    assert outputs[0] == outputs[1]
+    html = outputs[1].decode('utf-8')
+    assert isinstance(embedded_files(html)['Build/game.data'], str)
+    assert entry_bytes(embedded_files(html), 'Build/game.data') == NOISE
@@ -0,0 +1,68 @@
+import base64
+import io
+import json
+import re
+
+import pytest
+
+from everbuilder.builder import build_from_files
+
+from project import FILES, embedded_files, entry_bytes
+
+CONFIG_URLS = {
+    'loaderUrl': 'Build/game.loader.js',
+    'dataUrl': 'Build/game.data',
+    'frameworkUrl': 'Build/game.framework.js',
+    'codeUrl': 'Build/game.wasm',
+}
+
+
+def built(**options):
+    out = io.BytesIO()
+    build_from_files(dict(FILES), out, {}, **options)
+    return out.getvalue().decode('utf-8')
+
+
+def config_url(html, name):
+    m = re.search(rf'{name}\s*[:=]\s*(everbuilderAssetUrl\([^)]*\)|"[^"]*")', html)
+    assert m, name
+    return m.group(1).strip()
+
+
+def load_without_fetch(html, expr):
+    """What a browser gets for a config URL when the loader does not use fetch() (XHR, <script src>)."""
+    m = re.fullmatch(r'everbuilderAssetUrl\(("[^"]*"), "[^"]*"\)', expr)
+    if m:
+        # the runtime decodes these synchronously into a blob URL
+        return entry_bytes(embedded_files(html), json.loads(m.group(1)))
+    url = json.loads(expr)
+    if url.startswith('data:'):
+        return base64.b64decode(url.split(',', 1)[1])
+    # a relative path: nothing exists next to the offline page
+    return None
+
+
+@pytest.mark.parametrize('options', [{}, {'compress': True}, {'dedupe': False}, {'payload_blocks': False, 'solid': True}])
+def test_config_urls_load_without_fetch(options):
+    html = built(**options)
+    for name, key in CONFIG_URLS.items():
+        assert load_without_fetch(html, config_url(html, name)) == FILES[key], name
+
+
+def test_fetch_paths_keeps_fetched_data_compressed():
+    html = built(compress=True, fetch_paths=True)
+    assert config_url(html, 'dataUrl') == '"Build/game.data"'
+    assert config_url(html, 'codeUrl') == '"Build/game.wasm"'
+    files = embedded_files(html)
+    assert files['Build/game.data']['encoding'] == 'br'
+    # scripts still get a blob URL
+    assert load_without_fetch(html, config_url(html, 'frameworkUrl')) == FILES['Build/game.framework.js']
+
+
+def test_identical_files_are_embedded_once():
+    deduped, plain = built(), built(dedupe=False)
+    assert len(deduped) < len(plain)
+    files = embedded_files(deduped)
+    copies = [k for k in ('TemplateData/logo.png', 'Build/logo-copy.png') if isinstance(files[k], str) or 'ref' not in files[k]]
+    assert len(copies) == 1
+    assert entry_bytes(files, 'Build/logo-copy.png') == FILES['Build/logo-copy.png']
@@ -0,0 +1,70 @@
+import json
+import threading
+
+from everbuilder.server import EventBus
+
+
+def parse_events(text):
+    events = []
+    for block in text.split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if ': ' in line and not line.startswith(':'))
+        if 'event' in fields:
+            events.append((int(fields.get('id', 0)), fields['event'], json.loads(fields['data'])))
+    return events
+
+
+def test_every_subscriber_sees_every_event():
+    bus = EventBus()
+    for i in range(3):
+        bus.publish('log', {'line': i})
+    bus.close()
+    first = list(bus.subscribe())
+    assert [event[0] for event in first] == [1, 2, 3]
+    assert list(bus.subscribe()) == first
+    assert list(bus.subscribe(after=2)) == first[2:]
+
+
+def test_subscriber_behind_the_buffer_is_told_what_it_missed():
+    bus = EventBus(capacity=2)
+    for i in range(5):
+        bus.publish('log', {'line': i})
+    bus.close()
+    events = list(bus.subscribe(after=1))
+    assert events[0] == (None, 'gap', {'missed': 2})
+    assert [event[0] for event in events[1:]] == [4, 5]
+
+
+def test_subscriber_waits_for_new_events():
+    bus = EventBus()
+    seen = []
+    reader = threading.Thread(target=lambda: seen.extend(e for e in bus.subscribe(timeout=5) if e))
+    reader.start()
+    bus.publish('phase', {'name': 'read'})
+    bus.publish('done', {'state': 'done'})
+    bus.close()
+    reader.join(10)
+    assert [kind for _, kind, _ in seen] == ['phase', 'done']
+
+
+def test_idle_subscriber_gets_keep_alives():
+    bus = EventBus()
+    stream = bus.subscribe(timeout=0.01)
+    assert next(stream) is None
+    bus.publish('log', {'line': 'x'})
+    assert next(stream) == (1, 'log', {'line': 'x'})
+
+
+def test_events_replay_from_last_event_id(app, submit):
+    client = app.test_client()
+    job = submit(client)
+    events = parse_events(client.get(job['events_url']).get_data(as_text=True))
+    ids = [event_id for event_id, _, _ in events if event_id]
+    assert ids == sorted(ids) and ids[0] == 1
+    assert events[-1][1] == 'done'
+
+    after = ids[len(ids) // 2]
+    replay = parse_events(client.get(job['events_url'], headers={'Last-Event-ID': str(after)}).get_data(as_text=True))
+    assert replay == [event for event in events if event[0] > after]
+
+    # a client that has seen everything is told not to reconnect
+    assert client.get(job['events_url'], headers={'Last-Event-ID': str(ids[-1])}).status_code == 204
@@ -0,0 +1,42 @@
+import os
+
+import pytest
+
+from everbuilder.builder import build
+
+from project import FILES, write_project
+
+
+@pytest.fixture
+def project(tmp_path):
+    return write_project(tmp_path)
+
+
+def sources(report):
+    return {path: asset['source'] for path, asset in report.to_dict()['assets'].items()}
+
+
+@pytest.mark.parametrize('options', [{}, {'compress': True}, {'payload_blocks': True}])
+def test_incremental_rebuild_matches_full_stream_build(project, options):
+    files = list(FILES)
+    incremental_out = str(project / 'incremental.html')
+    full_out = str(project / 'full.html')
+
+    build(files, {}, incremental_out, incremental=True, root=str(project), **options)
+    assert os.path.exists(incremental_out + '.manifest.json')
+    (project / 'Build/game.framework.js').write_bytes(b'var unityFramework = 3;\n' * 150)
+    (project / 'TemplateData/style.css').write_bytes(b'body { background: #FFFFFF; }\n')
+    report = build(files, {}, incremental_out, incremental=True, root=str(project), **options)
+    assert sources(report)['Build/game.data'] == 'reused'
+    assert sources(report)['Build/game.framework.js'] == 'encoded'
+
+    build(files, {}, full_out, stream=True, root=str(project), **options)
+    with open(incremental_out, 'rb') as a, open(full_out, 'rb') as b:
+        assert a.read() == b.read()
+
+
+def test_changed_settings_rebuild_everything(project):
+    out = str(project / 'offline.html')
+    build(list(FILES), {}, out, incremental=True, root=str(project))
+    report = build(list(FILES), {}, out, incremental=True, root=str(project), payload_blocks=True)
+    assert 'reused' not in sources(report).values()
@@ -0,0 +1,33 @@
+import pytest
+
+from everbuilder.builder import build, find_inlined_references
+
+from project import FILES, embedded_files, write_project
+
+CSS = 'TemplateData/style.css'
+
+
+def embedded_keys(tmp_path, files=FILES, **options):
+    write_project(tmp_path, files)
+    out = tmp_path / 'offline.html'
+    build(list(files), {}, str(out), root=str(tmp_path), **options)
+    return set(embedded_files(out.read_text(encoding='utf-8')))
+
+
+@pytest.mark.parametrize('inlined, kept', [('auto', False), ('drop', False), ('keep', True)])
+def test_inlined_stylesheet_is_embedded_only_when_asked(tmp_path, inlined, kept):
+    assert (CSS in embedded_keys(tmp_path, inlined=inlined)) is kept
+
+
+def test_inlined_stylesheet_still_referenced_is_embedded(tmp_path):
+    files = dict(FILES, **{'Build/game.framework.js': b'fetch("TemplateData/style.css");\n'})
+    assert CSS in embedded_keys(tmp_path, files)
+    assert CSS not in embedded_keys(tmp_path, files, inlined='drop')
+
+
+def test_references_are_found_by_basename_outside_the_own_copy():
+    files = {'a.css': b'a {}', 'b.js': b'load("x/a.css")', 'c.png': b'a.css'}
+    found = find_inlined_references(files, {'a.css': ['<style>a {}</style>']}, '<html></html>')
+    assert found == {'a.css': 'b.js'}
+    found = find_inlined_references(files, {'a.css': ['<style>/* a.css */</style>']}, '<p>a.css</p>')
+    assert found == {'a.css': 'index.html'}
@@ -0,0 +1,14 @@
+import pytest
+
+from everbuilder.builder import build
+
+from project import FILES, write_project
+
+
+@pytest.mark.parametrize('jobs', [2, 0])
+@pytest.mark.parametrize('options', [{}, {'compress': True}, {'compress': True, 'stream': True}])
+def test_worker_processes_produce_the_same_output(tmp_path, options, jobs):
+    write_project(tmp_path)
+    build(list(FILES), {}, str(tmp_path / 'serial.html'), root=str(tmp_path), jobs=1, **options)
+    build(list(FILES), {}, str(tmp_path / 'parallel.html'), root=str(tmp_path), jobs=jobs, **options)
+    assert (tmp_path / 'parallel.html').read_bytes() == (tmp_path / 'serial.html').read_bytes()
@@ -0,0 +1,38 @@
+import pytest
+
+from everbuilder import builder
+from everbuilder.builder import LazyFileMap, file_bytes_map
+
+from project import FILES, write_project
+
+
+@pytest.fixture
+def small_threshold(monkeypatch):
+    monkeypatch.setattr(builder, 'MMAP_THRESHOLD', 1024)
+
+
+def test_lazy_map_reads_the_same_bytes(tmp_path, small_threshold):
+    write_project(tmp_path)
+    eager = file_bytes_map(list(FILES), root=str(tmp_path))
+    lazy = file_bytes_map(list(FILES), lazy=True, root=str(tmp_path))
+    assert isinstance(lazy, LazyFileMap)
+    assert list(lazy) == list(eager)
+    for key in FILES:
+        assert bytes(lazy[key]) == eager[key]
+
+
+def test_large_files_are_memory_mapped(tmp_path, small_threshold):
+    write_project(tmp_path)
+    lazy = file_bytes_map(list(FILES), lazy=True, root=str(tmp_path))
+    assert isinstance(lazy['Build/game.data'], memoryview)
+    assert isinstance(lazy['TemplateData/style.css'], bytes)
+    assert lazy.source_path('Build/game.data') == str(tmp_path / 'Build/game.data')
+
+
+def test_unreadable_files_are_skipped(tmp_path):
+    write_project(tmp_path)
+    lazy = file_bytes_map(['index.html', 'Build/missing.data'], lazy=True, root=str(tmp_path))
+    assert list(lazy) == ['index.html']
+    del lazy['index.html']
+    assert len(lazy) == 0
+    assert (tmp_path / 'index.html').exists()
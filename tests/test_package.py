@@ -0,0 +1,35 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from project import FILES, write_project
+
+REPO = Path(__file__).resolve().parent.parent
+
+
+def run_python(*args, cwd=None):
+    env = dict(os.environ, PYTHONPATH=str(REPO))
+    return subprocess.run([sys.executable, *args], cwd=cwd, env=env, capture_output=True, text=True, timeout=120)
+
+
+def test_import_has_no_side_effects():
+    proc = run_python('-c', 'import sys, everbuilder; print(sorted(m for m in ("flask", "brotli", "everbuilder.server") if m in sys.modules))')
+    assert proc.returncode == 0, proc.stderr
+    assert proc.stdout.strip() == '[]'
+
+
+def test_build_py_shim_reexports_the_api():
+    proc = run_python('-c', 'from build import build_from_files; import everbuilder; print(build_from_files is everbuilder.build_from_files)', cwd=REPO)
+    assert proc.returncode == 0, proc.stderr
+    assert proc.stdout.strip() == 'True'
+
+
+def test_cli_builds_files_txt(tmp_path):
+    write_project(tmp_path)
+    (tmp_path / 'files.txt').write_text('\n'.join(FILES) + '\n')
+    proc = run_python('-m', 'everbuilder', '--cli', '--stream', cwd=tmp_path)
+    assert proc.returncode == 0, proc.stderr
+    assert '[OK] Loader appears before the embedded files in output' in proc.stdout
+    assert 'flask' not in proc.stderr.lower()
+    assert (tmp_path / 'offline.html').stat().st_size > sum(len(c) for c in FILES.values())
@@ -0,0 +1,39 @@
+from everbuilder.builder import PathResolver
+
+KEYS = [
+    'index.html',
+    'Build\\game.data',
+    'Build/game.wasm',
+    'Extra/game.wasm',
+    'Other/style.css',
+    'TemplateData/style.css',
+    'TemplateData/fonts/style.css',
+]
+
+
+def test_exact_lookup_normalizes_backslashes():
+    paths = PathResolver(KEYS)
+    assert paths.exact('Build/game.data') == 'Build\\game.data'
+    assert paths.exact('Build\\game.data') == 'Build\\game.data'
+    assert paths.exact('game.data') is None
+
+
+def test_suffix_matches_keep_map_order():
+    paths = PathResolver(KEYS)
+    assert paths.ending_with('game.wasm') == ['Build/game.wasm', 'Extra/game.wasm']
+    assert paths.ending_with('/style.css') == ['Other/style.css', 'TemplateData/style.css', 'TemplateData/fonts/style.css']
+    assert paths.ending_with('nothing.css') == []
+
+
+def test_stylesheet_prefers_exact_then_template_data():
+    paths = PathResolver(KEYS)
+    assert paths.stylesheet('./Other/style.css') == 'Other/style.css'
+    assert paths.stylesheet('style.css') == 'TemplateData/style.css'
+    assert paths.stylesheet('css/missing.css') is None
+
+
+def test_build_asset_prefers_build_directory():
+    paths = PathResolver(['Extra/game.wasm', 'Build/game.wasm', 'Other/game.data'])
+    assert paths.build_asset('game.wasm') == 'Build/game.wasm'
+    assert paths.build_asset('game.data') == 'Other/game.data'
+    assert paths.build_asset('game.js') is None
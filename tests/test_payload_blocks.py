@@ -0,0 +1,51 @@
+import base64
+import re
+
+import pytest
+
+from everbuilder.builder import build, payload_block_id
+
+from project import FILES, embedded_files, write_project
+from runtime import needs_node, run_page
+
+BLOCK = re.compile(r'<script type="application/octet-stream" id="([^"]+)"([^>]*)>([^<]*)</script>')
+
+
+@pytest.fixture
+def page(tmp_path):
+    write_project(tmp_path)
+    out = tmp_path / 'offline.html'
+    build(list(FILES), {}, str(out), root=str(tmp_path), payload_blocks=True, fetch_paths=True)
+    return out
+
+
+def test_map_names_one_block_per_stored_asset(page):
+    html = page.read_text(encoding='utf-8')
+    index = embedded_files(html)
+    blocks = {m.group(1): m.group(3) for m in BLOCK.finditer(html)}
+    assert index['Build/logo-copy.png'] == {'ref': 'TemplateData/logo.png'}
+    stored = [key for key, entry in index.items() if 'block' in entry]
+    assert sorted(blocks) == sorted(payload_block_id(key) for key in stored)
+    for key in stored:
+        assert index[key] == {'block': payload_block_id(key)}
+    assert base64.b64decode(blocks[payload_block_id('Build/game.wasm')]) == FILES['Build/game.wasm']
+    # the payloads follow the runtime script instead of being a JS literal
+    assert html.index('const EMBEDDED_FILES') < html.index(payload_block_id('Build/game.data'))
+
+
+@needs_node
+def test_runtime_serves_assets_from_blocks(page):
+    urls = ['Build/game.data', 'Build/game.wasm', 'Build/logo-copy.png']
+    result = run_page(page, urls)
+    for url in urls:
+        assert result['responses'][url]['body'] == FILES[url]
+
+
+@needs_node
+def test_compressed_blocks_carry_their_encoding(tmp_path):
+    write_project(tmp_path)
+    out = tmp_path / 'offline.html'
+    build(list(FILES), {}, str(out), root=str(tmp_path), payload_blocks=True, compress=True, fetch_paths=True)
+    attrs = {m.group(1): m.group(2) for m in BLOCK.finditer(out.read_text(encoding='utf-8'))}
+    assert 'data-encoding=' in attrs[payload_block_id('Build/game.data')]
+    assert run_page(out, ['Build/game.data'])['responses']['Build/game.data']['body'] == FILES['Build/game.data']
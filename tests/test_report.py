@@ -0,0 +1,53 @@
+import io
+import json
+
+import pytest
+
+from everbuilder.builder import BuildReport, build, build_from_files, get_brotli
+
+from project import FILES, write_project
+
+
+def test_report_covers_every_phase_and_asset(tmp_path):
+    write_project(tmp_path)
+    out = tmp_path / 'offline.html'
+    report = build(list(FILES), {}, str(out), root=str(tmp_path)).to_dict()
+    assert set(BuildReport.PHASES) <= set(report['phases'])
+    assert report['phases']['read']['wall'] > 0
+    assert report['output_bytes'] == out.stat().st_size
+    # the inlined stylesheet is left out of the embedded files
+    embedded = [key for key in FILES if key != 'TemplateData/style.css']
+    assert report['input_bytes'] == sum(len(FILES[key]) for key in embedded)
+    assert report['duplicates'] == 1
+    assert sorted(report['assets']) == sorted(embedded)
+    assert report['embedded'] == len(embedded)
+    wasm = report['assets']['Build/game.wasm']
+    assert wasm['input_bytes'] == len(FILES['Build/game.wasm'])
+    assert wasm['emitted_bytes'] == (len(FILES['Build/game.wasm']) + 2) // 3 * 4
+    assert wasm['compressed_bytes'] is None
+    assert report['peak_rss'] is None or report['peak_rss'] > 0
+
+
+@pytest.mark.skipif(get_brotli() is None, reason='brotli is not installed')
+def test_compressed_assets_report_their_ratio():
+    report = build_from_files(dict(FILES), io.BytesIO(), compress=True, fetch_paths=True).to_dict()
+    data = report['assets']['Build/game.data']
+    assert data['compressed_bytes'] < data['input_bytes']
+    assert data['ratio'] == round(data['compressed_bytes'] / data['input_bytes'], 4)
+    assert report['phases']['compress']['wall'] > 0
+
+
+def test_timed_phases_add_up(tmp_path):
+    report = BuildReport()
+    report.add_time('compress', 0.5, 0.25)
+    report.add_asset('a.data', 100, 60, {'compress': 0.5, 'compress_cpu': 0.5, 'compressed_bytes': 45})
+    with report.timed('write'):
+        pass
+    report.finish(200)
+    assert report.phases['compress'] == {'wall': 1.0, 'cpu': 0.75}
+    assert report.assets['a.data']['ratio'] == 0.45
+    assert report.describe().startswith('compress 1.00s')
+    report.write(str(tmp_path / 'report.json'))
+    written = json.loads((tmp_path / 'report.json').read_text())
+    assert written == json.loads(json.dumps(report.to_dict()))
+    assert written['output_bytes'] == 200
@@ -0,0 +1,93 @@
+from pathlib import Path
+
+import pytest
+
+from everbuilder.builder import HtmlRewriter, rewrite_index_html
+
+GOLDEN = Path(__file__).resolve().parent / 'golden'
+
+UNITY_INDEX = """<!DOCTYPE html>
+<html lang="en-us">
+  <head>
+    <meta charset="utf-8">
+    <title>Unity WebGL Player | {{ PRODUCT_NAME }}</title>
+    <link rel="shortcut icon" href="TemplateData/favicon.ico">
+    <link rel="stylesheet" href="TemplateData/style.css">
+    {{ EXTRA_HEAD }}
+  </head>
+  <body>
+    <div id="unity-container"><img src="TemplateData/unity-logo-{{ THEME }}.png"><canvas id="unity-canvas"></canvas></div>
+    <script>
+      var buildUrl = "Build";
+      var loaderUrl = buildUrl + "/{{ PRODUCT_NAME }}.loader.js";
+      var config = {
+        dataUrl: buildUrl + "/{{ PRODUCT_NAME }}.data",
+        frameworkUrl: buildUrl + "/{{ PRODUCT_NAME }}.framework.js",
+        codeUrl: buildUrl + "/game.wasm",
+        productName: "{{ PRODUCT_NAME }}",
+      };
+      var script = document.createElement("script");
+      script.src = loaderUrl;
+    </script>
+  </body>
+</html>
+"""
+
+
+FILES = {
+    'index.html': UNITY_INDEX.encode(),
+    'Build/game.loader.js': b'function createUnityInstance() { return "{{ PRODUCT_NAME }}"; }',
+    'Build/game.data': bytes(range(256)) * 4,
+    'Build/game.framework.js': b'var unityFramework = 1;',
+    'Build/game.wasm': b'\x00asm\x01\x00\x00\x00',
+    'TemplateData/style.css': b'body { background: {{ BACKGROUND }}; }',
+    'TemplateData/unity-logo-dark.png': b'\x89PNG\r\n\x1a\n',
+    'TemplateData/favicon.ico': b'\x00\x00\x01\x00',
+    'js/app.js': b'console.log("{{ PRODUCT_NAME }}");',
+    'js/binary.js': b'\xff\xfe not utf-8',
+}
+
+
+@pytest.fixture
+def files_map():
+    return dict(FILES)
+
+
+# golden outputs in tests/golden/<name>.html were produced by the
+# original chain of regex passes
+VARIABLE_SETS = {
+    'no-variables': {},
+    'all-variables': {'PRODUCT_NAME': 'game', 'THEME': 'dark', 'BACKGROUND': '#231F20', 'EXTRA_HEAD': ''},
+    # a value that expands to a tag the rewriter has to inline
+    'variable-with-script': {'PRODUCT_NAME': 'game', 'THEME': 'dark', 'EXTRA_HEAD': '<script src="js/app.js"></script>'},
+    'variable-with-binary-script': {'PRODUCT_NAME': 'game', 'EXTRA_HEAD': '<script src="js/binary.js"></script>'},
+}
+
+
+@pytest.mark.parametrize('name', VARIABLE_SETS)
+def test_matches_golden_output_for_templated_unity_index(files_map, name):
+    expected = (GOLDEN / f'{name}.html').read_text(encoding='utf-8')
+    assert rewrite_index_html(UNITY_INDEX, files_map, {}, dict(VARIABLE_SETS[name])) == expected
+
+
+def test_templated_build_urls_are_resolved(files_map):
+    variables = {'PRODUCT_NAME': 'game'}
+    text = rewrite_index_html(UNITY_INDEX, files_map, {}, variables)
+    assert '{{ PRODUCT_NAME }}' not in text
+    assert 'buildUrl + "/' not in text
+    assert text.count('"data:') == 4
+
+
+def test_variable_expanding_to_script_tag_is_inlined(files_map):
+    variables = {'PRODUCT_NAME': 'game', 'EXTRA_HEAD': '<script src="js/app.js"></script>'}
+    rewriter = HtmlRewriter(files_map, variables)
+    text = rewriter.rewrite(UNITY_INDEX)
+    assert '<script>\nconsole.log("game");\n</script>' in text
+    assert 'js/app.js' in rewriter.inlined
+
+
+def test_asset_sites_reference_embedded_copies(files_map):
+    sites = {}
+    text = rewrite_index_html(UNITY_INDEX, files_map, {}, {'PRODUCT_NAME': 'game', 'THEME': 'dark'}, asset_sites=sites)
+    assert 'data-everbuilder-src="TemplateData/unity-logo-dark.png"' in text
+    assert sites['TemplateData/unity-logo-dark.png'] == 1
@@ -0,0 +1,35 @@
+import random
+
+import pytest
+
+from everbuilder.builder import build
+
+from project import FILES, write_project
+from runtime import needs_node, run_page
+
+# 1.5 MB of noise: 2M base64 characters, more than one B64_CHUNK
+LARGE = dict(FILES, **{'Build/game.data': random.Random(0).randbytes(3 << 19)})
+
+
+@needs_node
+@pytest.mark.parametrize('from_base64', [False, True])
+def test_large_assets_decode_to_the_same_bytes(tmp_path, from_base64):
+    write_project(tmp_path, LARGE)
+    out = tmp_path / 'offline.html'
+    build(list(LARGE), {}, str(out), root=str(tmp_path), fetch_paths=True)
+    urls = ['Build/game.data', 'Build/game.wasm']
+    result = run_page(out, urls, fromBase64=from_base64)
+    assert result['responses']['Build/game.data']['body'] == LARGE['Build/game.data']
+    assert result['responses']['Build/game.wasm']['body'] == LARGE['Build/game.wasm']
+    assert (result['fromBase64Calls'] == 2) is from_base64
+
+
+@needs_node
+def test_compressed_assets_decode_without_decompression_streams(tmp_path):
+    write_project(tmp_path)
+    out = tmp_path / 'offline.html'
+    build(list(FILES), {}, str(out), root=str(tmp_path), compress=True, fetch_paths=True)
+    result = run_page(out, ['Build/game.data'], decompressionStream=False)
+    response = result['responses']['Build/game.data']
+    assert response['encoding'] in ('br', 'gzip')
+    assert response['body'] == FILES['Build/game.data']
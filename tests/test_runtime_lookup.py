@@ -0,0 +1,43 @@
+import pytest
+
+from everbuilder.builder import build, build_lookup_index
+
+from project import FILES, write_project
+from runtime import needs_node, run_page
+
+# the stylesheet is inlined into the page and left out of the embedded files
+ASSETS = [key for key in FILES if key not in ('index.html', 'TemplateData/style.css')]
+
+
+def test_lookup_index_keeps_the_first_key_for_each_path_and_name():
+    index = build_lookup_index(['Build/a.data?v=1', 'Other\\a.data', 'b.wasm'])
+    assert index['paths'] == {'Build/a.data': 0, 'Other/a.data': 1, 'b.wasm': 2}
+    assert index['names'] == {'a.data': 0, 'b.wasm': 2}
+    assert index['lens'] == [6, 12]
+
+
+@needs_node
+@pytest.mark.parametrize('options', [{}, {'compress': True}, {'dedupe': False}])
+def test_fetch_patch_serves_every_asset(tmp_path, options):
+    write_project(tmp_path)
+    out = tmp_path / 'offline.html'
+    build(list(FILES), {}, str(out), root=str(tmp_path), **options)
+    urls = ['https://example.com/game/' + key for key in ASSETS]
+    result = run_page(out, urls)
+    for key, url in zip(ASSETS, urls):
+        assert result['responses'][url]['status'] == 200
+        assert result['responses'][url]['body'] == FILES[key], key
+    assert result['passedThrough'] == []
+
+
+@needs_node
+def test_fetch_patch_matches_suffixes_and_basenames(tmp_path):
+    write_project(tmp_path)
+    out = tmp_path / 'offline.html'
+    build(list(FILES), {}, str(out), root=str(tmp_path))
+    urls = ['Build/game.wasm?v=2#x', 'game.data', 'cdn/Build\\game.framework.js', 'Build/missing.data']
+    result = run_page(out, urls)
+    assert result['responses'][urls[0]]['body'] == FILES['Build/game.wasm']
+    assert result['responses'][urls[1]]['body'] == FILES['Build/game.data']
+    assert result['responses'][urls[2]]['body'] == FILES['Build/game.framework.js']
+    assert result['passedThrough'] == ['Build/missing.data']
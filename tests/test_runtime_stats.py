@@ -0,0 +1,56 @@
+from everbuilder.builder import build
+
+from project import FILES, write_project
+from runtime import needs_node, run_page
+
+URLS = ['Build/game.data', 'Build/game.wasm']
+
+
+def run(tmp_path, urls=URLS, page_options=None, **options):
+    write_project(tmp_path)
+    out = tmp_path / 'offline.html'
+    build(list(FILES), {}, str(out), root=str(tmp_path), fetch_paths=True, **options)
+    return run_page(out, urls, **(page_options or {}))
+
+
+@needs_node
+def test_every_served_asset_is_measured(tmp_path):
+    result = run(tmp_path, URLS + ['Build/missing.data'])
+    stats = result['stats']
+    assert stats['served'] == len(URLS)
+    assert stats['bytes'] == sum(len(FILES[url]) for url in URLS)
+    assert stats['passedThrough'] == 1
+    assert stats['decode'] >= 0 and stats['lookup'] >= 0
+    for url in URLS:
+        asset = stats['assets'][url]
+        assert (asset['count'], asset['bytes']) == (1, len(FILES[url]))
+        assert asset['sources'] == {'embedded': 1}
+    names = [m['name'] for m in result['measures']]
+    for url in URLS:
+        assert f'everbuilder:lookup {url}' in names
+        assert f'everbuilder:decode {url}' in names
+    serve = {m['name']: m['detail'] for m in result['measures'] if m['name'].startswith('everbuilder:serve ')}
+    assert serve['everbuilder:serve Build/game.data'] == {'bytes': len(FILES['Build/game.data']), 'source': 'embedded'}
+
+
+@needs_node
+def test_decompression_is_measured(tmp_path):
+    result = run(tmp_path, ['Build/game.data'], compress=True)
+    names = [m['name'] for m in result['measures']]
+    assert 'everbuilder:decompress Build/game.data' in names
+    assert result['stats']['assets']['Build/game.data']['bytes'] == len(FILES['Build/game.data'])
+
+
+@needs_node
+def test_solid_members_are_recorded_as_such(tmp_path):
+    result = run(tmp_path, ['Build/game.wasm'], solid=True)
+    assert result['stats']['assets']['Build/game.wasm']['sources'] == {'solid': 1}
+
+
+@needs_node
+def test_cache_hits_are_recorded_as_such(tmp_path):
+    page_options = {'indexedDB': str(tmp_path / 'indexeddb.json')}
+    run(tmp_path, page_options=page_options, asset_cache=True)
+    result = run(tmp_path, page_options=page_options, asset_cache=True)
+    assert result['stats']['cacheHits'] == len(URLS)
+    assert result['stats']['assets']['Build/game.data']['sources'] == {'cache': 1}
@@ -0,0 +1,63 @@
+import gzip
+import random
+
+import pytest
+
+from everbuilder.builder import build, get_brotli
+
+from project import FILES, write_project
+from runtime import needs_node, run_page
+
+# above WORKER_MIN_CHARS once base64 encoded; the wasm stays below it
+FILES = dict(FILES, **{'Build/game.data': random.Random(0).randbytes(96 * 1024)})
+URLS = ['Build/game.data', 'Build/game.wasm']
+
+
+@pytest.fixture
+def project(tmp_path):
+    return write_project(tmp_path, FILES)
+
+
+def build_page(project, **options):
+    out = project / 'offline.html'
+    build(list(FILES), {}, str(out), root=str(project), fetch_paths=True, **options)
+    return out
+
+
+@needs_node
+@pytest.mark.parametrize('options', [{}, {'payload_blocks': True}])
+def test_large_entries_are_decoded_in_the_worker(project, options):
+    result = run_page(build_page(project, worker_decode=True, **options), URLS, worker=True)
+    assert (result['workerMessages'], result['workerErrors']) == (1, 0)
+    for url in URLS:
+        assert result['responses'][url]['body'] == FILES[url]
+
+
+@needs_node
+@pytest.mark.skipif(get_brotli() is None, reason='brotli is not installed')
+def test_encoded_inputs_are_decompressed_in_the_worker(tmp_path):
+    files = dict(FILES, **{'Build/game.data.gz': gzip.compress(FILES['Build/game.data'], mtime=0)})
+    del files['Build/game.data']
+    write_project(tmp_path, files)
+    out = tmp_path / 'offline.html'
+    # the compression policy passes transfer-encoded inputs through as gzip
+    build(list(files), {}, str(out), root=str(tmp_path), fetch_paths=True, worker_decode=True, compress=True)
+    result = run_page(out, ['Build/game.data.gz'], worker=True)
+    assert (result['workerMessages'], result['workerErrors']) == (1, 0)
+    assert result['responses']['Build/game.data.gz']['encoding'] is None
+    assert result['responses']['Build/game.data.gz']['body'] == FILES['Build/game.data']
+
+
+@needs_node
+def test_worker_errors_fall_back_to_the_main_thread(project):
+    result = run_page(build_page(project, worker_decode=True), URLS, brokenWorker=True)
+    assert result['workerErrors'] == 1
+    for url in URLS:
+        assert result['responses'][url]['body'] == FILES[url]
+
+
+@needs_node
+def test_worker_is_off_by_default(project):
+    result = run_page(build_page(project), URLS, worker=True)
+    assert result['workerMessages'] == 0
+    assert result['responses']['Build/game.data']['body'] == FILES['Build/game.data']
@@ -0,0 +1,84 @@
+import io
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('flask')
+
+from everbuilder import server
+from everbuilder.builder import build_from_files
+
+from project import FILES
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+def test_upload_build_matches_build_from_files(app, submit, monkeypatch):
+    # spool every upload to disk
+    monkeypatch.setattr(server, 'UPLOAD_SPOOL_SIZE', 16)
+    client = app.test_client()
+    job = submit(client)
+    assert client.get(job['status_url']).get_json()['state'] == 'done'
+    expected = io.BytesIO()
+    build_from_files(dict(FILES), expected)
+    assert client.get(job['artifact_url']).data == expected.getvalue()
+
+
+def test_unknown_job_is_404(app):
+    client = app.test_client()
+    assert client.get('/build/nosuchjob').status_code == 404
+    assert client.get('/build/nosuchjob/artifact').status_code == 404
+
+
+def test_jobs_wait_their_turn_in_order(tmp_path):
+    release = threading.Event()
+    order = []
+
+    def run_job(job):
+        order.append(job.id)
+        release.wait(10)
+        job.artifact = 'out.html'
+
+    service = server.BuildService(run_job, workers=1)
+    jobs = [server.BuildJob(str(tmp_path), job_id=f'job{i}') for i in range(3)]
+    assert [service.submit(job) for job in jobs] == [0, 1, 2]
+    wait_for(lambda: jobs[0].state == 'running')
+    assert service.stats() == {'workers': 1, 'running': 1, 'queued': 2, 'jobs': 3}
+    assert service.position(jobs[2]) == 2
+    release.set()
+    wait_for(lambda: all(job.done for job in jobs))
+    assert order == ['job0', 'job1', 'job2']
+    assert [job.state for job in jobs] == ['done'] * 3
+    # the last job heard its position go 2 -> 1 -> 0
+    positions = [data['position'] for _, kind, data in jobs[2].events._events if kind == 'queue']
+    assert positions == sorted(positions, reverse=True)
+    assert sorted(set(positions)) == [0, 1, 2]
+
+
+def test_failed_job_reports_its_error(tmp_path):
+    def run_job(job):
+        raise RuntimeError('no index.html')
+
+    service = server.BuildService(run_job, workers=1)
+    job = server.BuildJob(str(tmp_path))
+    service.submit(job)
+    wait_for(lambda: job.done)
+    assert (job.state, job.error) == ('failed', 'no index.html')
+    assert job.lines[-1] == '[ERROR] no index.html'
+
+
+def test_finished_jobs_beyond_the_history_are_forgotten(tmp_path):
+    service = server.BuildService(lambda job: setattr(job, 'artifact', 'out.html'), workers=1, history=2)
+    jobs = []
+    for i in range(4):
+        jobs.append(server.BuildJob(str(tmp_path), job_id=f'job{i}'))
+        service.submit(jobs[-1])
+        wait_for(lambda: jobs[-1].done)
+    assert service.get('job0') is None
+    assert [service.get(f'job{i}') for i in (1, 2, 3)] == jobs[1:]
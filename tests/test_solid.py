@@ -0,0 +1,61 @@
+import base64
+import gzip
+import random
+
+import pytest
+
+from everbuilder.builder import SOLID_BUNDLE_KEY, build, build_solid_bundle, get_brotli
+
+from project import FILES, embedded_files, write_project
+from runtime import needs_node, run_page
+
+# many small, similar files: each one alone compresses poorly
+SMALL = {f'StreamingAssets/level{i}.json': b'{"level": %d, "tiles": [0, 1, 1, 2, 3, 5, 8]}\n' % i for i in range(40)}
+
+
+def test_small_assets_are_packed_into_one_gzip_blob():
+    files = dict(SMALL, **{'TemplateData/logo.png': FILES['TemplateData/logo.png']})
+    members, entry, raw_size = build_solid_bundle(files)
+    assert sorted(members) == sorted(SMALL)
+    assert entry['encoding'] == 'gzip'
+    blob = gzip.decompress(base64.b64decode(entry['b64']))
+    assert len(blob) == raw_size
+    for path, member in members.items():
+        offset, length = member['solid']
+        assert blob[offset:offset + length] == SMALL[path]
+        assert member['mime'] == 'application/json'
+
+
+def test_bundle_is_not_used_when_it_is_not_smaller():
+    rnd = random.Random(0)
+    files = {f'noise{i}.bin': rnd.randbytes(2048) for i in range(4)}
+    assert build_solid_bundle(files) == ({}, None, 0)
+    assert build_solid_bundle(dict(list(SMALL.items())[:1])) == ({}, None, 0)
+
+
+def test_large_and_excluded_assets_stay_out():
+    files = dict(SMALL, **{'Build/game.data': bytes(128 * 1024)})
+    members, _, _ = build_solid_bundle(files, exclude={'StreamingAssets/level0.json'})
+    assert 'Build/game.data' not in members
+    assert 'StreamingAssets/level0.json' not in members
+
+
+@pytest.mark.skipif(get_brotli() is None, reason='brotli is not installed')
+def test_bundle_is_brotli_with_compress():
+    assert build_solid_bundle(SMALL, compress='max')[1]['encoding'] == 'br'
+
+
+@needs_node
+@pytest.mark.parametrize('options', [{}, {'compress': True}, {'payload_blocks': True}])
+def test_runtime_serves_bundle_members(tmp_path, options):
+    files = dict(FILES, **SMALL)
+    write_project(tmp_path, files)
+    out = tmp_path / 'offline.html'
+    build(list(files), {}, str(out), root=str(tmp_path), solid=True, fetch_paths=True, **options)
+    index = embedded_files(out.read_text(encoding='utf-8'))
+    assert SOLID_BUNDLE_KEY in index
+    urls = list(SMALL)[:3] + ['Build/game.wasm']
+    assert all('solid' in index[url] for url in urls)
+    result = run_page(out, urls)
+    for url in urls:
+        assert result['responses'][url]['body'] == files[url]
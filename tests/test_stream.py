@@ -0,0 +1,29 @@
+import tracemalloc
+
+import pytest
+
+from everbuilder.builder import build
+
+from project import FILES, write_project
+
+
+@pytest.mark.parametrize('options', [{}, {'compress': True}, {'solid': True}, {'dedupe': False}])
+def test_streamed_output_matches_in_memory_output(tmp_path, options):
+    write_project(tmp_path)
+    build(list(FILES), {}, str(tmp_path / 'memory.html'), root=str(tmp_path), **options)
+    build(list(FILES), {}, str(tmp_path / 'stream.html'), root=str(tmp_path), stream=True, **options)
+    assert (tmp_path / 'stream.html').read_bytes() == (tmp_path / 'memory.html').read_bytes()
+
+
+def test_streaming_does_not_hold_the_whole_document(tmp_path):
+    files = dict(FILES, **{'Build/game.data': bytes(range(256)) * 32 * 1024})
+    write_project(tmp_path, files)
+    peaks = {}
+    for stream in (False, True):
+        tracemalloc.start()
+        try:
+            build(list(files), {}, str(tmp_path / 'offline.html'), root=str(tmp_path), stream=stream)
+            peaks[stream] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    assert peaks[True] < peaks[False] * 0.75
@@ -0,0 +1,93 @@
+import os
+import sys
+
+import pytest
+
+from everbuilder import watch as watch_module
+from everbuilder.watch import InotifyWatcher, PollingWatcher, watch
+
+from project import write_project
+
+
+@pytest.fixture
+def project(tmp_path):
+    return write_project(tmp_path)
+
+
+class ScriptedWatcher:
+    """Returns the scripted change sets from wait(), then stops the watch loop."""
+
+    name = 'scripted'
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.updates = []
+        self.closed = False
+
+    def wait(self, timeout=None):
+        if not self.script:
+            raise KeyboardInterrupt
+        return self.script.pop(0)
+
+    def update(self, paths):
+        self.updates.append(paths)
+
+    def close(self):
+        self.closed = True
+
+
+def run_watch(monkeypatch, script, rebuild):
+    watcher = ScriptedWatcher(script)
+    monkeypatch.setattr(watch_module, 'open_watcher', lambda paths, poll=False: watcher)
+    watch(lambda: ['a', 'b', 'c'], rebuild, debounce=0)
+    return watcher
+
+
+def test_burst_of_changes_is_one_rebuild(monkeypatch):
+    rebuilds = []
+    watcher = run_watch(monkeypatch, [{'a'}, {'b'}, {'a', 'c'}, set(), {'b'}, set()], lambda: rebuilds.append(1))
+    assert len(rebuilds) == 2
+    # the watch list is refreshed after every rebuild
+    assert watcher.updates == [['a', 'b', 'c']] * 2
+    assert watcher.closed
+
+
+def test_failed_rebuild_keeps_watching(monkeypatch, capsys):
+    calls = []
+
+    def rebuild():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError('index.html is missing')
+
+    run_watch(monkeypatch, [{'a'}, set(), {'a'}, set()], rebuild)
+    out = capsys.readouterr().out
+    assert len(calls) == 2
+    assert '[ERROR] Rebuild failed: index.html is missing' in out
+    assert 'Rebuild 1 took' in out
+
+
+def test_polling_watcher_reports_changed_files(project):
+    path = str(project / 'TemplateData/style.css')
+    watcher = PollingWatcher([path], interval=0.01)
+    assert watcher.wait(0.05) == set()
+    with open(path, 'ab') as f:
+        f.write(b'/* changed */\n')
+    assert watcher.wait(1) == {path}
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='inotify is Linux only')
+def test_inotify_watcher_sees_files_replaced_by_rename(project):
+    path = str(project / 'TemplateData/style.css')
+    watcher = InotifyWatcher([path, str(project / 'Build/game.data')])
+    try:
+        assert watcher.wait(0.05) == set()
+        tmp = str(project / 'TemplateData/style.css.tmp')
+        with open(tmp, 'wb') as f:
+            f.write(b'body {}\n')
+        os.replace(tmp, path)
+        assert watcher.wait(1) == {path}
+        (project / 'TemplateData/other.css').write_bytes(b'')
+        assert watcher.wait(0.05) == set()
+    finally:
+        watcher.close()
@@ -0,0 +1,409 @@
+"""Benchmark EverBuilder builds on synthetic Unity WebGL projects.
+
+    python tools/benchmark.py [--scale small|medium|large] [--seed N] [--repeat N]
+                              [--jobs N] [--only NAME] [--project-dir DIR]
+                              [--out results.json] [--sizes-out sizes.json]
+                              [--baseline baseline.json] [--threshold PCT]
+
+A project shaped like Unity's WebGL output (index.html with `buildUrl`
+references, TemplateData CSS and images, a large .wasm and .data, many
+small scripts) is generated from `--seed`, so every machine builds the
+same bytes. It is built with every combination of --compress, --embed-css,
+--solid and the loader; each run happens in a fresh Python process so the peak
+memory belongs to that run alone. Wall/CPU time, peak RSS, output size and
+the build's own phase timings are written as JSON.
+
+With --baseline the results are compared against an earlier results file
+and the exit status is 1 when a case got slower or used more memory by more
+than --threshold percent (default 10), or its output grew by more than
+SIZE_THRESHOLD percent. --sizes-out writes only the figures that are the
+same on every machine (output sizes and ratios); such a file works as a
+--baseline too, and then only sizes are compared.
+"""
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+from everbuilder import builder as everbuilder  # noqa: E402
+
+RESULTS_VERSION = 1
+GENERATOR_VERSION = 1
+MB = 1024 * 1024
+# per scale: sizes in bytes, counts of small files
+SCALES = {
+    'small': {'wasm': 2 * MB, 'data': 4 * MB, 'framework': 256 * 1024, 'scripts': 20, 'images': 4},
+    'medium': {'wasm': 8 * MB, 'data': 32 * MB, 'framework': 1 * MB, 'scripts': 200, 'images': 16},
+    'large': {'wasm': 32 * MB, 'data': 128 * MB, 'framework': 4 * MB, 'scripts': 1000, 'images': 64},
+}
+FLAGS = ('compress', 'embed_css', 'loader', 'solid')
+SIZE_THRESHOLD = 0.5
+
+INDEX_TEMPLATE = """<!DOCTYPE html>
+<html lang="en-us">
+  <head>
+    <meta charset="utf-8">
+    <meta http-equiv="Content-Type" content="text/html; charset=utf-8">
+    <title>Unity WebGL Player | {{{{ TITLE }}}}</title>
+    <link rel="shortcut icon" href="TemplateData/favicon.ico">
+    <link rel="stylesheet" href="TemplateData/style.css">
+  </head>
+  <body>
+    <div id="unity-container" class="unity-desktop">
+      <canvas id="unity-canvas" width=960 height=600 tabindex="-1"></canvas>
+      <div id="unity-loading-bar">
+        <div id="unity-logo"><img src="TemplateData/unity-logo-dark.png"></div>
+        <div id="unity-progress-bar-empty"><div id="unity-progress-bar-full"></div></div>
+      </div>
+      <div id="unity-footer">
+        <div id="unity-webgl-logo"></div>
+        <div id="unity-fullscreen-button"></div>
+      </div>
+    </div>
+    <script>
+      var container = document.querySelector("#unity-container");
+      var canvas = document.querySelector("#unity-canvas");
+      var buildUrl = "Build";
+      var loaderUrl = buildUrl + "/game.loader.js";
+      var config = {{
+        dataUrl: buildUrl + "/game.data",
+        frameworkUrl: buildUrl + "/game.framework.js",
+        codeUrl: buildUrl + "/game.wasm",
+        streamingAssetsUrl: "StreamingAssets",
+        companyName: "DefaultCompany",
+        productName: "{{{{ TITLE }}}}",
+        productVersion: "1.0",
+      }};
+      var modules = {modules};
+      var script = document.createElement("script");
+      script.src = loaderUrl;
+      script.onload = () => {{
+        createUnityInstance(canvas, config, (progress) => {{
+          document.querySelector("#unity-progress-bar-full").style.width = 100 * progress + "%";
+        }}).then((unityInstance) => {{
+          document.querySelector("#unity-loading-bar").style.display = "none";
+          document.querySelector("#unity-fullscreen-button").onclick = () => unityInstance.SetFullscreen(1);
+        }}).catch((message) => alert(message));
+      }};
+      document.body.appendChild(script);
+    </script>
+  </body>
+</html>
+"""
+
+def arg_value(name, default=None):
+    """Value following `name` in sys.argv, or `default`."""
+    if name not in sys.argv:
+        return default
+    try:
+        return sys.argv[sys.argv.index(name) + 1]
+    except IndexError:
+        print(f'[WARN] {name} expects a value; using {default}')
+        return default
+
+def patterned_bytes(rng, size, chunk=64, vocabulary=256):
+    """Bytes drawn from a small vocabulary of random chunks: compresses like code or meshes."""
+    words = [rng.randbytes(chunk) for _ in range(vocabulary)]
+    return b''.join(rng.choices(words, k=size // chunk + 1))[:size]
+
+def mixed_bytes(rng, size, block=MB):
+    """Alternating incompressible (textures, audio) and patterned blocks, like a .data file."""
+    parts = []
+    left = size
+    while left > 0:
+        n = min(block, left)
+        parts.append(rng.randbytes(n) if rng.random() < 0.5 else patterned_bytes(rng, n))
+        left -= n
+    return b''.join(parts)
+
+def script_text(rng, size, prefix):
+    """JavaScript-looking source of about `size` bytes."""
+    lines = []
+    total = 0
+    n = 0
+    while total < size:
+        a, b = rng.randrange(1000), rng.randrange(1000)
+        line = f'function {prefix}_{n}(x, y) {{ var t = x * {a} + y; if (t > {b}) {{ return {prefix}_{max(n - 1, 0)}(t - {b}, y); }} return t; }}\n'
+        lines.append(line)
+        total += len(line)
+        n += 1
+    return ''.join(lines)
+
+def fake_image(rng, size, magic=b'\x89PNG\r\n\x1a\n'):
+    return magic + rng.randbytes(max(size - len(magic), 0))
+
+def project_files(scale, seed):
+    """Yield (path, bytes) of a synthetic Unity WebGL project."""
+    spec = SCALES[scale]
+    rng = random.Random(seed)
+    modules = [f'StreamingAssets/scripts/module{i}.js' for i in range(spec['scripts'])]
+    yield 'index.html', INDEX_TEMPLATE.format(modules=json.dumps(modules[:8])).encode('utf-8')
+    images = [f'TemplateData/image{i}.png' for i in range(spec['images'])]
+    css = ['body { padding: 0; margin: 0 }', '#unity-container { position: absolute }',
+           '#unity-canvas { background: #231F20 }',
+           '#unity-logo { width: 154px; height: 130px; background: url("unity-logo-dark.png") no-repeat center }',
+           '#unity-webgl-logo { float: left; width: 204px; height: 38px; background: url("webgl-logo.png") no-repeat center }',
+           '#unity-fullscreen-button { float: right; width: 38px; height: 38px; background: url("fullscreen-button.png") no-repeat center }']
+    css += [f'.tile{i} {{ background: url("{os.path.basename(p)}") }}' for i, p in enumerate(images)]
+    yield 'TemplateData/style.css', '\n'.join(css).encode('utf-8')
+    yield 'TemplateData/favicon.ico', fake_image(rng, 4286, b'\0\0\1\0')
+    for name, size in (('unity-logo-dark.png', 3000), ('webgl-logo.png', 2000), ('fullscreen-button.png', 200)):
+        yield f'TemplateData/{name}', fake_image(rng, size)
+    for path in images:
+        yield path, fake_image(rng, rng.randrange(2000, 200000))
+    yield 'Build/game.loader.js', script_text(rng, 30000, 'loader').encode('utf-8')
+    yield 'Build/game.framework.js', script_text(rng, spec['framework'], 'framework').encode('utf-8')
+    yield 'Build/game.wasm', b'\0asm\1\0\0\0' + patterned_bytes(rng, spec['wasm'] - 8)
+    yield 'Build/game.data', mixed_bytes(rng, spec['data'])
+    for i, path in enumerate(modules):
+        yield path, script_text(rng, rng.randrange(500, 20000), f'module{i}').encode('utf-8')
+
+def generate_project(root, scale, seed):
+    """Write the project under `root` (reused when already generated); returns {files, bytes}."""
+    marker = os.path.join(root, '.benchmark.json')
+    wanted = {'generator': GENERATOR_VERSION, 'scale': scale, 'seed': seed}
+    try:
+        with open(marker, 'r', encoding='utf-8') as fh:
+            info = json.load(fh)
+        if all(info.get(k) == v for k, v in wanted.items()):
+            return {'files': info['files'], 'bytes': info['bytes']}
+    except (OSError, ValueError, KeyError):
+        pass
+    print(f'[INFO] Generating {scale} project (seed {seed}) in {root}')
+    listed = []
+    total = 0
+    for path, content in project_files(scale, seed):
+        dest = os.path.join(root, path)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        with open(dest, 'wb') as fh:
+            fh.write(content)
+        listed.append(path)
+        total += len(content)
+    with open(os.path.join(root, 'files.txt'), 'w', encoding='utf-8') as fh:
+        fh.write('\n'.join(listed) + '\n')
+    info = dict(wanted, files=len(listed), bytes=total)
+    with open(marker, 'w', encoding='utf-8') as fh:
+        json.dump(info, fh)
+    return {'files': len(listed), 'bytes': total}
+
+def case_flags(name):
+    return {flag: flag in name.split('+') for flag in FLAGS}
+
+def case_names():
+    """plain, compress, embed_css, ..., compress+embed_css+loader."""
+    names = []
+    for combo in itertools.product((False, True), repeat=len(FLAGS)):
+        names.append('+'.join(f for f, on in zip(FLAGS, combo) if on) or 'plain')
+    return sorted(names, key=lambda n: (n.count('+') + (n != 'plain'), n))
+
+def cpu_seconds():
+    """CPU time of this process and its finished children (the encode pool)."""
+    if resource is None:
+        return time.process_time()
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+def run_one(project, name, jobs):
+    """Build `project` once with the flags of case `name`; runs in the child process."""
+    flags = case_flags(name)
+    files = everbuilder.read_files_list(os.path.join(project, 'files.txt'))
+    variables = dict(everbuilder.VARIABLES)
+    if flags['embed_css']:
+        variables['__embed_css_direct__'] = True
+    rss_before = everbuilder.peak_rss()[0]
+    # build messages go to a logger without handlers: only the JSON line is printed
+    quiet = logging.Logger('everbuilder.benchmark')
+    with tempfile.TemporaryDirectory(prefix='everbuilder-bench-') as tmp:
+        outpath = os.path.join(tmp, 'offline.html')
+        started = time.perf_counter()
+        cpu_started = cpu_seconds()
+        with everbuilder.build_output(quiet, emit_progress=False):
+            report = everbuilder.build(files, variables, outpath, inject_loader=flags['loader'], compress=flags['compress'], solid=flags['solid'], jobs=jobs, root=project)
+        wall = time.perf_counter() - started
+        cpu = cpu_seconds() - cpu_started
+    if report is None:
+        raise RuntimeError('build aborted')
+    summary = report.summary()
+    return {
+        'wall': round(wall, 4),
+        'cpu': round(cpu, 4),
+        'peak_rss': summary['peak_rss'],
+        'peak_rss_workers': summary['peak_rss_workers'],
+        'rss_before': rss_before,
+        'output_bytes': summary['output_bytes'],
+        'phases': summary['phases'],
+    }
+
+def run_case(project, name, repeat, jobs):
+    """Run case `name` `repeat` times, each in a fresh interpreter; returns the aggregate."""
+    runs = []
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--run-one', project, name, '--jobs', str(jobs)],
+                              capture_output=True, text=True)
+        if proc.returncode != 0:
+            tail = (proc.stderr or proc.stdout).strip().splitlines()[-5:]
+            return {'flags': case_flags(name), 'error': '\n'.join(tail) or f'exit status {proc.returncode}'}
+        runs.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    walls = [r['wall'] for r in runs]
+    fastest = min(runs, key=lambda r: r['wall'])
+    return {
+        'flags': case_flags(name),
+        'wall': round(statistics.median(walls), 4),
+        'wall_min': min(walls),
+        'wall_runs': walls,
+        'cpu': round(statistics.median(r['cpu'] for r in runs), 4),
+        'peak_rss': max((r['peak_rss'] for r in runs if r['peak_rss'] is not None), default=None),
+        'peak_rss_workers': max((r['peak_rss_workers'] for r in runs if r['peak_rss_workers'] is not None), default=None),
+        'rss_before': runs[0]['rss_before'],
+        'output_bytes': runs[-1]['output_bytes'],
+        'output_stable': len({r['output_bytes'] for r in runs}) == 1,
+        'phases': fastest['phases'],
+    }
+
+def format_metric(metric, value):
+    if value is None:
+        return '-'
+    if metric in ('wall', 'cpu'):
+        return f'{value:.2f}s'
+    return everbuilder.human_size(value)
+
+def size_figures(results):
+    """The machine-independent part of `results`: output size and ratio to the input per case."""
+    project_bytes = results['project']['bytes']
+    return {
+        'version': RESULTS_VERSION,
+        'scale': results['scale'],
+        'seed': results['seed'],
+        'brotli': results['environment']['brotli'],
+        'project': results['project'],
+        'cases': {
+            name: {'output_bytes': case['output_bytes'], 'ratio': round(case['output_bytes'] / project_bytes, 4)}
+            for name, case in results['cases'].items() if 'error' not in case
+        },
+    }
+
+def compare(results, baseline, threshold):
+    """Print per-case changes against `baseline`; returns the regressions found."""
+    regressions = []
+    for key in ('scale', 'seed', 'jobs'):
+        # a sizes-only baseline has no jobs: output does not depend on it
+        if key in baseline and baseline.get(key) != results.get(key):
+            print(f"[WARN] Baseline {key} is {baseline.get(key)!r}, this run used {results.get(key)!r}; numbers are not comparable")
+    print('[INFO] Compared with baseline from ' + str(baseline.get('created', 'a sizes-only file')))
+    for name, case in results['cases'].items():
+        old = (baseline.get('cases') or {}).get(name)
+        if not old or 'error' in old or 'error' in case:
+            print(f'  {name}: no comparison')
+            continue
+        parts = []
+        for metric, limit in (('wall', threshold), ('peak_rss', threshold), ('output_bytes', SIZE_THRESHOLD)):
+            before, after = old.get(metric), case.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before * 100
+            flag = ''
+            if change > limit:
+                regressions.append((name, metric, change))
+                flag = ' REGRESSION'
+            parts.append(f'{metric} {format_metric(metric, before)} -> {format_metric(metric, after)} ({change:+.1f}%{flag})')
+        print(f'  {name}: ' + ', '.join(parts))
+    return regressions
+
+def main():
+    if '--run-one' in sys.argv:
+        idx = sys.argv.index('--run-one')
+        project, name = sys.argv[idx + 1], sys.argv[idx + 2]
+        print(json.dumps(run_one(project, name, int(arg_value('--jobs', 1)))))
+        return 0
+
+    scale = arg_value('--scale', 'small')
+    if scale not in SCALES:
+        print(f"[ERROR] --scale expects one of {', '.join(SCALES)}")
+        return 2
+    try:
+        seed = int(arg_value('--seed', 1))
+        repeat = max(1, int(arg_value('--repeat', 3)))
+        jobs = int(arg_value('--jobs', 1))
+        threshold = float(arg_value('--threshold', 10))
+    except ValueError as e:
+        print(f'[ERROR] {e}')
+        return 2
+    only = arg_value('--only')
+    out = arg_value('--out', 'benchmark-results.json')
+    project = arg_value('--project-dir') or os.path.join(tempfile.gettempdir(), f'everbuilder-bench-{scale}-{seed}')
+    names = [n for n in case_names() if only is None or only in n]
+    if not names:
+        print(f'[ERROR] No case matches --only {only}; cases: {", ".join(case_names())}')
+        return 2
+
+    project_info = generate_project(project, scale, seed)
+    print(f"[INFO] Project: {project_info['files']} files, {everbuilder.human_size(project_info['bytes'])}; {len(names)} cases x {repeat} runs")
+    results = {
+        'version': RESULTS_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'scale': scale,
+        'seed': seed,
+        'repeat': repeat,
+        'jobs': jobs,
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'brotli': everbuilder.get_brotli() is not None,
+        },
+        'project': project_info,
+        'cases': {},
+    }
+    for name in names:
+        case = run_case(project, name, repeat, jobs)
+        results['cases'][name] = case
+        if 'error' in case:
+            print(f"[ERROR] {name}: {case['error']}")
+        else:
+            print(f"  {name:<28} {format_metric('wall', case['wall']):>8} wall  {format_metric('cpu', case['cpu']):>8} cpu  "
+                  f"{format_metric('peak_rss', case['peak_rss']):>10} peak  {format_metric('output_bytes', case['output_bytes']):>10} out")
+
+    with open(out, 'w', encoding='utf-8') as fh:
+        json.dump(results, fh, indent=1)
+    print(f'[INFO] Results written to {out}')
+    sizes_out = arg_value('--sizes-out')
+    if sizes_out:
+        with open(sizes_out, 'w', encoding='utf-8') as fh:
+            json.dump(size_figures(results), fh, indent=1)
+            fh.write('\n')
+        print(f'[INFO] Sizes written to {sizes_out}')
+
+    status = 1 if any('error' in c for c in results['cases'].values()) else 0
+    baseline_path = arg_value('--baseline')
+    if baseline_path:
+        try:
+            with open(baseline_path, 'r', encoding='utf-8') as fh:
+                baseline = json.load(fh)
+        except (OSError, ValueError) as e:
+            print(f'[ERROR] Could not read baseline {baseline_path}: {e}')
+            return 2
+        regressions = compare(results, baseline, threshold)
+        if regressions:
+            print(f'[WARN] {len(regressions)} regression(s) beyond the threshold')
+            status = 1
+        else:
+            print('[OK] No regressions beyond the threshold')
+    return status
+
+if __name__ == '__main__':
+    sys.exit(main())